@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 """Analizza la struttura binaria di un file .STY Yamaha"""
 
+import os
 import struct
+import sys
 
-sty_file = r'sty\stili_miei\Swing1.S733.sty'
+sty_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join('sty', 'stili_miei', 'Swing1.S733.sty')
 
 print(f"Analisi file: {sty_file}")
 print("=" * 80)
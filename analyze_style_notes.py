@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 """Analizza le note effettive suonate in uno style"""
 
+import os
 import sys
 sys.path.insert(0, 'src')
 
 from style_player import StylePlayer
 
 # Carica uno style
-sty_file = r'sty\stili_miei\Swing1.S733.sty'
+sty_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join('sty', 'stili_miei', 'Swing1.S733.sty')
 player = StylePlayer()
 
 print("=" * 80)
@@ -22,7 +23,7 @@ if player.load_style(sty_file):
     # Analizza Main A
     section_name = 'Main A'
     section = player.sections[section_name]
-    events = section['events']
+    timeline = section['timeline']
 
     # Raccogli tutte le note suonate
     notes_played = {}  # note_number -> count
@@ -31,10 +32,9 @@ if player.load_style(sty_file):
     print(f"\n[SEZIONE: {section_name}]")
     print("-" * 80)
 
-    for event in events:
-        if event.type == 'note_on' and event.velocity > 0:
-            note = event.note
-            channel = event.channel if hasattr(event, 'channel') else 0
+    for tick, channel, status, data in timeline:
+        if status & 0xF0 == 0x90 and data[1] > 0:
+            note = data[0]
 
             if note not in notes_played:
                 notes_played[note] = 0
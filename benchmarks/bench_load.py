@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Benchmark caricamento style: lettore SMF nativo vs mido.MidiFile"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from style_player import StylePlayer  # noqa: E402
+
+
+def time_load(filename, native, repeat):
+    """Ritorna la mediana (ms) di repeat caricamenti di filename"""
+    samples = []
+    for _ in range(repeat):
+        player = StylePlayer()
+        player.use_native_reader = native
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            ok = player.load_style(filename)
+            elapsed = time.perf_counter() - start
+        if not ok:
+            raise RuntimeError(f"Caricamento fallito: {filename}")
+        samples.append(elapsed * 1000.0)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dir', default=os.path.join(ROOT_DIR, 'sty', 'stili_miei'),
+                        help="cartella con i file .sty")
+    parser.add_argument('--repeat', type=int, default=5, help="ripetizioni per file")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.dir, '*.[sS][tT][yY]')))
+    if not files:
+        print(f"Nessun file .sty in {args.dir}")
+        return 1
+
+    print(f"{'File':40s} {'mido ms':>9s} {'nativo ms':>10s} {'speedup':>8s}")
+    print("-" * 70)
+    total_mido = 0.0
+    total_native = 0.0
+    for filename in files:
+        mido_ms = time_load(filename, native=False, repeat=args.repeat)
+        native_ms = time_load(filename, native=True, repeat=args.repeat)
+        total_mido += mido_ms
+        total_native += native_ms
+        name = os.path.basename(filename)[:40]
+        print(f"{name:40s} {mido_ms:9.2f} {native_ms:10.2f} {mido_ms / native_ms:7.1f}x")
+
+    print("-" * 70)
+    print(f"{'Totale':40s} {total_mido:9.2f} {total_native:10.2f} "
+          f"{total_mido / total_native:7.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
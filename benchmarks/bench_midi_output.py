@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Benchmark uscita MIDI: mido.Message costruito per evento vs byte già codificati"""
+
+import argparse
+import os
+import sys
+import time
+
+import mido
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from midi_output import MidiOutput  # noqa: E402
+
+
+class _NullMidiOut:
+    def send_message(self, data):
+        pass
+
+
+class NullPort(mido.ports.BaseOutput):
+    """
+    Porta mido che scarta i messaggi (se non si può aprire una porta virtuale).
+
+    Come la porta rtmidi di mido valida e copia ogni messaggio ed espone un
+    oggetto _rt con send_message: i due percorsi restano confrontabili.
+    """
+
+    def __init__(self):
+        self._rt = _NullMidiOut()
+        super().__init__('null')
+
+    def _send(self, msg):
+        self._rt.send_message(msg.bytes())
+
+
+def open_port(name):
+    """Apre una porta virtuale rtmidi, oppure NullPort se il backend non è disponibile"""
+    try:
+        return mido.open_output(name, virtual=True)
+    except Exception as e:
+        print(f"Porta virtuale non disponibile ({e}): uso una porta nulla")
+        return NullPort()
+
+
+def events(count):
+    """Coppie note_on/note_off su canali e note diverse, come (status, note, velocity)"""
+    result = []
+    for i in range(count // 2):
+        channel = i % 16
+        note = 36 + i % 48
+        result.append((0x90 | channel, note, 100))
+        result.append((0x80 | channel, note, 0))
+    return result
+
+
+def rate(send, items, repeat):
+    """Messaggi al secondo (miglior tempo su repeat giri)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            send(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=20000, help="messaggi per giro")
+    parser.add_argument('--repeat', type=int, default=5, help="giri per percorso")
+    parser.add_argument('--port', default='bench_midi_output', help="nome della porta virtuale")
+    args = parser.parse_args()
+
+    port = open_port(args.port)
+    output = MidiOutput(port)
+    raw_events = events(args.count)
+
+    def send_mido(event):
+        status, note, velocity = event
+        kind = 'note_on' if status & 0xF0 == 0x90 else 'note_off'
+        port.send(mido.Message(kind, channel=status & 0x0F, note=note, velocity=velocity))
+
+    prebuilt = [mido.Message.from_bytes(event) for event in raw_events]
+    encoded = [bytes(event) for event in raw_events]
+
+    results = [
+        ("mido.Message per evento", rate(send_mido, raw_events, args.repeat)),
+        ("mido.Message già costruito", rate(port.send, prebuilt, args.repeat)),
+        ("byte già codificati", rate(output.send_bytes, encoded, args.repeat)),
+    ]
+
+    backend = "rtmidi send_message" if output.raw else "fallback mido"
+    print(f"Porta: {getattr(port, 'name', '?')} - percorso byte: {backend}")
+    print(f"{'Percorso':30s} {'msg/s':>12s} {'rispetto a mido':>16s}")
+    print("-" * 60)
+    baseline = results[0][1]
+    for name, value in results:
+        print(f"{name:30s} {value:12,.0f} {value / baseline:15.1f}x")
+
+    port.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
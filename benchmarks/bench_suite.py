@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Suite di benchmark: caricamento style, throughput del loop di playback,
+jitter di invio a vari tempi, riconoscimento accordi.
+
+    python benchmarks/bench_suite.py                  # misura e confronta con la baseline
+    python benchmarks/bench_suite.py --save-baseline  # misura e salva la baseline
+    python benchmarks/bench_suite.py --quick          # giri ridotti (controllo veloce)
+
+Il confronto esce con codice 1 se una metrica peggiora oltre la tolleranza.
+"""
+
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from chord_recognizer import ChordRecognizer  # noqa: E402
+from clocks import VirtualClock  # noqa: E402
+from scheduler import DeadlineScheduler  # noqa: E402
+from style_player import StylePlayer  # noqa: E402
+from tempo_map import TempoMap  # noqa: E402
+from timing_stats import TimingStats  # noqa: E402
+
+
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, 'benchmarks', 'baseline.json')
+DEFAULT_STYLE_DIR = os.path.join(ROOT_DIR, 'sty', 'stili_miei')
+DEFAULT_STYLE = os.path.join(DEFAULT_STYLE_DIR, 'Swing1.S733.sty')
+
+DEFAULT_TOLERANCE = 0.25     # peggioramento relativo ammesso
+
+# Scarto assoluto sotto cui una metrica non è regressione (rumore del sistema):
+# per il jitter 1 ms, sotto cui un invio non è considerato in ritardo
+ABSOLUTE_SLACK = {
+    'load.': 2.0,
+    'jitter.': 1.0,
+}
+JITTER_TEMPOS = (80, 140, 220)
+PERCENTILES = (50, 90, 99)
+
+
+class NullOutput:
+    """Uscita che conta i messaggi e li scarta"""
+
+    def __init__(self):
+        self.messages = 0
+
+    def send_bytes(self, data):
+        self.messages += 1
+
+    def send_many(self, messages):
+        self.messages += len(messages)
+
+    def send_panic(self, messages):
+        self.messages += len(messages)
+
+    def send(self, msg):
+        self.messages += 1
+
+    def close(self):
+        pass
+
+
+def load_player(filename):
+    player = StylePlayer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not player.load_style(filename):
+            raise RuntimeError(f"Caricamento fallito: {filename}")
+    return player
+
+
+def main_section(player):
+    for name in ('Main A', 'Main B', 'Main C', 'Main D'):
+        if name in player.sections:
+            return name
+    return player._find_first_main() or player.get_available_sections()[0]
+
+
+# ---------------------------------------------------------------- misure
+
+def bench_load(files, repeat):
+    """Miglior tempo (ms) di load_style per ogni file"""
+    results = {}
+    for filename in files:
+        samples = []
+        for _ in range(repeat):
+            player = StylePlayer()
+            # Come timeit: niente garbage collector durante la misura
+            gc.collect()
+            gc.disable()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    ok = player.load_style(filename)
+                    elapsed = time.perf_counter() - start
+            finally:
+                gc.enable()
+            if not ok:
+                raise RuntimeError(f"Caricamento fallito: {filename}")
+            samples.append(elapsed * 1000.0)
+        results[os.path.basename(filename)] = min(samples)
+    return results
+
+
+def bench_throughput(filename, bars, repeat):
+    """
+    Eventi al secondo attraverso _playback_loop verso un'uscita nulla.
+
+    Il loop gira su un orologio virtuale (come il render offline): si misura
+    il costo del loop, non le attese del tempo reale.
+    """
+    player = load_player(filename)
+    section_name = main_section(player)
+    ticks_per_measure = player.time_signature_numerator * player.ticks_per_beat
+    best = None
+    messages = 0
+    for _ in range(repeat):
+        clock = VirtualClock()
+        tempo_map = TempoMap(player.ticks_per_beat, player.tempo_bpm)
+        scheduler = clock.make_scheduler()
+        clock.time_of = lambda tick: scheduler.origin + tempo_map.time_at(tick)
+        clock.schedule(bars * ticks_per_measure, lambda: setattr(player, 'playing', False))
+
+        output = NullOutput()
+        player.scheduler = scheduler
+        player.midi_output = output
+        player.prefetch_variants = False
+        player.current_section = section_name
+        player.set_chord(7, '7')
+        player.playing = True
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            player._playback_loop(section_name, True, tempo_map)
+            elapsed = time.perf_counter() - start
+        messages = output.messages
+        best = elapsed if best is None else min(best, elapsed)
+    return {'events_per_sec': messages / best, 'events': messages}
+
+
+def bench_jitter(filename, tempos, seconds):
+    """
+    Percentili del ritardo fra scadenza e invio effettivo (ms, per evento)
+    in playback reale, per ogni tempo, dalla strumentazione del player.
+    """
+    player = load_player(filename)
+    section_name = main_section(player)
+    results = {}
+    for bpm in tempos:
+        player.scheduler = DeadlineScheduler()
+        player.timing = TimingStats()
+        player.midi_output = NullOutput()
+        player.set_tempo(bpm)
+        player.current_section = section_name
+        player.set_chord(0, 'Maj')
+        player.playing = True
+        thread = threading.Thread(target=player._playback_loop, args=(section_name, True),
+                                  daemon=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            thread.start()
+            time.sleep(seconds)
+            player.playing = False
+            thread.join()
+
+        lateness = player.timing.lateness
+        entry = {f'p{pct}_ms': lateness.percentile(pct) / 1000.0 for pct in PERCENTILES}
+        entry['max_ms'] = lateness.max_us / 1000.0
+        entry['events'] = lateness.total
+        results[str(bpm)] = entry
+    return results
+
+
+def chord_voicings():
+    """Voicing di tutti i tipi di accordo in tutte le tonalità, più note sparse"""
+    voicings = []
+    for root in range(12):
+        for intervals in ChordRecognizer.CHORD_PATTERNS.values():
+            voicings.append([48 + root + interval for interval in intervals])
+            # Rivolto con il basso una ottava sotto
+            voicings.append([36 + root + intervals[-1]] + [60 + root + i for i in intervals])
+    voicings.append([60, 61, 62])
+    voicings.append([60])
+    return voicings
+
+
+def bench_chords(repeat, rounds):
+    """Riconoscimenti (note_on con analisi dell'accordo) al secondo"""
+    recognizer = ChordRecognizer()
+    voicings = chord_voicings()
+    calls = sum(len(voicing) for voicing in voicings) * rounds
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for voicing in voicings:
+                recognizer.clear()
+                for note in voicing:
+                    recognizer.note_on(note)
+                recognizer.get_current_chord()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'calls_per_sec': calls / best}
+
+
+# ---------------------------------------------------------------- baseline
+
+def flatten(results):
+    """
+    Metriche piatte per il confronto: nome -> (valore, True se più alto è meglio).
+    """
+    metrics = {}
+    for name, ms in results['load_ms'].items():
+        metrics[f'load.{name}'] = (ms, False)
+    metrics['load.total'] = (sum(results['load_ms'].values()), False)
+    metrics['playback.events_per_sec'] = (results['playback']['events_per_sec'], True)
+    for bpm, entry in results['jitter'].items():
+        for key in [f'p{pct}_ms' for pct in PERCENTILES]:
+            metrics[f'jitter.{bpm}.{key}'] = (entry[key], False)
+    metrics['chords.calls_per_sec'] = (results['chords']['calls_per_sec'], True)
+    return metrics
+
+
+def compare(results, baseline, tolerance):
+    """
+    Confronta con la baseline.
+
+    Returns:
+        list: (metrica, baseline, attuale, variazione relativa) delle regressioni
+    """
+    current = flatten(results)
+    reference = flatten(baseline)
+    regressions = []
+    for name, (value, higher_is_better) in current.items():
+        if name not in reference:
+            continue
+        base = reference[name][0]
+        if not base:
+            continue
+        change = (value - base) / base
+        worse = -change if higher_is_better else change
+        if worse <= tolerance:
+            continue
+        slack = next((ms for prefix, ms in ABSOLUTE_SLACK.items() if name.startswith(prefix)), 0.0)
+        if abs(value - base) <= slack:
+            continue
+        regressions.append((name, base, value, change))
+    return regressions
+
+
+def run(args):
+    files = sorted(glob.glob(os.path.join(args.dir, '*.[sS][tT][yY]')))
+    if not files:
+        raise RuntimeError(f"Nessun file .sty in {args.dir}")
+    repeat = 1 if args.quick else args.repeat
+
+    print(f"Caricamento di {len(files)} style...")
+    load_ms = bench_load(files, repeat)
+    print("Throughput del loop di playback...")
+    playback = bench_throughput(args.style, bars=16 if args.quick else 64, repeat=repeat)
+    print(f"Jitter a {', '.join(str(t) for t in args.tempos)} BPM...")
+    jitter = bench_jitter(args.style, args.tempos, 1.0 if args.quick else args.seconds)
+    print("Riconoscimento accordi...")
+    chords = bench_chords(repeat, rounds=5 if args.quick else 50)
+
+    return {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'mode': 'quick' if args.quick else 'full',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'load_ms': load_ms,
+        'playback': playback,
+        'jitter': jitter,
+        'chords': chords,
+    }
+
+
+def print_results(results):
+    print()
+    print(f"{'Style':40s} {'load ms':>9s}")
+    print("-" * 50)
+    for name, ms in results['load_ms'].items():
+        print(f"{name[:40]:40s} {ms:9.2f}")
+    print(f"{'Totale':40s} {sum(results['load_ms'].values()):9.2f}")
+    print()
+    playback = results['playback']
+    print(f"Playback: {playback['events_per_sec']:,.0f} eventi/s ({playback['events']} eventi)")
+    print(f"Accordi: {results['chords']['calls_per_sec']:,.0f} riconoscimenti/s")
+    print()
+    print(f"{'BPM':>5s} " + ' '.join(f"{f'p{pct} ms':>8s}" for pct in PERCENTILES)
+          + f" {'max ms':>8s} {'eventi':>6s}")
+    for bpm, entry in results['jitter'].items():
+        print(f"{bpm:>5s} " + ' '.join(f"{entry[f'p{pct}_ms']:8.3f}" for pct in PERCENTILES)
+              + f" {entry['max_ms']:8.3f} {entry['events']:6d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=DEFAULT_STYLE_DIR, help="cartella con i file .sty")
+    parser.add_argument('--style', default=DEFAULT_STYLE, help="style per playback e jitter")
+    parser.add_argument('--repeat', type=int, default=5, help="ripetizioni delle misure")
+    parser.add_argument('--seconds', type=float, default=3.0,
+                        help="durata di ogni misura di jitter")
+    parser.add_argument('--tempos', type=int, nargs='+', default=list(JITTER_TEMPOS),
+                        help="tempi (BPM) per il jitter")
+    parser.add_argument('--quick', action='store_true', help="giri ridotti")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="file JSON della baseline")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="salva i risultati come baseline")
+    parser.add_argument('--output', help="salva i risultati anche in questo file JSON")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="peggioramento relativo ammesso (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(args)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline salvata in {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNessuna baseline in {args.baseline} (usa --save-baseline)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('mode') != results['mode']:
+        # Giri e durate diversi: i numeri non sono confrontabili
+        print(f"\nBaseline in modalità '{baseline.get('mode')}': confronto saltato")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    print(f"\nConfronto con la baseline del {baseline.get('created', '?')} "
+          f"(tolleranza {args.tolerance:.0%})")
+    if not regressions:
+        print("Nessuna regressione")
+        return 0
+    for name, base, value, change in regressions:
+        print(f"  REGRESSIONE {name}: {base:.3f} -> {value:.3f} ({change:+.0%})")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,27 @@
 #!/usr/bin/env python3
 """Verifica quale accordo base è registrato nello style"""
 
+import os
 import sys
 sys.path.insert(0, 'src')
 
 from style_player import StylePlayer
 
-sty_file = r'sty\stili_miei\Swing1.S733.sty'
+sty_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join('sty', 'stili_miei', 'Swing1.S733.sty')
 player = StylePlayer()
 
 NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
 if player.load_style(sty_file):
     section = player.sections['Main A']
-    events = section['events']
+    timeline = section['timeline']
 
     # Raccogli solo le classi di note (senza ottava)
     note_classes = set()
 
-    for event in events:
-        if event.type == 'note_on' and event.velocity > 0:
-            note_class = event.note % 12
+    for tick, channel, status, data in timeline:
+        if status & 0xF0 == 0x90 and data[1] > 0:
+            note_class = data[0] % 12
             note_classes.add(note_class)
 
     # Converti in nomi
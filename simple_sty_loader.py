@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 """Parser semplificato per file .STY Yamaha usando mido"""
 
+import os
+import sys
+
 import mido
 from pprint import pprint
 
-sty_file = r'sty\stili_miei\Swing1.S733.sty'
+sty_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join('sty', 'stili_miei', 'Swing1.S733.sty')
 
 print(f"Caricamento file: {sty_file}")
 print("=" * 80)
@@ -0,0 +1,217 @@
+"""
+ChannelState - Stato di program e controller dei canali MIDI (per reinviare solo le differenze)
+"""
+
+from style_timeline import SYSEX
+
+
+CONTROL_CHANGE = 0xB0
+PROGRAM_CHANGE = 0xC0
+CHANNEL_PRESSURE = 0xD0
+PITCH_BEND = 0xE0
+
+BANK_SELECT_MSB = 0
+BANK_SELECT_LSB = 32
+
+# Nomi dei controller più comuni nel setup di uno style (vedi ChannelState.summary)
+CONTROL_NAMES = {
+    BANK_SELECT_MSB: 'bank_msb',
+    BANK_SELECT_LSB: 'bank_lsb',
+    1: 'modulation',
+    7: 'volume',
+    10: 'pan',
+    11: 'expression',
+    64: 'sustain',
+    71: 'resonance',
+    74: 'brightness',
+    91: 'reverb',
+    93: 'chorus',
+    94: 'variation',
+}
+
+# Controller RPN/NRPN e data entry: il valore dipende dal parametro
+# selezionato prima, quindi non si possono reinviare da soli
+SEQUENCED_CONTROLS = frozenset((6, 38, 96, 97, 98, 99, 100, 101))
+
+DATA_ENTRY_MSB = 6
+DATA_ENTRY_LSB = 38
+NRPN_LSB = 98
+NRPN_MSB = 99
+RPN_LSB = 100
+RPN_MSB = 101
+
+# Selettori (MSB, LSB) per tipo di parametro
+_SELECTORS = {'rpn': (RPN_MSB, RPN_LSB), 'nrpn': (NRPN_MSB, NRPN_LSB)}
+NULL_PARAMETER = (127, 127)  # RPN nullo: nessun parametro selezionato
+
+
+def state_key(status, data):
+    """
+    Chiave dello stato impostato da un messaggio.
+
+    Returns:
+        tuple (status,) o (status, controller), None se il messaggio non
+        lascia uno stato da ripristinare da solo (note, sysex, RPN/NRPN:
+        vedi ChannelState._apply_parameter)
+    """
+    kind = status & 0xF0
+    if kind == CONTROL_CHANGE:
+        if data[0] in SEQUENCED_CONTROLS:
+            return None
+        return (status, data[0])
+    if kind == PROGRAM_CHANGE or kind == CHANNEL_PRESSURE or kind == PITCH_BEND:
+        return (status,)
+    return None
+
+
+class ChannelState:
+    """
+    Ultimo valore di program change, controller, pressure e pitch bend per
+    ogni canale, nell'ordine in cui sono stati impostati.
+
+    I parametri RPN/NRPN (es. pitch bend range) sono unità ordinate: i due
+    selettori seguiti dai data entry, con chiave (status, 'rpn' o 'nrpn',
+    MSB, LSB); diff le reinvia per intero.
+    """
+
+    __slots__ = ('values', 'selected')
+
+    def __init__(self, values=None, selected=None):
+        # chiave (vedi state_key) -> (status, data); per i parametri RPN/NRPN
+        # chiave (status, tipo, msb, lsb) -> tupla di (status, data)
+        self.values = dict(values) if values else {}
+        # canale -> [tipo attivo, rpn msb, rpn lsb, nrpn msb, nrpn lsb]
+        self.selected = {}
+        if selected:
+            self.selected = {channel: list(sel) for channel, sel in selected.items()}
+
+    @classmethod
+    def from_messages(cls, messages):
+        """Stato lasciato da una lista di messaggi mido (es. eventi di setup)"""
+        state = cls()
+        for msg in messages:
+            if msg.type == 'sysex':
+                continue
+            raw = msg.bytes()
+            state.apply(raw[0], bytes(raw[1:]))
+        return state
+
+    def copy(self):
+        return ChannelState(self.values, self.selected)
+
+    def apply(self, status, data):
+        if (status & 0xF0) == CONTROL_CHANGE and data[0] in SEQUENCED_CONTROLS:
+            self._apply_parameter(status, data)
+            return
+        key = state_key(status, data)
+        if key is not None:
+            # Reinserisce in coda: l'ordine resta quello dell'ultimo invio
+            self.values.pop(key, None)
+            self.values[key] = (status, data)
+
+    def _apply_parameter(self, status, data):
+        """Selettore RPN/NRPN o data entry: aggiorna l'unità del parametro selezionato"""
+        control = data[0]
+        selected = self.selected.setdefault(status & 0x0F, [None, 127, 127, 127, 127])
+        if control == RPN_MSB or control == RPN_LSB:
+            selected[0] = 'rpn'
+            selected[1 if control == RPN_MSB else 2] = data[1]
+            return
+        if control == NRPN_MSB or control == NRPN_LSB:
+            selected[0] = 'nrpn'
+            selected[3 if control == NRPN_MSB else 4] = data[1]
+            return
+
+        kind = selected[0]
+        if kind is None:
+            return  # data entry senza parametro selezionato: nessun effetto
+        msb, lsb = selected[1:3] if kind == 'rpn' else selected[3:5]
+        if kind == 'rpn' and (msb, lsb) == NULL_PARAMETER:
+            return
+        key = (status, kind, msb, lsb)
+        unit = self.values.pop(key, None)
+        entries = list(unit[2:]) if unit else []
+        if control == DATA_ENTRY_MSB:
+            entries = []  # valore assoluto: sostituisce quanto inviato prima
+        elif control == DATA_ENTRY_LSB:
+            entries = [entry for entry in entries if entry[1][0] != DATA_ENTRY_LSB]
+        entries.append((status, data))
+        select_msb, select_lsb = _SELECTORS[kind]
+        self.values[key] = ((status, bytes((select_msb, msb))),
+                            (status, bytes((select_lsb, lsb)))) + tuple(entries)
+
+    def apply_timeline(self, timeline, end_tick=None):
+        """Applica gli eventi (tick, canale, status, data) della timeline prima di end_tick"""
+        for tick, channel, status, data in timeline:
+            if end_tick is not None and tick >= end_tick:
+                break
+            if status != SYSEX:
+                self.apply(status, data)
+
+    def forget(self, channel):
+        """Dimentica lo stato di un canale (modificato da altri: valore ignoto)"""
+        for key in [key for key in self.values if key[0] & 0x0F == channel]:
+            del self.values[key]
+        self.selected.pop(channel, None)
+
+    def summary(self):
+        """
+        Stato leggibile per canale.
+
+        Returns:
+            dict canale -> dict nome -> valore ('program', 'bank_msb',
+            'volume', 'pan', 'reverb', ..., 'cc<numero>' per gli altri
+            controller, 'pressure', 'pitch_bend' da -8192 a 8191,
+            'rpn<msb>.<lsb>' / 'nrpn<msb>.<lsb>' con l'ultimo data entry MSB)
+        """
+        channels = {}
+        for key, event in self.values.items():
+            if len(key) == 4:
+                values = channels.setdefault(key[0] & 0x0F, {})
+                entries = [data[1] for _, data in event[2:] if data[0] == DATA_ENTRY_MSB]
+                values[f'{key[1]}{key[2]}.{key[3]}'] = entries[-1] if entries else None
+                continue
+            status, data = event
+            values = channels.setdefault(status & 0x0F, {})
+            kind = status & 0xF0
+            if kind == CONTROL_CHANGE:
+                values[CONTROL_NAMES.get(data[0], f'cc{data[0]}')] = data[1]
+            elif kind == PROGRAM_CHANGE:
+                values['program'] = data[0]
+            elif kind == CHANNEL_PRESSURE:
+                values['pressure'] = data[0]
+            else:
+                values['pitch_bend'] = (data[0] | (data[1] << 7)) - 8192
+        return channels
+
+    def diff(self, target):
+        """
+        Messaggi da inviare per passare da questo stato a target.
+
+        Il bank select da solo non ha effetto: se cambia il banco di un
+        canale viene reinviato anche il suo program change. Un parametro
+        RPN/NRPN cambiato si reinvia per intero: selettori e data entry.
+
+        Returns:
+            list di (status, data) nell'ordine di target
+        """
+        values = self.values
+        changed_banks = set()
+        for key, event in target.values.items():
+            if (len(key) == 2 and key[1] in (BANK_SELECT_MSB, BANK_SELECT_LSB)
+                    and values.get(key) != event):
+                changed_banks.add(key[0] & 0x0F)
+
+        changes = []
+        for key, event in target.values.items():
+            if values.get(key) != event:
+                if len(key) == 4:
+                    changes.extend(event)
+                else:
+                    changes.append(event)
+            elif (key[0] & 0xF0) == PROGRAM_CHANGE and (key[0] & 0x0F) in changed_banks:
+                changes.append(event)
+        return changes
+
+    def __len__(self):
+        return len(self.values)
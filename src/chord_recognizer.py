@@ -2,43 +2,224 @@
 ChordRecognizer - Riconosce accordi dal MIDI input
 """
 
+# Soglia di confidenza sotto cui l'accordo è 'unknown'
+MIN_CONFIDENCE = 0.6
+
+# Penalità di un voicing senza root: a parità di note vince la lettura con root
+ROOTLESS_PENALTY = 0.05
+
+# Intervalli omessi nei voicing senza root (la root e la quinta giusta)
+_ROOTLESS_OMITTED = (1 << 0) | (1 << 7)
+
+# Note minime (oltre root e quinta) perché un accordo si riconosca senza root
+ROOTLESS_MIN_NOTES = 3
+
+# Tabelle già calcolate per configurazione (vocabolario, preferenze, rootless)
+_chord_tables = {}
+
+
+def _rotate(mask, root):
+    """Maschera a 12 bit vista dalla root (bit 0 = root)"""
+    return ((mask >> root) | (mask << (12 - root))) & 0xFFF
+
+
+def build_chord_table(patterns, preferences=None, rootless=True):
+    """
+    Precalcola il riconoscimento per tutte le combinazioni di basso e classi di nota.
+
+    La combinazione è una maschera a 12 bit (bit n = classe di nota n, 0 = C).
+    Per ogni root candidata e ogni pattern lo score è la frazione di note in
+    comune sul totale delle note (suonate o attese), +0.5 se tutte le note
+    del pattern sono suonate. Con rootless le root non suonate valgono per
+    gli accordi estesi i cui intervalli, tolte root e quinta, sono tutti
+    suonati (score di un pattern completo meno ROOTLESS_PENALTY).
+
+    Vince lo score più alto; a parità la root uguale al basso (rivolti),
+    poi il tipo preferito, poi la root più bassa.
+
+    Args:
+        patterns: dict tipo -> intervalli dalla root (vedi CHORD_PATTERNS)
+        preferences: tipi in ordine di preferenza; gli altri seguono
+            nell'ordine di patterns (None = ordine di patterns)
+        rootless: riconosce anche i voicing senza root
+
+    Returns:
+        list di 12 * 4096 tuple (root, tipo, confidenza) indicizzata con
+        basso << 12 | maschera, None per la maschera 0; tipo 'single'
+        (confidenza None) per una sola classe di nota, 'unknown' con root la
+        classe più bassa se lo score non supera MIN_CONFIDENCE
+    """
+    ranked = [chord_type for chord_type in (preferences or ()) if chord_type in patterns]
+    ranked += [chord_type for chord_type in patterns if chord_type not in ranked]
+    bit_count = [bin(mask).count('1') for mask in range(4096)]
+    pattern_masks = [(rank, chord_type,
+                      sum(1 << (interval % 12) for interval in patterns[chord_type]))
+                     for rank, chord_type in enumerate(ranked)]
+    rootless_masks = []
+    if rootless:
+        for rank, chord_type, pattern_mask in pattern_masks:
+            voicing = pattern_mask & ~_ROOTLESS_OMITTED
+            if bit_count[voicing] >= ROOTLESS_MIN_NOTES and bit_count[pattern_mask] >= 5:
+                rootless_masks.append((rank, chord_type, voicing))
+
+    # Miglior tipo per le classi viste dalla root: lo score di una root
+    # dipende solo dalla maschera ruotata su di essa. Con root suonata
+    # (bit 0) vale lo score pieno, senza solo i voicing rootless completi
+    from_root = [None] * 4096
+    for relative in range(1, 4096):
+        best = None
+        if relative & 1:
+            for rank, chord_type, pattern_mask in pattern_masks:
+                score = bit_count[relative & pattern_mask] / bit_count[relative | pattern_mask]
+                if relative & pattern_mask == pattern_mask:
+                    score += 0.5
+                if best is None or score > best[0]:
+                    best = (score, rank, chord_type)
+        else:
+            for rank, chord_type, voicing in rootless_masks:
+                if relative & voicing == voicing:
+                    score = (bit_count[voicing] / bit_count[relative | voicing] + 0.5
+                             - ROOTLESS_PENALTY)
+                    if best is None or score > best[0]:
+                        best = (score, rank, chord_type)
+        from_root[relative] = best
+
+    table = [None] * (12 * 4096)
+    for mask in range(1, 4096):
+        classes = [pc for pc in range(12) if mask >> pc & 1]
+        if len(classes) == 1:
+            entry = (classes[0], 'single', None)
+            for bass in range(12):
+                table[bass << 12 | mask] = entry
+            continue
+
+        candidates = []
+        best_score = 0
+        for root in range(12):
+            best = from_root[_rotate(mask, root)]
+            if best is None:
+                continue
+            candidates.append((best[0], best[1], root, best[2]))
+            best_score = max(best_score, best[0])
+
+        if best_score <= MIN_CONFIDENCE:
+            entry = (classes[0], 'unknown', best_score)
+            for bass in range(12):
+                table[bass << 12 | mask] = entry
+            continue
+
+        tied = sorted((rank, root, chord_type) for score, rank, root, chord_type in candidates
+                      if score == best_score)
+        default = (tied[0][1], tied[0][2], best_score)
+        for bass in range(12):
+            entry = default
+            for rank, root, chord_type in tied:
+                if root == bass:
+                    entry = (root, chord_type, best_score)
+                    break
+            table[bass << 12 | mask] = entry
+    return table
+
+
+def chord_table(patterns, preferences=None, rootless=True):
+    """Tabella di build_chord_table, calcolata una volta per configurazione"""
+    key = (tuple((chord_type, tuple(intervals)) for chord_type, intervals in patterns.items()),
+           tuple(preferences or ()), bool(rootless))
+    table = _chord_tables.get(key)
+    if table is None:
+        table = build_chord_table(patterns, preferences, rootless)
+        _chord_tables[key] = table
+    return table
+
 
 class ChordRecognizer:
-    """Riconosce accordi dalle note MIDI suonate"""
+    """
+    Riconosce accordi dalle note MIDI suonate.
+
+    Il vocabolario (CHORD_PATTERNS o uno personalizzato) è compilato una
+    volta in una tabella indicizzata da basso e classi di nota: il costo per
+    nota non dipende dal numero di accordi conosciuti.
+    """
 
     # Nomi delle note
     NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
-    # Pattern di accordi comuni (intervalli dalla root)
+    # Pattern di accordi (intervalli dalla root). L'ordine è anche la
+    # preferenza a parità di score (vedi build_chord_table)
     CHORD_PATTERNS = {
-        'Maj': [0, 4, 7],           # Maggiore: C E G
-        'min': [0, 3, 7],           # Minore: C Eb G
-        'Maj7': [0, 4, 7, 11],      # Maggiore 7: C E G B
-        'min7': [0, 3, 7, 10],      # Minore 7: C Eb G Bb
-        '7': [0, 4, 7, 10],         # Dominante 7: C E G Bb
-        'dim': [0, 3, 6],           # Diminuito: C Eb Gb
-        'aug': [0, 4, 8],           # Aumentato: C E G#
-        'sus4': [0, 5, 7],          # Sospeso 4: C F G
-        'sus2': [0, 2, 7],          # Sospeso 2: C D G
-        '6': [0, 4, 7, 9],          # Maggiore 6: C E G A
-        'min6': [0, 3, 7, 9],       # Minore 6: C Eb G A
-        'dim7': [0, 3, 6, 9],       # Diminuito 7: C Eb Gb Bbb
-        'm7b5': [0, 3, 6, 10],      # Semi-diminuito: C Eb Gb Bb
+        'Maj': [0, 4, 7],                   # Maggiore: C E G
+        'min': [0, 3, 7],                   # Minore: C Eb G
+        'Maj7': [0, 4, 7, 11],              # Maggiore 7: C E G B
+        'min7': [0, 3, 7, 10],              # Minore 7: C Eb G Bb
+        '7': [0, 4, 7, 10],                 # Dominante 7: C E G Bb
+        'dim': [0, 3, 6],                   # Diminuito: C Eb Gb
+        'aug': [0, 4, 8],                   # Aumentato: C E G#
+        'sus4': [0, 5, 7],                  # Sospeso 4: C F G
+        'sus2': [0, 2, 7],                  # Sospeso 2: C D G
+        '6': [0, 4, 7, 9],                  # Maggiore 6: C E G A
+        'min6': [0, 3, 7, 9],               # Minore 6: C Eb G A
+        'dim7': [0, 3, 6, 9],               # Diminuito 7: C Eb Gb Bbb
+        'm7b5': [0, 3, 6, 10],              # Semi-diminuito: C Eb Gb Bb
+        '7sus4': [0, 5, 7, 10],             # Settima sospesa: C F G Bb
+        'add9': [0, 2, 4, 7],               # Maggiore add 9: C D E G
+        'madd9': [0, 2, 3, 7],              # Minore add 9: C D Eb G
+        '9': [0, 2, 4, 7, 10],              # Nona: C E G Bb D
+        'Maj9': [0, 2, 4, 7, 11],           # Maggiore 9: C E G B D
+        'min9': [0, 2, 3, 7, 10],           # Minore 9: C Eb G Bb D
+        '6/9': [0, 2, 4, 7, 9],             # Sesta e nona: C E G A D
+        '11': [0, 2, 4, 5, 7, 10],          # Undicesima: C E G Bb D F
+        'min11': [0, 2, 3, 5, 7, 10],       # Minore 11: C Eb G Bb D F
+        '13': [0, 2, 4, 7, 9, 10],          # Tredicesima: C E G Bb D A
+        '7b9': [0, 1, 4, 7, 10],            # Settima nona bemolle: C E G Bb Db
+        '7#9': [0, 3, 4, 7, 10],            # Settima nona diesis: C E G Bb D#
+        '7#5': [0, 4, 8, 10],               # Settima quinta aumentata: C E G# Bb
+        '7b5': [0, 4, 6, 10],               # Settima quinta diminuita: C E Gb Bb
+        '7#11': [0, 4, 6, 7, 10],           # Settima undicesima aumentata: C E G Bb F#
+        '7b13': [0, 4, 7, 8, 10],           # Settima tredicesima bemolle: C E G Bb Ab
+        'Maj7#11': [0, 4, 6, 7, 11],        # Maggiore 7 undicesima aumentata: C E G B F#
+        'Maj7#5': [0, 4, 8, 11],            # Maggiore 7 quinta aumentata: C E G# B
+        'minMaj7': [0, 3, 7, 11],           # Minore maggiore 7: C Eb G B
+        'minMaj9': [0, 2, 3, 7, 11],        # Minore maggiore 9: C Eb G B D
+        '5': [0, 7],                        # Bicordo (power chord): C G
     }
 
-    def __init__(self):
+    # Nomi mostrati per i tipi che non sono pattern
+    _TYPE_NAMES = {'single': '', 'unknown': '?'}
+
+    def __init__(self, patterns=None, preferences=None, rootless=True):
+        """
+        Args:
+            patterns: vocabolario tipo -> intervalli (None = CHORD_PATTERNS)
+            preferences: tipi preferiti a parità di score, in ordine
+            rootless: riconosce anche i voicing senza root degli accordi estesi
+        """
+        self.patterns = patterns if patterns is not None else self.CHORD_PATTERNS
+        self._table = chord_table(self.patterns, preferences, rootless)
         self.active_notes = set()  # Note attualmente premute (MIDI note numbers)
         self.current_chord = None  # Accordo corrente riconosciuto
         self.bass_note = None      # Nota più bassa (per rivolti)
+        # Note premute per classe e maschera a 12 bit delle classi presenti,
+        # aggiornate a ogni nota: l'analisi è un accesso alla tabella
+        self._class_counts = [0] * 12
+        self._mask = 0
 
     def note_on(self, note):
         """Registra una nota premuta"""
-        self.active_notes.add(note)
+        if note not in self.active_notes:
+            self.active_notes.add(note)
+            pitch_class = note % 12
+            self._class_counts[pitch_class] += 1
+            self._mask |= 1 << pitch_class
         self._analyze_chord()
 
     def note_off(self, note):
         """Registra una nota rilasciata"""
-        self.active_notes.discard(note)
+        if note in self.active_notes:
+            self.active_notes.discard(note)
+            pitch_class = note % 12
+            self._class_counts[pitch_class] -= 1
+            if not self._class_counts[pitch_class]:
+                self._mask &= ~(1 << pitch_class)
         self._analyze_chord()
 
     def clear(self):
@@ -46,80 +227,30 @@ class ChordRecognizer:
         self.active_notes.clear()
         self.current_chord = None
         self.bass_note = None
+        self._class_counts = [0] * 12
+        self._mask = 0
 
     def _analyze_chord(self):
-        """Analizza le note attive e identifica l'accordo"""
-        if len(self.active_notes) == 0:
+        """Identifica l'accordo delle note attive dalla tabella precalcolata"""
+        if not self.active_notes:
             self.current_chord = None
             self.bass_note = None
             return
 
-        # Converti note in classi (0-11, ignorando ottave)
-        note_classes = set(note % 12 for note in self.active_notes)
-
-        # Trova la nota più bassa (bass)
+        mask = self._mask
         self.bass_note = min(self.active_notes) % 12
-
-        # Se c'è solo una nota, non è un accordo
-        if len(note_classes) == 1:
-            root = list(note_classes)[0]
-            self.current_chord = {
-                'root': root,
-                'root_name': self.NOTE_NAMES[root],
-                'type': 'single',
-                'type_name': '',
-                'notes': note_classes,
-                'bass': self.bass_note
-            }
-            return
-
-        # Prova a identificare l'accordo provando ogni nota come root
-        best_match = None
-        best_score = 0
-
-        for potential_root in note_classes:
-            for chord_type, pattern in self.CHORD_PATTERNS.items():
-                # Calcola le note attese per questo accordo
-                expected_notes = set((potential_root + interval) % 12 for interval in pattern)
-
-                # Calcola quante note corrispondono
-                matches = len(note_classes & expected_notes)
-                total = len(note_classes | expected_notes)
-
-                # Score: percentuale di match
-                score = matches / total if total > 0 else 0
-
-                # Bonus se tutte le note dell'accordo ci sono
-                if note_classes >= expected_notes:
-                    score += 0.5
-
-                if score > best_score:
-                    best_score = score
-                    best_match = {
-                        'root': potential_root,
-                        'root_name': self.NOTE_NAMES[potential_root],
-                        'type': chord_type,
-                        'type_name': chord_type,
-                        'notes': note_classes,
-                        'bass': self.bass_note,
-                        'confidence': score
-                    }
-
-        # Accetta solo se lo score è abbastanza alto
-        if best_match and best_score > 0.6:
-            self.current_chord = best_match
-        else:
-            # Accordo non riconosciuto - usa almeno la root e le note
-            root = min(note_classes)  # Usa la nota più bassa come root
-            self.current_chord = {
-                'root': root,
-                'root_name': self.NOTE_NAMES[root],
-                'type': 'unknown',
-                'type_name': '?',
-                'notes': note_classes,
-                'bass': self.bass_note,
-                'confidence': best_score
-            }
+        root, chord_type, confidence = self._table[self.bass_note << 12 | mask]
+        self.current_chord = {
+            'root': root,
+            'root_name': self.NOTE_NAMES[root],
+            'type': chord_type,
+            'type_name': self._TYPE_NAMES.get(chord_type, chord_type),
+            'notes': {pc for pc in range(12) if mask >> pc & 1},
+            'bass': self.bass_note
+        }
+        # Una nota sola non è un accordo: nessuna confidenza
+        if confidence is not None:
+            self.current_chord['confidence'] = confidence
 
     def get_current_chord(self):
         """
@@ -132,7 +263,8 @@ class ChordRecognizer:
                     'root_name': 'C',       # Nome della root
                     'type': 'Maj',          # Tipo accordo
                     'type_name': 'Maj',     # Nome tipo
-                    'notes': {0, 4, 7},     # Note dell'accordo
+                    'notes': {0, 4, 7},     # Note suonate (senza la root
+                                            # nei voicing rootless)
                     'bass': 0,              # Nota basso
                     'confidence': 0.95      # Confidenza (0-1)
                 }
@@ -149,15 +281,27 @@ class ChordRecognizer:
         if not self.current_chord:
             return None
 
-        root_name = self.current_chord['root_name']
-        type_name = self.current_chord['type_name']
+        chord = self.current_chord
+        name = f"{chord['root_name']}{chord['type_name']}"
 
-        # Se il basso è diverso dalla root, aggiungi il rivolto
-        if self.current_chord['bass'] != self.current_chord['root']:
-            bass_name = self.NOTE_NAMES[self.current_chord['bass']]
-            return f"{root_name}{type_name}/{bass_name}"
-        else:
-            return f"{root_name}{type_name}"
+        # Se il basso è diverso dalla root, aggiungi il rivolto (non nei
+        # voicing senza root: il basso lo suona qualcun altro)
+        bass = self.get_slash_bass()
+        if bass is not None:
+            return f"{name}/{self.NOTE_NAMES[bass]}"
+        return name
+
+    def get_slash_bass(self):
+        """
+        Basso dell'accordo in rivolto o slash chord (es. E per C/E).
+
+        Returns:
+            int 0-11, oppure None se il basso è la root o l'accordo è senza root
+        """
+        chord = self.current_chord
+        if not chord or chord['bass'] == chord['root'] or chord['root'] not in chord['notes']:
+            return None
+        return chord['bass']
 
     def get_notes_for_transposition(self):
         """
@@ -170,9 +314,9 @@ class ChordRecognizer:
             return None
 
         # Se abbiamo un pattern riconosciuto, usa quello
-        if self.current_chord['type'] in self.CHORD_PATTERNS:
+        if self.current_chord['type'] in self.patterns:
             root = self.current_chord['root']
-            pattern = self.CHORD_PATTERNS[self.current_chord['type']]
+            pattern = self.patterns[self.current_chord['type']]
             return set((root + interval) % 12 for interval in pattern)
 
         # Altrimenti usa le note effettivamente suonate
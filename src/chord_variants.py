@@ -0,0 +1,361 @@
+"""
+ChordVariants - Cache LRU delle sezioni già renderizzate per accordo
+"""
+
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from itertools import compress
+
+from note_engine import DRUM_CHANNEL, SectionArrays, build_channel_params, select_events
+from note_registry import NO_SOURCE
+from style_timeline import NOTE_OFF, NOTE_ON, event_to_bytes, timeline_ticks
+
+
+DEFAULT_MAX_VARIANTS = 128
+
+
+class VariantKey:
+    """
+    Parametri che determinano il contenuto di una variante renderizzata.
+
+    Due chiavi uguali producono sempre lo stesso stream di messaggi.
+    """
+
+    __slots__ = ('section_name', 'transpose', 'root', 'chord_type', 'chord_filter', 'melodic',
+                 'bass')
+
+    def __init__(self, section_name, transpose=0, root=0, chord_type=None,
+                 chord_filter=None, melodic=True, bass=None):
+        self.section_name = section_name
+        self.transpose = transpose
+        self.root = root
+        self.chord_type = chord_type
+        self.chord_filter = frozenset(chord_filter) if chord_filter is not None else None
+        self.melodic = melodic
+        self.bass = bass  # basso dello slash chord (None = la root)
+
+    def _astuple(self):
+        return (self.section_name, self.transpose, self.root, self.chord_type,
+                self.chord_filter, self.melodic, self.bass)
+
+    def with_section(self, section_name):
+        """Stessa variante per un'altra sezione"""
+        return VariantKey(section_name, self.transpose, self.root, self.chord_type,
+                          self.chord_filter, self.melodic, self.bass)
+
+    def __eq__(self, other):
+        if not isinstance(other, VariantKey):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def __repr__(self):
+        return f"VariantKey{self._astuple()}"
+
+
+class RenderedSection:
+    """
+    Stream di una sezione pronto per l'invio.
+
+    ticks[i] è il tick assoluto (nella sezione) di messages[i]; i messaggi
+    sono già codificati in bytes (pronti per MidiOutput.send_bytes) e
+    condivisi fra le varianti quando identici. sources[i] è la nota scritta
+    nello style prima della trasposizione (NO_SOURCE se non è una nota),
+    usata da ActiveNotes per abbinare i note off.
+    """
+
+    __slots__ = ('key', 'ticks', 'messages', 'sources', 'length_ticks')
+
+    def __init__(self, key, ticks, messages, sources, length_ticks):
+        self.key = key
+        self.ticks = ticks
+        self.messages = messages
+        self.sources = sources
+        self.length_ticks = length_ticks
+
+    def __len__(self):
+        return len(self.messages)
+
+
+def render_variant(section, key, message_for, rules=None, arrays=None):
+    """
+    Renderizza una sezione per l'accordo della variante.
+
+    Senza accordo (chord_type None) le note sono solo trasposte di
+    key.transpose semitoni, come faceva il loop di playback evento per
+    evento; con un accordo si applicano le regole CASM dei canali
+    (vedi note_engine). In entrambi i casi il canale drums (9) non viene
+    mai toccato e il filtro accordo, se impostato, scarta le altre note.
+
+    Args:
+        section: dict della sezione compilata ('timeline', 'length_ticks')
+        key: VariantKey con i parametri della variante
+        message_for: funzione (status, data) -> bytes del messaggio (condivisi)
+        rules: dict canale sorgente -> ChannelRule della sezione
+        arrays: SectionArrays della sezione (calcolato se None)
+
+    Returns:
+        tuple (ticks, messages, sources)
+    """
+    if key.chord_type is None:
+        return _render_transposed(section, key, message_for)
+
+    if arrays is None:
+        arrays = SectionArrays(section['timeline'])
+    params = build_channel_params(rules or {}, key.root, key.chord_type, key.bass)
+    timeline = section['timeline']
+    play, pitches = select_events(arrays, params, len(timeline), key.melodic, key.chord_filter)
+
+    # Note tenute e filtro accordo sono già applicati: qui si raccolgono i messaggi
+    ticks = array('I', compress(timeline_ticks(timeline), play))
+    messages = []
+    sources = bytearray()
+    for (_, _, status, data), note in zip(compress(timeline, play), pitches):
+        source = NO_SOURCE
+        if note >= 0:
+            source = data[0]
+            if note != source:
+                data = bytes((note, data[1]))
+        messages.append(message_for(status, data))
+        sources.append(source)
+    return ticks, messages, bytes(sources)
+
+
+def _render_transposed(section, key, message_for):
+    """Trasposizione semplice di tutte le note non drums (nessun accordo noto)"""
+    transpose = key.transpose
+    chord_filter = key.chord_filter
+    melodic = key.melodic
+
+    ticks = array('I')
+    messages = []
+    sources = bytearray()
+    for tick, channel, status, data in section['timeline']:
+        kind = status & 0xF0
+        source = NO_SOURCE
+        if kind == NOTE_ON or kind == NOTE_OFF:
+            source = data[0]
+            if channel != DRUM_CHANNEL:
+                if not melodic:
+                    continue
+                note = source
+                if transpose != 0:
+                    note = max(0, min(127, note + transpose))
+                if chord_filter is not None and note % 12 not in chord_filter:
+                    continue
+                if note != source:
+                    data = bytes((note, data[1]))
+        ticks.append(tick)
+        messages.append(message_for(status, data))
+        sources.append(source)
+    return ticks, messages, bytes(sources)
+
+
+class ChordVariantCache:
+    """
+    Cache LRU degli stream renderizzati per (sezione, trasposizione, accordo).
+
+    Applicare un accordo diventa la sostituzione di un riferimento allo
+    stream già pronto. Le varianti sono costruite al primo uso oppure in
+    anticipo (prefetch) per l'accordo tenuto, per le altre sezioni.
+    Thread-safe: viene usata sia dal thread GUI che da quello di playback.
+    """
+
+    def __init__(self, max_variants=DEFAULT_MAX_VARIANTS, renderer=render_variant):
+        self.max_variants = max_variants
+        self.renderer = renderer
+        self.sections = {}
+        self.casm = {}
+        self._arrays = {}
+        self._variants = OrderedDict()
+        self._messages = {}
+        self._lock = threading.Lock()
+
+        # Contatori
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.render_time = 0.0
+
+    def set_sections(self, sections, casm=None):
+        """
+        Imposta le sezioni compilate dello style corrente e svuota la cache.
+
+        Args:
+            sections: dict nome -> sezione compilata
+            casm: dict nome sezione -> {canale: ChannelRule} (regole CASM)
+        """
+        with self._lock:
+            self.sections = sections
+            self.casm = casm or {}
+            # Dict nuovi: i render in corso tengono quelli dello style precedente
+            self._arrays = {}
+            self._variants.clear()
+            self._messages = {}
+
+    def get(self, key):
+        """
+        Ritorna la variante richiesta, renderizzandola se necessario.
+
+        Returns:
+            RenderedSection oppure None se la sezione non esiste
+        """
+        with self._lock:
+            variant = self._variants.get(key)
+            if variant is not None:
+                self._variants.move_to_end(key)
+                self.hits += 1
+                return variant
+            section = self.sections.get(key.section_name)
+            if section is None:
+                return None
+            self.misses += 1
+
+        # Il render avviene fuori dal lock: un prefetch in corso non blocca il playback
+        return self._store(key, section, *self._render(key, section))
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._variants
+
+    def prefetch(self, key):
+        """
+        Renderizza in anticipo la variante, senza contare hit/miss.
+
+        Returns:
+            bool: True se è stata renderizzata ora
+        """
+        with self._lock:
+            if key in self._variants:
+                return False
+            section = self.sections.get(key.section_name)
+            if section is None:
+                return False
+        self._store(key, section, *self._render(key, section))
+        return True
+
+    def _render(self, key, section):
+        """
+        Renderizza la variante fuori dal lock. I messaggi codificati ora e
+        le colonne della sezione restano in dict locali, uniti alla cache
+        da _store solo se lo style non è cambiato nel frattempo.
+
+        Returns:
+            (RenderedSection, dict dei nuovi messaggi, SectionArrays o None)
+        """
+        with self._lock:
+            shared = self._messages
+            rules = self.casm.get(key.section_name, {})
+            arrays = self._arrays.get(key.section_name)
+        new_messages = {}
+
+        def message_for(status, data):
+            """Byte del messaggio (status, data): codificati una volta sola e condivisi"""
+            cache_key = (status, data)
+            msg = shared.get(cache_key)
+            if msg is None:
+                msg = new_messages.get(cache_key)
+                if msg is None:
+                    msg = event_to_bytes(status, data)
+                    new_messages[cache_key] = msg
+            return msg
+
+        start = time.perf_counter()
+        if key.chord_type is None:
+            ticks, messages, sources = self.renderer(section, key, message_for)
+        else:
+            if arrays is None:
+                arrays = SectionArrays(section['timeline'])
+            ticks, messages, sources = self.renderer(section, key, message_for,
+                                                     rules=rules, arrays=arrays)
+        with self._lock:
+            self.render_time += time.perf_counter() - start
+        variant = RenderedSection(key, ticks, messages, sources, section['length_ticks'])
+        return variant, new_messages, arrays
+
+    def _store(self, key, section, variant, new_messages, arrays):
+        with self._lock:
+            # Lo style può essere cambiato durante il render: non salvare
+            if self.sections.get(key.section_name) is not section:
+                return variant
+            for cache_key, msg in new_messages.items():
+                self._messages.setdefault(cache_key, msg)
+            if arrays is not None:
+                self._arrays.setdefault(key.section_name, arrays)
+            existing = self._variants.get(key)
+            if existing is not None:
+                self._variants.move_to_end(key)
+                return existing
+            self._variants[key] = variant
+            while len(self._variants) > self.max_variants:
+                self._variants.popitem(last=False)
+                self.evictions += 1
+            return variant
+
+    def clear(self):
+        self.set_sections(self.sections, self.casm)
+
+    def get_stats(self):
+        """Ritorna i contatori della cache"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'variants': len(self._variants),
+                'max_variants': self.max_variants,
+                'shared_messages': len(self._messages),
+                'render_time_ms': self.render_time * 1000.0
+            }
+
+
+class VariantPrefetcher:
+    """
+    Thread in background che prepara la variante dell'accordo tenuto
+    per tutte le sezioni, così i cambi sezione non devono renderizzare.
+
+    Conta solo l'ultima richiesta: i cambi accordo rapidi si sovrappongono.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._request = None
+        self._event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def request(self, key, section_names):
+        """Chiede di preparare key per le sezioni indicate (quella di key per prima)"""
+        with self._lock:
+            self._request = (key, list(section_names))
+            self._event.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self._event.wait(timeout=5.0):
+                # Nessuna richiesta recente: il thread termina
+                with self._lock:
+                    if not self._event.is_set():
+                        self._thread = None
+                        return
+                continue
+            self._event.clear()
+
+            with self._lock:
+                request = self._request
+            if request is None:
+                continue
+
+            key, section_names = request
+            for section_name in section_names:
+                # Una richiesta più recente sostituisce quella in corso
+                if self._event.is_set():
+                    break
+                self.cache.prefetch(key.with_section(section_name))
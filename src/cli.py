@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+CLI - Player e strumenti batch da riga di comando (senza Tk)
+
+    midi-arranger play STYLE --port PORTA [--input PORTA] [--section 'Main A']
+                       [--fingering fingered] [--split 54] [--live-channel 1] [--debounce 50]
+    midi-arranger render STYLE OUT.mid 1:'Intro A':C 5::G7 9:'Ending A':C
+    midi-arranger info PERCORSO [PERCORSO ...] [--json] [--memory]
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import mido  # noqa: E402
+
+from input_processor import DEFAULT_DEBOUNCE_MS, InputProcessor  # noqa: E402
+from keyboard_split import DEFAULT_SPLIT_POINT, FINGERING_MODES, KeyboardSplit  # noqa: E402
+from midi_dispatcher import MidiDispatcher, PRIORITY_SCHEDULED, PRIORITY_UI  # noqa: E402
+from midi_output import open_output  # noqa: E402
+from style_cache import StyleCache  # noqa: E402
+from style_player import StylePlayer  # noqa: E402
+
+
+NOTE_INDEX = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# Suffissi dei nomi di accordo -> tipo del ChordRecognizer
+CHORD_SUFFIXES = {
+    '': 'Maj', 'maj': 'Maj', 'M': 'Maj',
+    'm': 'min', 'min': 'min', '-': 'min',
+    '7': '7', 'maj7': 'Maj7', 'M7': 'Maj7',
+    'm7': 'min7', 'min7': 'min7', '-7': 'min7',
+    '6': '6', 'm6': 'min6', 'min6': 'min6',
+    'dim': 'dim', 'dim7': 'dim7', 'aug': 'aug', '+': 'aug',
+    'sus4': 'sus4', 'sus2': 'sus2', 'm7b5': 'm7b5',
+    '7sus4': '7sus4', '7sus': '7sus4', 'add9': 'add9', '2': 'add9',
+    'madd9': 'madd9', 'm(add9)': 'madd9', '9': '9', 'maj9': 'Maj9', 'M9': 'Maj9',
+    'm9': 'min9', 'min9': 'min9', '6/9': '6/9', '69': '6/9', '11': '11',
+    'm11': 'min11', 'min11': 'min11', '13': '13', '7b9': '7b9', '7#9': '7#9',
+    '7#5': '7#5', '7+5': '7#5', 'aug7': '7#5', '7b5': '7b5', '7#11': '7#11',
+    '7b13': '7b13', 'maj7#11': 'Maj7#11', 'M7#11': 'Maj7#11', 'maj7#5': 'Maj7#5',
+    'M7#5': 'Maj7#5', 'mmaj7': 'minMaj7', 'mM7': 'minMaj7', 'mmaj9': 'minMaj9',
+    'mM9': 'minMaj9', '5': '5',
+}
+
+_CHORD_RE = re.compile(r'^([A-Ga-g])([#b]?)(.*?)(?:/([A-Ga-g])([#b]?))?$')
+
+
+def parse_chord(name):
+    """
+    Converte un nome di accordo (es. 'C', 'F#m7', 'Bb9', 'C/E') in (root, tipo).
+
+    Con un basso dopo la barra ritorna (root, tipo, basso), da passare
+    così com'è a StylePlayer.set_chord.
+
+    Raises:
+        ValueError: se il nome non è riconosciuto
+    """
+    match = _CHORD_RE.match(name.strip())
+    if not match:
+        raise ValueError(f"Accordo non valido: '{name}'")
+    letter, accidental, suffix, bass_letter, bass_accidental = match.groups()
+    root = NOTE_INDEX[letter.upper()] + {'#': 1, 'b': -1, '': 0}[accidental]
+    chord_type = CHORD_SUFFIXES.get(suffix)
+    if chord_type is None:
+        chord_type = CHORD_SUFFIXES.get(suffix.lower())
+    if chord_type is None:
+        raise ValueError(f"Tipo di accordo non riconosciuto: '{name}'")
+    if bass_letter is None:
+        return root % 12, chord_type
+    bass = NOTE_INDEX[bass_letter.upper()] + {'#': 1, 'b': -1, '': 0}[bass_accidental]
+    return root % 12, chord_type, bass % 12
+
+
+def parse_change(text):
+    """
+    Converte 'BATTUTA:SEZIONE:ACCORDO' in (battuta, sezione, accordo).
+
+    Sezione e accordo possono essere vuoti: '5::G7' cambia solo l'accordo,
+    '9:Ending A' solo la sezione.
+    """
+    parts = text.split(':')
+    if len(parts) < 2 or len(parts) > 3:
+        raise ValueError(f"Cambio non valido: '{text}' (atteso BATTUTA:SEZIONE:ACCORDO)")
+    try:
+        bar = int(parts[0])
+    except ValueError:
+        raise ValueError(f"Battuta non valida in '{text}'")
+    section_name = parts[1].strip() or None
+    chord = parse_chord(parts[2]) if len(parts) == 3 and parts[2].strip() else None
+    return bar, section_name, chord
+
+
+def find_styles(paths):
+    """Espande file, cartelle e pattern glob nella lista dei file .sty"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.[sS][tT][yY]'))))
+        elif any(char in path for char in '*?['):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    return files
+
+
+def load_player(filename, use_cache=True, quiet=True):
+    """Carica uno style in un nuovo StylePlayer (None se il caricamento fallisce)"""
+    player = StylePlayer(style_cache=StyleCache() if use_cache else None)
+    output = io.StringIO() if quiet else sys.stdout
+    with contextlib.redirect_stdout(output):
+        ok = player.load_style(filename)
+    if not ok:
+        print(f"Impossibile caricare lo style: {filename}", file=sys.stderr)
+        return None
+    return player
+
+
+def style_name(player):
+    """Nome dello style senza il padding del file"""
+    return (player.style_name or '').rstrip('\x00 ')
+
+
+def match_section(player, name):
+    """Nome di sezione dello style corrispondente a name (maiuscole ignorate)"""
+    wanted = name.strip().lower()
+    for section_name in player.get_available_sections():
+        if section_name.lower() == wanted:
+            return section_name
+    return None
+
+
+# ---------------------------------------------------------------- play
+
+def _input_processor(player, keyboard_split, debounce_ms):
+    """
+    Thread dell'input: sopra lo split suona la voce live, sotto riconosce
+    l'accordo e lo applica allo style dopo il debounce (rilasciando, resta l'ultimo)
+    """
+    shown = {'name': None}
+
+    def on_display():
+        name = processor.get_display_state()['name']
+        if name is not None and name != shown['name']:
+            shown['name'] = name
+            print(f"Accordo: {name}")
+
+    processor = InputProcessor(player, keyboard_split, debounce_ms=debounce_ms,
+                               on_display=on_display)
+    processor.hold_chord = True
+    return processor
+
+
+def _console_commands(player):
+    """
+    Comandi da standard input durante il playback:
+    nome sezione, 'tempo BPM', 'stop' / 'quit'.
+    """
+    while player.is_playing():
+        try:
+            line = input()
+        except EOFError:
+            # Nessun terminale (es. servizio): attendi la fine del playback
+            while player.is_playing():
+                time.sleep(0.2)
+            return
+        command = line.strip()
+        if not command:
+            continue
+        if command.lower() in ('stop', 'quit', 'q'):
+            return
+        if command.lower().startswith('tempo '):
+            try:
+                player.set_tempo(float(command.split()[1]))
+                print(f"Tempo: {player.tempo_bpm:.0f} BPM")
+            except ValueError:
+                print(f"Tempo non valido: {command}")
+            continue
+        section_name = match_section(player, command)
+        if section_name is None:
+            print(f"Comando o sezione sconosciuta: {command}")
+            continue
+        player.change_section(section_name)
+        print(f"Prossima sezione: {section_name}")
+
+
+def cmd_play(args):
+    if args.list_ports:
+        try:
+            print("Output:", ', '.join(mido.get_output_names()) or '-')
+            print("Input:", ', '.join(mido.get_input_names()) or '-')
+        except (OSError, ImportError) as e:
+            print(f"Backend MIDI non disponibile: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    if not args.style:
+        print("Indicare il file .sty da suonare", file=sys.stderr)
+        return 2
+
+    player = load_player(args.style, use_cache=not args.no_cache)
+    if player is None:
+        return 1
+    if args.tempo:
+        player.set_tempo(args.tempo)
+
+    section_name = match_section(player, args.section) if args.section else (
+        player._find_first_intro() or player._find_first_main())
+    if section_name is None:
+        print("Sezione non trovata", file=sys.stderr)
+        return 1
+
+    try:
+        dispatcher = MidiDispatcher(open_output(args.port))
+    except (OSError, ImportError) as e:
+        print(f"Impossibile aprire l'output MIDI: {e}", file=sys.stderr)
+        return 1
+    dispatcher.start()
+    player.set_midi_output(dispatcher.output_for(PRIORITY_SCHEDULED))
+
+    midi_input = None
+    if args.input:
+        keyboard_split = KeyboardSplit(
+            dispatcher.output_for(PRIORITY_UI), live_channel=args.live_channel - 1,
+            split_point=args.split, fingering=args.fingering)
+        processor = _input_processor(player, keyboard_split, args.debounce)
+        try:
+            midi_input = mido.open_input(args.input, callback=processor.put)
+        except (OSError, ImportError) as e:
+            print(f"Impossibile aprire l'input MIDI: {e}", file=sys.stderr)
+            dispatcher.close()
+            return 1
+        processor.start()
+
+    if args.chord:
+        player.current_section = section_name
+        player.set_chord(*parse_chord(args.chord))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = player.play_section(section_name, loop=True)
+    if not started:
+        dispatcher.close()
+        return 1
+
+    print(f"{style_name(player)}: {section_name} a {player.tempo_bpm:.0f} BPM "
+          f"(sezione, 'tempo BPM' o 'stop' + Invio)")
+    try:
+        _console_commands(player)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        player.stop()
+        if midi_input is not None:
+            midi_input.close()
+            processor.release_all()  # spegne la voce live ancora accesa
+            processor.stop()
+        dispatcher.close()
+    return 0
+
+
+# ---------------------------------------------------------------- render
+
+def cmd_render(args):
+    try:
+        changes = [parse_change(change) for change in args.changes]
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    player = load_player(args.style, use_cache=not args.no_cache)
+    if player is None:
+        return 1
+
+    resolved = []
+    for bar, section_name, chord in changes:
+        if section_name is not None:
+            matched = match_section(player, section_name)
+            if matched is None:
+                print(f"Sezione '{section_name}' non trovata", file=sys.stderr)
+                return 1
+            section_name = matched
+        resolved.append((bar, section_name, chord))
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        midi_file = player.render(resolved, filename=args.output, bars=args.bars, tempo=args.tempo)
+    if midi_file is None:
+        return 1
+    elapsed = time.perf_counter() - start
+    print(f"{args.output}: {midi_file.length:.1f} s di musica renderizzati "
+          f"in {elapsed * 1000:.0f} ms")
+    return 0
+
+
+# ---------------------------------------------------------------- info
+
+def style_stats(filename, use_cache=True, memory=False):
+    """Statistiche di uno style (dict) o None se non si carica"""
+    start = time.perf_counter()
+    player = load_player(filename, use_cache=use_cache)
+    load_ms = (time.perf_counter() - start) * 1000.0
+    if player is None:
+        return None
+
+    ticks_per_measure = player.time_signature_numerator * player.ticks_per_beat
+    sections = {}
+    for section_name in player.get_available_sections():
+        section = player.sections[section_name]
+        timeline = section['timeline']
+        sections[section_name] = {
+            'measures': section['length_ticks'] / ticks_per_measure if ticks_per_measure else 0,
+            'events': len(timeline),
+            'notes': sum(1 for _, _, status, data in timeline
+                         if status & 0xF0 == 0x90 and data[1] > 0),
+            'channels': sorted({channel for _, channel, _, _ in timeline if channel >= 0}),
+        }
+    stats = {
+        'file': filename,
+        'name': style_name(player),
+        'tempo': player.tempo_bpm,
+        'time_signature': f"{player.time_signature_numerator}/{player.time_signature_denominator}",
+        'ticks_per_beat': player.ticks_per_beat,
+        'setup_events': len(player.initial_setup_events),
+        'casm_sections': len(player.casm),
+        'load_ms': load_ms,
+        'sections': sections,
+    }
+    if memory:
+        report = player.get_memory_report()
+        stats['memory'] = {key: report[key]
+                           for key in ('events', 'tuple_bytes', 'compact_bytes', 'ratio')}
+        for section_name, entry in report['sections'].items():
+            sections[section_name]['tuple_bytes'] = entry['tuple_bytes']
+            sections[section_name]['compact_bytes'] = entry['compact_bytes']
+    return stats
+
+
+def cmd_info(args):
+    files = find_styles(args.paths)
+    if not files:
+        print("Nessun file .sty trovato", file=sys.stderr)
+        return 1
+
+    results = []
+    failures = 0
+    for filename in files:
+        stats = style_stats(filename, use_cache=not args.no_cache, memory=args.memory)
+        if stats is None:
+            failures += 1
+            continue
+        results.append(stats)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for stats in results:
+            print(f"{stats['file']}")
+            print(f"  {stats['name']} - {stats['tempo']:.0f} BPM {stats['time_signature']}, "
+                  f"{stats['ticks_per_beat']} tpb, {stats['setup_events']} setup, "
+                  f"CASM {stats['casm_sections']} sezioni, caricato in {stats['load_ms']:.1f} ms")
+            for section_name, section in stats['sections'].items():
+                print(f"    {section_name:12s} {section['measures']:5.1f} batt. "
+                      f"{section['events']:6d} eventi {section['notes']:5d} note "
+                      f"canali {','.join(str(channel + 1) for channel in section['channels'])}")
+                if 'compact_bytes' in section:
+                    print(f"{'':17s}memoria {section['compact_bytes'] / 1024:7.1f} KB compatta, "
+                          f"{section['tuple_bytes'] / 1024:7.1f} KB come tuple")
+            if 'memory' in stats:
+                memory = stats['memory']
+                print(f"  Memoria timeline: {memory['compact_bytes'] / 1024:.1f} KB compatta, "
+                      f"{memory['tuple_bytes'] / 1024:.1f} KB come tuple "
+                      f"({memory['ratio']:.1f}x, {memory['events']} eventi)")
+    return 1 if failures else 0
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--no-cache', action='store_true',
+                        help="non usare la cache degli style compilati")
+
+    parser = argparse.ArgumentParser(prog='midi-arranger',
+                                     description="MIDI arranger da riga di comando")
+    subparsers = parser.add_subparsers(dest='command')
+
+    play = subparsers.add_parser('play', parents=[common], help="suona uno style su una porta MIDI")
+    play.add_argument('style', nargs='?', help="file .sty")
+    play.add_argument('--port', help="porta MIDI output (default: la prima disponibile)")
+    play.add_argument('--input', help="porta MIDI input per il riconoscimento accordi")
+    play.add_argument('--fingering', choices=FINGERING_MODES, default='fingered',
+                      help="diteggiatura accordi dell'input (default: fingered)")
+    play.add_argument('--split', type=int, default=DEFAULT_SPLIT_POINT,
+                      help=f"ultima nota della zona accordi (default: {DEFAULT_SPLIT_POINT})")
+    play.add_argument('--live-channel', type=int, default=1, choices=range(1, 17),
+                      metavar='1-16', help="canale della voce live sopra lo split (default: 1)")
+    play.add_argument('--debounce', type=int, default=DEFAULT_DEBOUNCE_MS, metavar='MS',
+                      help=f"attesa prima di applicare un accordo "
+                           f"(default: {DEFAULT_DEBOUNCE_MS} ms)")
+    play.add_argument('--section', help="sezione iniziale (default: primo Intro o Main)")
+    play.add_argument('--chord', help="accordo iniziale (es. C, Am7, Bb7)")
+    play.add_argument('--tempo', type=float, help="tempo in BPM")
+    play.add_argument('--list-ports', action='store_true', help="elenca le porte MIDI ed esce")
+    play.set_defaults(func=cmd_play)
+
+    render = subparsers.add_parser('render', parents=[common],
+                                   help="esporta un arrangiamento su file .mid")
+    render.add_argument('style', help="file .sty")
+    render.add_argument('output', help="file .mid da scrivere")
+    render.add_argument('changes', nargs='+', metavar='BATTUTA:SEZIONE:ACCORDO',
+                        help="cambi dell'arrangiamento (es. 1:'Intro A':C 5::G7 9:'Ending A':C)")
+    render.add_argument('--bars', type=int, help="battute totali da renderizzare")
+    render.add_argument('--tempo', type=float, help="tempo in BPM")
+    render.set_defaults(func=cmd_render)
+
+    info = subparsers.add_parser('info', parents=[common], help="statistiche di style e sezioni")
+    info.add_argument('paths', nargs='+', help="file .sty, cartelle o pattern")
+    info.add_argument('--json', action='store_true', help="output JSON")
+    info.add_argument('--memory', action='store_true',
+                      help="memoria delle timeline: compatta contro lista di tuple")
+    info.set_defaults(func=cmd_info)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Clocks - Orologi per il motore di playback: reale o virtuale
+
+Un orologio espone clock() (istante in secondi) e sleep(secondi). Lo
+StylePlayer lo riceve con set_clock (o dal costruttore) e ci costruisce il
+proprio DeadlineScheduler: con un VirtualClock il playback gira nel thread
+chiamante, senza attese reali, e le azioni programmate (cambi sezione,
+accordi, stop) scattano all'istante virtuale esatto.
+"""
+
+import time
+
+from scheduler import DeadlineScheduler
+
+
+# Le azioni programmate a un tick scattano un microsecondo prima, così il
+# loop di playback le vede prima di inviare gli eventi di quel tick
+ACTION_LEAD = 1e-6
+
+# Passo minimo del tempo virtuale, perché ogni sleep lo faccia avanzare
+MIN_STEP = 1e-9
+
+
+class SystemClock:
+    """Orologio reale (time.perf_counter / time.sleep)"""
+
+    realtime = True
+
+    def clock(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def make_scheduler(self):
+        return DeadlineScheduler(clock=self.clock, sleep=self.sleep)
+
+
+class VirtualClock:
+    """
+    Orologio virtuale: sleep fa avanzare il tempo all'istante, fermandosi
+    sulle azioni programmate.
+
+    Le azioni si programmano a un istante (call_at, call_later) oppure a un
+    tick della song (schedule): in quel caso serve time_of, la funzione
+    tick -> istante, che il render offline ricava dalla mappa del tempo.
+    Con oversleep ogni sleep sfora di un tempo fisso, come uno sleep reale.
+    """
+
+    realtime = False
+
+    def __init__(self, start=0.0, oversleep=0.0):
+        self.now = start
+        self.oversleep = oversleep
+        self.time_of = None  # funzione tick della song -> istante sull'orologio
+        self._timed = []     # (istante, ordine, azione)
+        self._ticked = []    # (tick, ordine, azione)
+        self._order = 0
+
+    def clock(self):
+        return self.now
+
+    def call_at(self, when, action):
+        """Programma action (senza argomenti) all'istante when"""
+        self._timed.append((when, self._order, action))
+        self._timed.sort(key=lambda item: item[:2])
+        self._order += 1
+
+    def call_later(self, delay, action):
+        """Programma action fra delay secondi virtuali"""
+        self.call_at(self.now + delay, action)
+
+    def schedule(self, tick, action):
+        """Programma action al tick della song indicato (richiede time_of)"""
+        self._ticked.append((tick, self._order, action))
+        self._ticked.sort(key=lambda item: item[:2])
+        self._order += 1
+
+    def pending(self):
+        """Numero di azioni non ancora eseguite"""
+        return len(self._timed) + len(self._ticked)
+
+    def _next_action(self):
+        """(istante, lista) della prossima azione, oppure None"""
+        best = None
+        if self._timed:
+            best = (self._timed[0][0], self._timed[0][1], self._timed)
+        if self._ticked and self.time_of is not None:
+            when = self.time_of(self._ticked[0][0]) - ACTION_LEAD
+            if best is None or (when, self._ticked[0][1]) < best[:2]:
+                best = (when, self._ticked[0][1], self._ticked)
+        return best
+
+    def sleep(self, seconds):
+        target = self.now + seconds
+        if seconds > 0:
+            target += self.oversleep
+        if seconds > 0 and target <= self.now:
+            # Attesa più piccola della risoluzione del float: avanza comunque
+            target = self.now + MIN_STEP
+        action = self._next_action()
+        if action is not None and action[0] <= target:
+            # Fermati sull'azione: lo scheduler ricontrolla la scadenza dopo
+            self.now = max(self.now, action[0])
+            action[2].pop(0)[2]()
+            return
+        self.now = target
+
+    def advance(self, seconds):
+        """Fa avanzare il tempo eseguendo tutte le azioni che scadono nel frattempo"""
+        target = self.now + seconds
+        while True:
+            action = self._next_action()
+            if action is None or action[0] > target:
+                break
+            self.sleep(max(0.0, action[0] - self.now))
+        self.now = max(self.now, target)
+
+    def make_scheduler(self):
+        # Niente attesa attiva (sleep(0) non farebbe avanzare il tempo) e
+        # nessun limite alla singola attesa: si salta alla scadenza
+        return DeadlineScheduler(spin_threshold=0.0, clock=self.clock, sleep=self.sleep,
+                                 max_sleep_slice=float('inf'))
@@ -0,0 +1,208 @@
+"""
+InputProcessor - Thread dedicato all'input MIDI: accordi e debounce fuori dal loop Tk
+
+Il callback della porta di input (thread di rtmidi) accoda i messaggi e
+ritorna subito; il thread del processor li passa a KeyboardSplit (voce
+live e riconoscimento), applica i cambi di accordo allo StylePlayer dopo
+il debounce, con scadenze su time.perf_counter, e pubblica per la GUI uno
+stato di visualizzazione: una sola notifica per quanti cambi avvengano
+prima che la GUI lo legga.
+"""
+
+import threading
+import time
+from collections import deque
+
+from keyboard_split import KeyboardSplit
+
+
+DEFAULT_DEBOUNCE_MS = 50  # attesa prima di applicare un accordo (note premute quasi insieme)
+IDLE_TIMEOUT = 0.1        # risveglio periodico per controllare lo stop
+
+
+class InputProcessor:
+    """
+    Riceve le note (put dal callback di input, note_on/note_off dalla
+    tastiera virtuale) e le elabora nel proprio thread.
+
+    Tutto ciò che tocca split, riconoscitore e accordo in attesa passa dalla
+    coda (anche release_all e set_fingering), così gira in un thread solo.
+    Con poll() si esegue un passo senza thread (test, render).
+    """
+
+    def __init__(self, player, keyboard_split=None, debounce_ms=DEFAULT_DEBOUNCE_MS,
+                 on_display=None, on_start=None, clock=time.perf_counter):
+        """
+        Args:
+            player: StylePlayer a cui applicare gli accordi
+            keyboard_split: KeyboardSplit (None = split di default, voce live muta)
+            debounce_ms: attesa in millisecondi prima di applicare un accordo
+            on_display: funzione senza argomenti chiamata quando lo stato di
+                visualizzazione cambia e la GUI non l'ha ancora letto
+            on_start: funzione(accordo) chiamata quando un accordo viene
+                applicato a style fermo (avvio automatico), salvo con
+                waiting_for_release
+            clock: orologio in secondi per le scadenze del debounce
+        """
+        self.player = player
+        self.keyboard_split = keyboard_split if keyboard_split is not None else KeyboardSplit()
+        self.keyboard_split.on_chord = self._on_chord
+        self.debounce_ms = debounce_ms
+        self.hold_chord = False  # zona accordi vuota: tiene l'ultimo accordo
+        self.hold_drums = True   # senza hold_chord: i drums continuano
+        self.waiting_for_release = False  # niente avvio automatico finché la zona non si svuota
+        self.on_display = on_display
+        self.on_start = on_start
+        self.clock = clock
+
+        self.pending_chord = None  # accordo in attesa del debounce
+        self.deadline = None       # istante in cui applicarlo
+        self.last_chord = None     # ultimo accordo applicato
+        self.chords_applied = 0
+
+        self._queue = deque()  # (funzione, argomenti): append/popleft atomici
+        self._wakeup = threading.Event()
+        self._display = {'name': None, 'held': False}
+        self._display_posted = False
+        self._display_lock = threading.Lock()
+        self._thread = None
+        self.running = False
+
+    # ------------------------------------------------------------ ingresso
+
+    def put(self, msg):
+        """Callback della porta di input (mido): accoda le note, ignora il resto"""
+        if msg.type == 'note_on' and msg.velocity > 0:
+            self.call(self.keyboard_split.note_on, msg.note, msg.velocity)
+        elif msg.type in ('note_off', 'note_on'):
+            self.call(self.keyboard_split.note_off, msg.note)
+
+    def note_on(self, note, velocity):
+        self.call(self.keyboard_split.note_on, note, velocity)
+
+    def note_off(self, note):
+        self.call(self.keyboard_split.note_off, note)
+
+    def set_fingering(self, fingering):
+        self.call(self.keyboard_split.set_fingering, fingering)
+
+    def release_all(self):
+        """Dimentica le note tenute e spegne la voce live (porta chiusa, stop)"""
+        self.call(self._release_all)
+
+    def call(self, function, *args):
+        """Esegue function(*args) nel thread del processor"""
+        self._queue.append((function, args))
+        self._wakeup.set()
+
+    # ------------------------------------------------------------ thread
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name='InputProcessor', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Ferma il thread dopo aver elaborato quanto già in coda"""
+        self.running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while self.running:
+            remaining = self.poll()
+            if not self._queue:
+                self._wakeup.wait(IDLE_TIMEOUT if remaining is None else remaining)
+            self._wakeup.clear()
+        self.poll()
+
+    def poll(self):
+        """
+        Elabora i messaggi in coda e applica l'accordo se il debounce è scaduto.
+
+        Returns:
+            float: secondi alla scadenza del debounce, None se nulla è in attesa
+        """
+        queue = self._queue
+        while queue:
+            function, args = queue.popleft()
+            function(*args)
+
+        if self.deadline is None:
+            return None
+        remaining = self.deadline - self.clock()
+        if remaining > 0:
+            return remaining
+        self._apply(self.pending_chord)
+        return None
+
+    # ------------------------------------------------------------ accordi
+
+    def _on_chord(self, chord):
+        """Accordo cambiato nella zona accordi (da KeyboardSplit, nel thread del processor)"""
+        if chord is None:
+            self.pending_chord = None
+            self.deadline = None
+            self._zone_released()
+            return
+
+        self.pending_chord = chord
+        self._set_display(chord['name'], False)
+        if self.debounce_ms <= 0:
+            self._apply(chord)
+        else:
+            self.deadline = self.clock() + self.debounce_ms / 1000.0
+
+    def _apply(self, chord):
+        """Applica l'accordo allo style (riattiva anche le note melodiche)"""
+        self.deadline = None
+        self.player.set_chord(chord['root'], chord['type'], chord['bass'])
+        self.last_chord = chord
+        self.chords_applied += 1
+        if (not self.player.is_playing() and not self.waiting_for_release
+                and self.on_start is not None):
+            self.on_start(chord)
+
+    def _zone_released(self):
+        """Zona accordi vuota: HOLD tiene l'ultimo accordo, altrimenti ferma le note melodiche"""
+        self.waiting_for_release = False
+        if self.hold_chord:
+            last = self.last_chord
+            self._set_display(last['name'] if last else None, last is not None)
+            return
+        self._set_display(None, False)
+        if self.player.is_playing():
+            self.player.stop_melodic_notes(hold_drums=self.hold_drums)
+
+    def _release_all(self):
+        note_offs = self.keyboard_split.release_all()
+        output = self.keyboard_split.output
+        if note_offs and output is not None:
+            output.send_panic(note_offs)
+
+    # ------------------------------------------------------------ GUI
+
+    def _set_display(self, name, held):
+        with self._display_lock:
+            self._display = {'name': name, 'held': held}
+            if self._display_posted:
+                return
+            self._display_posted = True
+        if self.on_display is not None:
+            self.on_display()
+
+    def get_display_state(self):
+        """
+        Stato da visualizzare, letto dalla GUI dopo on_display.
+
+        Returns:
+            dict: {'name': nome dell'accordo o None, 'held': True se è
+            l'ultimo accordo tenuto con HOLD a zona accordi vuota}
+        """
+        with self._display_lock:
+            self._display_posted = False
+            return dict(self._display)
@@ -0,0 +1,84 @@
+"""
+KeyDisplay - Aggiornamenti della tastiera a schermo raggruppati per frame
+
+I thread di input scrivono i cambi di stato dei tasti (e la notifica di
+accordo cambiato) in un buffer condiviso; la GUI lo legge una volta per
+frame e applica solo le differenze nette rispetto a quanto già mostrato:
+un glissando o una pedalata non generano più un callback Tk per nota.
+"""
+
+import threading
+
+
+FRAME_INTERVAL_MS = 16  # ~60 Hz
+
+_BLACK_KEYS = (1, 3, 6, 8, 10)
+
+
+def _velocity_color(velocity):
+    intensity = int((velocity / 127) * 100) + 155
+    return f"#{intensity:02x}{intensity // 2:02x}{intensity // 2:02x}"
+
+
+# Colore del tasto premuto per velocity (0-127) e colore del tasto a riposo per nota
+VELOCITY_COLORS = tuple(_velocity_color(velocity) for velocity in range(128))
+KEY_COLORS = tuple('black' if note % 12 in _BLACK_KEYS else 'white' for note in range(128))
+
+
+class KeyDisplayBuffer:
+    """
+    Buffer fra i thread che ricevono le note e il frame della GUI.
+
+    note_on, note_off e chord_changed si chiamano da qualsiasi thread;
+    take() solo dalla GUI, che tiene traccia di ciò che è a schermo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}    # nota -> velocity (0 = rilasciata), ultimo stato del frame
+        self._chord = False   # accordo da ridisegnare
+        self.shown = {}       # nota -> colore dei tasti accesi a schermo
+        self.frames = 0       # frame con almeno un cambio applicato
+        self.changes = 0      # cambi di tasto ricevuti
+
+    def note_on(self, note, velocity):
+        with self._lock:
+            self._pending[note] = velocity
+            self.changes += 1
+
+    def note_off(self, note):
+        with self._lock:
+            self._pending[note] = 0
+            self.changes += 1
+
+    def chord_changed(self):
+        """Lo stato dell'accordo è cambiato: la GUI lo rilegge al prossimo frame"""
+        with self._lock:
+            self._chord = True
+
+    def take(self):
+        """
+        Raccoglie i cambi del frame.
+
+        Returns:
+            (dict, bool): tasti da ridisegnare (nota -> colore, None = a riposo)
+            e True se va ridisegnato l'accordo
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            chord, self._chord = self._chord, False
+
+        shown = self.shown
+        diffs = {}
+        for note, velocity in pending.items():
+            color = VELOCITY_COLORS[velocity] if velocity else None
+            if shown.get(note) == color:
+                continue  # premuto e rilasciato nello stesso frame, o stesso colore
+            diffs[note] = color
+            if color is None:
+                del shown[note]
+            else:
+                shown[note] = color
+        if diffs or chord:
+            self.frames += 1
+        return diffs, chord
@@ -0,0 +1,247 @@
+"""
+KeyboardSplit - Punto di split e diteggiatura accordi della tastiera di input
+
+La tastiera è divisa come su un arranger: le note fino allo split point
+(mano sinistra) vanno al riconoscimento accordi, quelle sopra suonano
+subito sull'output come voce live, sul proprio canale. Tutto avviene nel
+thread che riceve il MIDI input: nessun passaggio dal loop Tk.
+"""
+
+import threading
+
+from chord_recognizer import ChordRecognizer
+from note_registry import ActiveNotes
+
+
+# Diteggiature (come sugli arranger Yamaha)
+FINGERING_SINGLE = 'single'      # un tasto = maggiore; tasti a sinistra = min, 7, min7
+FINGERING_FINGERED = 'fingered'  # accordo suonato per intero, rivolti con la root al basso
+FINGERING_ON_BASS = 'on_bass'    # come fingered, ma la nota più bassa è il basso (slash chord)
+FINGERING_FULL = 'full'          # niente split: accordi dall'intera tastiera, tutto suona
+FINGERING_AI = 'ai'              # fingered, completato dal contesto con meno di tre note
+
+FINGERING_MODES = (FINGERING_SINGLE, FINGERING_FINGERED, FINGERING_ON_BASS,
+                   FINGERING_FULL, FINGERING_AI)
+
+FINGERING_NAMES = {
+    FINGERING_SINGLE: 'Single Finger',
+    FINGERING_FINGERED: 'Fingered',
+    FINGERING_ON_BASS: 'Fingered On Bass',
+    FINGERING_FULL: 'Full Keyboard',
+    FINGERING_AI: 'AI Fingered',
+}
+
+# Ultima nota della zona accordi (F#3): lo split point appartiene alla mano sinistra
+DEFAULT_SPLIT_POINT = 54
+
+_BLACK_KEYS = frozenset((1, 3, 6, 8, 10))
+
+# Tipo single finger per (tasto nero a sinistra, tasto bianco a sinistra)
+_SINGLE_FINGER_TYPES = {
+    (False, False): 'Maj',
+    (True, False): 'min',
+    (False, True): '7',
+    (True, True): 'min7',
+}
+
+
+def chord_name(root, chord_type, bass=None):
+    """Nome dell'accordo (es. 'CMaj', 'Amin7/G'), come ChordRecognizer.get_chord_name"""
+    type_name = {'single': '', 'unknown': '?'}.get(chord_type, chord_type)
+    name = f"{ChordRecognizer.NOTE_NAMES[root]}{type_name}"
+    if bass is not None:
+        return f"{name}/{ChordRecognizer.NOTE_NAMES[bass]}"
+    return name
+
+
+class KeyboardSplit:
+    """
+    Smista le note in arrivo tra voce live e riconoscimento accordi.
+
+    note_on/note_off si chiamano dal thread di input (o dalla GUI per la
+    tastiera virtuale): un lock serializza le chiamate. on_chord(chord) è
+    chiamato, sotto lo stesso lock, solo quando l'accordo cambia, con
+    {'root', 'type', 'bass', 'name'} oppure None quando la zona accordi
+    è vuota: deve ritornare subito.
+    """
+
+    def __init__(self, output=None, live_channel=0, split_point=DEFAULT_SPLIT_POINT,
+                 fingering=FINGERING_FINGERED, on_chord=None, recognizer=None):
+        """
+        Args:
+            output: porta con send_bytes (MidiOutput o QueuedOutput), None = voce muta
+            live_channel: canale MIDI (0-15) della voce live
+            split_point: ultima nota MIDI della zona accordi
+            fingering: una di FINGERING_MODES
+            on_chord: funzione chiamata a ogni cambio di accordo
+            recognizer: ChordRecognizer (None = vocabolario completo)
+        """
+        self.output = output
+        self.live_channel = live_channel
+        self.split_point = split_point
+        self.fingering = fingering if fingering in FINGERING_MODES else FINGERING_FINGERED
+        self.on_chord = on_chord
+        self.recognizer = recognizer if recognizer is not None else ChordRecognizer()
+        self.live_notes = ActiveNotes()  # note della voce live accese sull'output
+        self.chord = None
+        self._lock = threading.Lock()
+
+    def set_output(self, output):
+        """Cambia porta: le note live accese sulla vecchia vengono spente"""
+        with self._lock:
+            note_offs = self.live_notes.release()
+            if self.output is not None and note_offs:
+                self.output.send_panic(note_offs)
+            self.output = output
+
+    def set_fingering(self, fingering):
+        """
+        Cambia diteggiatura e rivaluta l'accordo delle note tenute.
+
+        Returns:
+            bool: False se la diteggiatura non esiste
+        """
+        if fingering not in FINGERING_MODES:
+            print(f"Diteggiatura sconosciuta: {fingering}")
+            return False
+        with self._lock:
+            self.fingering = fingering
+            self._update_chord(force=True)
+        return True
+
+    def set_split_point(self, note):
+        """Imposta l'ultima nota della zona accordi (0-127)"""
+        with self._lock:
+            self.split_point = max(0, min(127, int(note)))
+
+    def is_chord_note(self, note):
+        """True se la nota va al riconoscimento accordi"""
+        return self.fingering == FINGERING_FULL or note <= self.split_point
+
+    def is_live_note(self, note):
+        """True se la nota suona sull'output come voce live"""
+        return self.fingering == FINGERING_FULL or note > self.split_point
+
+    def note_on(self, note, velocity):
+        """Nota premuta: la suona (zona live) e/o aggiorna l'accordo (zona accordi)"""
+        with self._lock:
+            if self.is_live_note(note) and self.output is not None:
+                channel = self.live_channel
+                previous = self.live_notes.note_on(channel, note, note)
+                if previous is not None:
+                    self.output.send_bytes(bytes((0x80 | channel, previous, 0)))
+                self.output.send_bytes(bytes((0x90 | channel, note, velocity)))
+            if self.is_chord_note(note):
+                self.recognizer.note_on(note)
+                self._update_chord()
+
+    def note_off(self, note):
+        """
+        Nota rilasciata. Si spegne sul canale su cui era stata accesa e si
+        toglie dal riconoscitore anche se nel frattempo split o diteggiatura
+        sono cambiati.
+        """
+        with self._lock:
+            if self.output is not None:
+                for channel in range(16):
+                    if self.live_notes.is_sounding(channel, note):
+                        self.live_notes.note_off(channel, note)
+                        self.output.send_bytes(bytes((0x80 | channel, note, 0)))
+            if note in self.recognizer.active_notes:
+                self.recognizer.note_off(note)
+                self._update_chord()
+
+    def process(self, msg):
+        """
+        Gestisce un messaggio mido dell'input.
+
+        Returns:
+            bool: True se era una nota
+        """
+        if msg.type == 'note_on' and msg.velocity > 0:
+            self.note_on(msg.note, msg.velocity)
+        elif msg.type in ('note_off', 'note_on'):
+            self.note_off(msg.note)
+        else:
+            return False
+        return True
+
+    def release_all(self):
+        """
+        Dimentica le note tenute (porta di input chiusa).
+
+        Returns:
+            list: note off (bytes) della voce live da inviare
+        """
+        with self._lock:
+            self.recognizer.clear()
+            self._update_chord()
+            return self.live_notes.release()
+
+    def _update_chord(self, force=False):
+        """Ricalcola l'accordo e chiama on_chord se è cambiato (sotto lock)"""
+        chord = self._evaluate()
+        if chord is False:
+            return  # note non riconosciute: resta l'accordo precedente
+        if chord is not None:
+            chord = {'root': chord[0], 'type': chord[1], 'bass': chord[2],
+                     'name': chord_name(*chord)}
+        if chord == self.chord and not force:
+            return
+        self.chord = chord
+        if self.on_chord is not None:
+            self.on_chord(chord)
+
+    def _evaluate(self):
+        """
+        Accordo delle note della zona accordi secondo la diteggiatura.
+
+        Returns:
+            (root, tipo, basso), None se la zona è vuota, False se le note
+            non formano un accordo (si tiene il precedente)
+        """
+        recognizer = self.recognizer
+        notes = recognizer.active_notes
+        if not notes:
+            return None
+
+        fingering = self.fingering
+        if fingering == FINGERING_SINGLE:
+            return self._single_finger(notes)
+
+        recognized = recognizer.get_current_chord()
+        if fingering == FINGERING_AI and len(recognized['notes']) < 3:
+            # Poche note: se stanno nell'accordo precedente è ancora quello,
+            # altrimenti valgono come single finger
+            if self.chord is not None and recognized['notes'] <= self._chord_classes(self.chord):
+                return self.chord['root'], self.chord['type'], self.chord['bass']
+            return self._single_finger(notes)
+
+        if recognized['type'] == 'unknown':
+            return False
+        bass = None
+        if fingering in (FINGERING_ON_BASS, FINGERING_FULL):
+            bass = recognizer.get_slash_bass()
+        return recognized['root'], recognized['type'], bass
+
+    @staticmethod
+    def _single_finger(notes):
+        """Root = tasto più alto; un tasto nero a sinistra = min, uno bianco = 7, entrambi = min7"""
+        root_note = max(notes)
+        black = white = False
+        for note in notes:
+            if note % 12 == root_note % 12:
+                continue
+            if note % 12 in _BLACK_KEYS:
+                black = True
+            else:
+                white = True
+        return root_note % 12, _SINGLE_FINGER_TYPES[black, white], None
+
+    def _chord_classes(self, chord):
+        """Classi di nota dell'accordo (root, tipo e basso)"""
+        pattern = self.recognizer.patterns.get(chord['type'], (0,))
+        classes = {(chord['root'] + interval) % 12 for interval in pattern}
+        if chord['bass'] is not None:
+            classes.add(chord['bass'])
+        return classes
@@ -0,0 +1,238 @@
+"""
+MidiDispatcher - Unico thread che scrive sulla porta MIDI, con code a priorità
+"""
+
+import threading
+import time
+from collections import deque
+
+from midi_output import as_midi_output
+
+
+# Priorità delle code (0 = svuotata per prima)
+PRIORITY_PANIC = 0       # stop, All Notes Off, note off di emergenza
+PRIORITY_SCHEDULED = 1   # eventi dello style in playback
+PRIORITY_UI = 2          # tastiera virtuale, program change dalla GUI
+
+PRIORITY_NAMES = ('panic', 'scheduled', 'ui')
+
+BATCH_WINDOW = 0.001     # messaggi accodati nello stesso millisecondo = un solo batch
+IDLE_TIMEOUT = 0.1       # risveglio periodico per controllare lo stop
+
+
+def _channels(messages):
+    """Canali dei messaggi di canale di un gruppo (i messaggi di sistema non ne hanno)"""
+    return {data[0] & 0x0F for data in messages if data[0] < 0xF0}
+
+
+class QueuedOutput:
+    """
+    Vista di un MidiDispatcher con una priorità fissa.
+
+    Ha la stessa interfaccia di MidiOutput (send_bytes, send, send_many,
+    send_panic), quindi StylePlayer e la tastiera la usano come una porta;
+    con send_timed il ritardo d'invio si misura quando il dispatcher scrive.
+    """
+
+    __slots__ = ('dispatcher', 'priority')
+
+    def __init__(self, dispatcher, priority):
+        self.dispatcher = dispatcher
+        self.priority = priority
+
+    def send_bytes(self, data):
+        self.dispatcher.put((data,), self.priority)
+
+    def send(self, msg):
+        self.dispatcher.put((bytes(msg.bytes()),), self.priority)
+
+    def send_many(self, messages):
+        self.dispatcher.put(tuple(messages), self.priority)
+
+    def send_panic(self, messages):
+        self.dispatcher.put(tuple(messages), PRIORITY_PANIC)
+
+    def send_timed(self, messages, deadline, timing):
+        """
+        Accoda un burst con scadenza: il thread del dispatcher registra in
+        timing (TimingStats) ritardo e durata della scrittura vera sulla porta.
+        """
+        self.dispatcher.put(tuple(messages), self.priority, (deadline, timing))
+
+
+class MidiDispatcher:
+    """
+    Possiede la porta di uscita: tutti i thread (playback, GUI, input)
+    accodano byte già codificati e solo il thread del dispatcher li scrive.
+
+    Le code sono deque (append/popleft atomici, nessun lock per accodare);
+    a ogni risveglio si svuotano in ordine di priorità e i messaggi
+    accodati entro lo stesso millisecondo partono in un unico batch, con
+    una sola chiamata alla porta. Un gruppo di panic passa avanti agli
+    altri, ma non ai messaggi accodati prima di lui sugli stessi canali:
+    un note on non può seguire il note off di emergenza della sua nota.
+    """
+
+    def __init__(self, output, batch_window=BATCH_WINDOW, clock=time.perf_counter):
+        self.output = as_midi_output(output)
+        self.batch_window = batch_window
+        self.clock = clock
+        self._queues = (deque(), deque(), deque())
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Azzera le statistiche di invio"""
+        self.sent = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def output_for(self, priority):
+        """Porta da dare a chi invia con la priorità indicata"""
+        return QueuedOutput(self, priority)
+
+    def start(self):
+        """Avvia il thread del dispatcher (se non è già attivo)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, messages, priority=PRIORITY_UI, timed=None):
+        """
+        Accoda un gruppo di messaggi (bytes) che verrà scritto senza interruzioni.
+
+        Args:
+            messages: tuple di bytes già codificati
+            priority: PRIORITY_PANIC, PRIORITY_SCHEDULED o PRIORITY_UI
+            timed: (scadenza, TimingStats) da aggiornare all'invio, o None
+        """
+        if not messages:
+            return
+        queue = self._queues[priority]
+        queue.append((self.clock(), messages, timed))
+        depth = len(queue)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self._wakeup.set()
+
+    def discard(self, priority):
+        """Scarta i messaggi in attesa di una coda (es. note dello style dopo uno stop)"""
+        self._queues[priority].clear()
+
+    def _run(self):
+        wakeup = self._wakeup
+        while self._running:
+            wakeup.wait(IDLE_TIMEOUT)
+            wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Scrive tutto ciò che è in coda, in ordine di priorità.
+
+        Returns:
+            int: numero di messaggi scritti
+        """
+        clock = self.clock
+        send_many = self.output.send_many
+        written = 0
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return written
+            now = clock()
+            run = []
+            for queued_at, messages, _ in batch:
+                latency = now - queued_at
+                self.total_latency += latency * len(messages)
+                if latency > self.max_latency:
+                    self.max_latency = latency
+                run.extend(messages)
+            try:
+                send_many(run)
+            except Exception as e:
+                self.errors += 1
+                print(f"Errore invio MIDI: {e}")
+                for _, _, timed in batch:
+                    if timed is not None:
+                        timed[1].send_errors += 1
+            else:
+                finished = clock()
+                for _, messages, timed in batch:
+                    if timed is not None:
+                        timed[1].record_send(timed[0], now, finished, len(messages))
+            self.sent += len(run)
+            self.batches += 1
+            written += len(run)
+
+    def _take_batch(self):
+        """Gruppi accodati entro un millisecondo dal primo della coda più urgente, per priorità"""
+        batch = []
+        window_end = None
+        panic = self._queues[PRIORITY_PANIC]
+        for queue in self._queues:
+            while queue:
+                item = queue[0]
+                if window_end is None:
+                    window_end = item[0] + self.batch_window
+                elif item[0] > window_end:
+                    break
+                if queue is panic:
+                    batch.extend(self._take_earlier(item))
+                batch.append(queue.popleft())
+        return batch
+
+    def _take_earlier(self, panic_item):
+        """
+        Toglie dalle altre code i gruppi accodati prima del panic che
+        toccano i suoi canali, da inviare prima di lui. Gli altri gruppi
+        restano in coda nel loro ordine.
+        """
+        queued_at, messages, _ = panic_item
+        channels = _channels(messages)
+        taken = []
+        for queue in self._queues[PRIORITY_PANIC + 1:]:
+            kept = []
+            while queue and queue[0][0] <= queued_at:
+                item = queue.popleft()
+                if channels & _channels(item[1]):
+                    taken.append(item)
+                else:
+                    kept.append(item)
+            queue.extendleft(reversed(kept))
+        return taken
+
+    def depth(self):
+        """Messaggi in attesa per coda"""
+        return {name: sum(len(item[1]) for item in list(queue))
+                for name, queue in zip(PRIORITY_NAMES, self._queues)}
+
+    def get_stats(self):
+        """Profondità delle code e latenze di invio (millisecondi)"""
+        return {
+            'depth': self.depth(),
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'batches': self.batches,
+            'errors': self.errors,
+            'mean_latency_ms': (self.total_latency / self.sent * 1000.0) if self.sent else 0.0,
+            'max_latency_ms': self.max_latency * 1000.0
+        }
+
+    def close(self, close_port=True):
+        """Svuota le code, ferma il thread e (opzionalmente) chiude la porta"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        self.flush()
+        if close_port:
+            self.output.close()
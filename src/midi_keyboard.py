@@ -1,9 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
 import mido
-import threading
+import os
+import time
+from midi_dispatcher import MidiDispatcher, PRIORITY_SCHEDULED, PRIORITY_UI
+from midi_output import open_output
 from style_player import StylePlayer
-from chord_recognizer import ChordRecognizer
+from style_cache import StyleCache
+from input_processor import InputProcessor
+from key_display import FRAME_INTERVAL_MS, KEY_COLORS, KeyDisplayBuffer
+from keyboard_split import KeyboardSplit, FINGERING_MODES, FINGERING_NAMES
+from timing_stats import LatencyHistogram
+
+# Intervallo di aggiornamento di progresso e overlay di timing
+PROGRESS_UPDATE_MS = 50
 
 # Lista completa degli strumenti General MIDI (128 programs)
 GM_INSTRUMENTS = [
@@ -93,44 +103,52 @@ class VirtualKeyboard:
         
         # Variabili MIDI Input
         self.midi_input = None
-        self.midi_thread = None
-        self.running = False
-        self.active_notes = set()
+        self.active_notes = set()  # tasti accesi a schermo
+
+        # Cambi dei tasti e dell'accordo dai thread di input, applicati alla
+        # GUI una volta per frame
+        self.key_display = KeyDisplayBuffer()
+        self.frame_timer = None
 
-        # Variabili MIDI Output
+        # Variabili MIDI Output: la porta è del dispatcher, la GUI e lo style
+        # player accodano i messaggi con la propria priorità
+        self.midi_dispatcher = None
         self.midi_output = None
+        self.style_output = None
         self.midi_channel = 0  # Canale MIDI (0-15, che corrisponde a 1-16)
         self.midi_program = 0  # Program MIDI (0-127, strumento GM)
 
-        # Style Player
-        self.style_player = StylePlayer()
+        # Style Player (con cache su disco degli style già compilati)
+        self.style_player = StylePlayer(style_cache=StyleCache())
         self.current_style_file = None
 
-        # Chord Recognizer
-        self.chord_recognizer = ChordRecognizer()
+        # Split della tastiera: sopra lo split la voce live sul canale scelto,
+        # sotto il riconoscimento accordi
+        self.keyboard_split = KeyboardSplit(live_channel=self.midi_channel)
 
-        # Ultimo accordo valido (per HOLD mode)
-        self.last_valid_chord = None  # {'transpose': 0, 'filter': {0, 4, 7}, 'name': 'CMaj'}
+        # Thread di input: split, riconoscimento e debounce degli accordi fuori
+        # dal loop Tk; alla GUI arriva solo lo stato da visualizzare
+        self.input_processor = InputProcessor(self.style_player, self.keyboard_split,
+                                              on_display=self.key_display.chord_changed,
+                                              on_start=self.on_chord_start)
+        self.input_processor.start()
 
         # Sezione selezionata per l'auto-start
         self.selected_section = None
 
-        # Flag per attendere rilascio completo delle note prima di riattivare
-        self.waiting_for_all_notes_off = False
-
-        # Chord debouncing
-        self.chord_debounce_ms = 50  # Default 50ms
-        self.pending_chord = None  # Accordo in attesa di applicazione
-        self.chord_debounce_timer = None  # Timer per il debounce
-
         # Timer per aggiornamento progresso
         self.progress_update_timer = None
 
+        # Ritardo del timer Tk rispetto all'intervallo previsto (GUI bloccata)
+        self.ui_lag = LatencyHistogram()
+        self._last_progress_update = None
+
         # Frame principale
         self.setup_ui()
 
-        # Avvia aggiornamento progresso
+        # Avvia aggiornamento progresso e frame della tastiera
         self.update_progress_display()
+        self.update_frame()
         
     def setup_ui(self):
         # Frame per la selezione MIDI Input
@@ -146,6 +164,27 @@ class VirtualKeyboard:
         self.input_status_label = ttk.Label(input_frame, text="Input: Non connesso", foreground="red")
         self.input_status_label.pack(side=tk.LEFT, padx=10)
 
+        # Diteggiatura accordi e split point
+        ttk.Label(input_frame, text="Diteggiatura:").pack(side=tk.LEFT, padx=(20, 5))
+
+        self.fingering_combo = ttk.Combobox(input_frame, width=16, state="readonly")
+        self.fingering_combo['values'] = [FINGERING_NAMES[mode] for mode in FINGERING_MODES]
+        self.fingering_combo.current(FINGERING_MODES.index(self.keyboard_split.fingering))
+        self.fingering_combo.pack(side=tk.LEFT, padx=5)
+        self.fingering_combo.bind('<<ComboboxSelected>>', self.on_fingering_change)
+
+        ttk.Label(input_frame, text="Split:").pack(side=tk.LEFT, padx=(20, 5))
+
+        self.split_var = tk.StringVar(value=str(self.keyboard_split.split_point))
+        self.split_spinbox = ttk.Spinbox(input_frame, from_=21, to=108, width=5,
+                                         textvariable=self.split_var, command=self.on_split_change)
+        self.split_spinbox.pack(side=tk.LEFT, padx=5)
+        self.split_spinbox.bind('<Return>', lambda _: self.on_split_change())
+
+        self.split_name_label = ttk.Label(input_frame,
+                                          text=self.get_note_name(self.keyboard_split.split_point))
+        self.split_name_label.pack(side=tk.LEFT)
+
         # Frame per la selezione MIDI Output
         output_frame = ttk.Frame(self.root, padding="10")
         output_frame.pack(fill=tk.X)
@@ -265,6 +304,19 @@ class VirtualKeyboard:
         self.beat_label = ttk.Label(style_control_frame, text="Beat: -/-", font=("Arial", 10, "bold"))
         self.beat_label.pack(side=tk.LEFT, padx=10)
 
+        # Overlay di timing (ritardi del playback, della porta e della GUI)
+        self.show_timing_var = tk.BooleanVar(value=False)
+        self.show_timing_checkbox = ttk.Checkbutton(
+            style_control_frame,
+            text="Timing",
+            variable=self.show_timing_var,
+            command=self.update_timing_display
+        )
+        self.show_timing_checkbox.pack(side=tk.LEFT, padx=(0, 5))
+
+        self.timing_label = ttk.Label(style_control_frame, text="", font=("Consolas", 8))
+        self.timing_label.pack(side=tk.LEFT, padx=5)
+
         ttk.Label(style_control_frame, text="Tempo:").pack(side=tk.LEFT, padx=(20, 5))
 
         self.tempo_var = tk.StringVar(value="120")
@@ -277,7 +329,7 @@ class VirtualKeyboard:
         # Chord debounce time
         ttk.Label(style_control_frame, text="Debounce:").pack(side=tk.LEFT, padx=(20, 5))
 
-        self.debounce_var = tk.StringVar(value="50")
+        self.debounce_var = tk.StringVar(value=str(self.input_processor.debounce_ms))
         self.debounce_spinbox = ttk.Spinbox(style_control_frame, from_=0, to=200, width=5,
                                             textvariable=self.debounce_var, command=self.on_debounce_change)
         self.debounce_spinbox.pack(side=tk.LEFT, padx=5)
@@ -289,7 +341,8 @@ class VirtualKeyboard:
         self.hold_chord_checkbox = ttk.Checkbutton(
             style_control_frame,
             text="Hold Chord",
-            variable=self.hold_chord_var
+            variable=self.hold_chord_var,
+            command=self.on_hold_change
         )
         self.hold_chord_checkbox.pack(side=tk.LEFT, padx=(20, 5))
 
@@ -298,7 +351,8 @@ class VirtualKeyboard:
         self.hold_drums_checkbox = ttk.Checkbutton(
             style_control_frame,
             text="Hold Drums",
-            variable=self.hold_drums_var
+            variable=self.hold_drums_var,
+            command=self.on_hold_change
         )
         self.hold_drums_checkbox.pack(side=tk.LEFT, padx=(5, 5))
 
@@ -377,6 +431,19 @@ class VirtualKeyboard:
     def on_channel_change(self, event=None):
         """Gestisce il cambio di canale MIDI"""
         self.midi_channel = int(self.channel_combo.get()) - 1  # 1-16 -> 0-15
+        self.keyboard_split.live_channel = self.midi_channel
+
+    def on_fingering_change(self, event=None):
+        """Gestisce il cambio di diteggiatura accordi"""
+        self.input_processor.set_fingering(FINGERING_MODES[self.fingering_combo.current()])
+
+    def on_split_change(self):
+        """Gestisce il cambio dello split point (ultima nota della zona accordi)"""
+        try:
+            self.keyboard_split.set_split_point(int(self.split_var.get()))
+        except ValueError:
+            return
+        self.split_name_label.config(text=self.get_note_name(self.keyboard_split.split_point))
 
     def on_program_change(self, event=None):
         """Gestisce il cambio di strumento MIDI (Program Change)"""
@@ -386,8 +453,9 @@ class VirtualKeyboard:
 
         # Invia il messaggio Program Change se la porta output è connessa
         if self.midi_output:
-            msg = mido.Message('program_change', program=self.midi_program, channel=self.midi_channel)
-            self.midi_output.send(msg)
+            self.midi_output.send_bytes(bytes((0xC0 | self.midi_channel, self.midi_program)))
+            # Se il canale è anche dello style, il player ne reinvierà il setup
+            self.style_player.forget_channel_state(self.midi_channel)
 
     def draw_keyboard(self):
         """Disegna la tastiera virtuale (88 tasti, da A0 a C8)"""
@@ -485,6 +553,11 @@ class VirtualKeyboard:
         total_width = 52 * self.white_key_width
         self.canvas.configure(scrollregion=(0, 0, total_width, self.white_key_height + 20))
 
+        # Ridisegnata la tastiera, i tasti accesi restano accesi
+        for note, color in self.key_display.shown.items():
+            if note in self.key_positions:
+                self.canvas.itemconfig(self.key_positions[note], fill=color)
+
     def get_note_name(self, note_number):
         """Restituisce il nome della nota con l'ottava"""
         notes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
@@ -499,12 +572,8 @@ class VirtualKeyboard:
             return
 
         try:
-            self.midi_input = mido.open_input(selected_port)
-            self.running = True
-
-            # Avvia thread per leggere messaggi MIDI
-            self.midi_thread = threading.Thread(target=self.read_midi, daemon=True)
-            self.midi_thread.start()
+            # I messaggi arrivano nel thread di rtmidi: on_midi_message li accoda
+            self.midi_input = mido.open_input(selected_port, callback=self.on_midi_message)
 
             # Mostra nome porta abbreviato se troppo lungo
             port_display = selected_port if len(selected_port) <= 25 else selected_port[:22] + "..."
@@ -515,12 +584,13 @@ class VirtualKeyboard:
 
     def disconnect_midi_input(self):
         """Disconnette dalla porta MIDI input"""
-        self.running = False
-
         if self.midi_input:
             self.midi_input.close()
             self.midi_input = None
 
+        # Spegne la voce live e svuota la zona accordi
+        self.input_processor.release_all()
+
         # Resetta tutti i tasti
         for note in list(self.active_notes):
             self.note_off(note)
@@ -534,11 +604,16 @@ class VirtualKeyboard:
             return
 
         try:
-            self.midi_output = mido.open_output(selected_port)
+            self.midi_dispatcher = MidiDispatcher(open_output(selected_port))
+            self.midi_dispatcher.start()
+            self.midi_output = self.midi_dispatcher.output_for(PRIORITY_UI)
+            self.style_output = self.midi_dispatcher.output_for(PRIORITY_SCHEDULED)
+            # Solo qui l'output dello style cambia: synth nuovo, setup da inviare per intero
+            self.style_player.set_midi_output(self.style_output)
+            self.keyboard_split.set_output(self.midi_output)
 
             # Invia il Program Change iniziale per impostare lo strumento
-            msg = mido.Message('program_change', program=self.midi_program, channel=self.midi_channel)
-            self.midi_output.send(msg)
+            self.midi_output.send_bytes(bytes((0xC0 | self.midi_channel, self.midi_program)))
 
             # Mostra nome porta abbreviato se troppo lungo
             port_display = selected_port if len(selected_port) <= 25 else selected_port[:22] + "..."
@@ -550,183 +625,107 @@ class VirtualKeyboard:
     def disconnect_midi_output(self):
         """Disconnette dalla porta MIDI output"""
         if self.midi_output:
-            # Invia note-off per tutte le note eventualmente attive
-            for note in range(128):
-                try:
-                    msg = mido.Message('note_off', note=note, velocity=0, channel=self.midi_channel)
-                    self.midi_output.send(msg)
-                except:
-                    pass
-
-            self.midi_output.close()
+            # Lo style si ferma (le sue note si spengono) e non usa più la porta
+            if self.style_player.is_playing():
+                self.stop_style()
+            self.style_player.set_midi_output(None)
+
+            # Invia note-off solo per le note effettivamente accese
+            try:
+                self.keyboard_split.set_output(None)
+            except Exception as e:
+                print(f"Errore invio MIDI: {e}")
+
+            # Scrive i messaggi ancora in coda e chiude la porta
+            self.midi_dispatcher.close()
+            self.midi_dispatcher = None
             self.midi_output = None
+            self.style_output = None
 
         self.output_status_label.config(text="Output: Non connesso", foreground="orange")
 
     def play_note(self, note, velocity):
-        """Suona una nota inviandola all'output MIDI e visualizzandola"""
-        if self.midi_output:
-            # Invia note-on al dispositivo MIDI
-            msg = mido.Message('note_on', note=note, velocity=velocity, channel=self.midi_channel)
-            self.midi_output.send(msg)
+        """Tasto della tastiera virtuale premuto: come una nota dall'input MIDI"""
+        # Sopra lo split suona sull'output, sotto cambia l'accordo
+        self.input_processor.note_on(note, velocity)
 
         # Visualizza il tasto premuto
         self.note_on(note, velocity)
 
     def stop_note(self, note):
-        """Ferma una nota inviando note-off"""
-        if self.midi_output:
-            # Invia note-off al dispositivo MIDI
-            msg = mido.Message('note_off', note=note, velocity=0, channel=self.midi_channel)
-            self.midi_output.send(msg)
+        """Tasto della tastiera virtuale rilasciato"""
+        # Il note-off parte sul canale su cui la nota è stata accesa
+        # (il canale può essere cambiato nel frattempo)
+        self.input_processor.note_off(note)
 
         # Visualizza il tasto rilasciato
         self.note_off(note)
 
-    def read_midi(self):
-        """Legge i messaggi MIDI in un thread separato"""
-        try:
-            for msg in self.midi_input:
-                if not self.running:
-                    break
-                
-                if msg.type == 'note_on' and msg.velocity > 0:
-                    self.root.after(0, self.note_on, msg.note, msg.velocity)
-                elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
-                    self.root.after(0, self.note_off, msg.note)
-                    
-        except Exception as e:
-            self.root.after(0, lambda: self.status_label.config(
-                text=f"Errore lettura MIDI: {str(e)}", foreground="red"
-            ))
-    
-    def note_on(self, note, velocity):
-        """Evidenzia il tasto premuto"""
-        if note in self.key_positions:
-            self.active_notes.add(note)
+    def on_midi_message(self, msg):
+        """
+        Callback della porta di input (thread di rtmidi).
 
-            # Aggiorna chord recognizer
-            self.chord_recognizer.note_on(note)
-            self.update_chord_display()
+        Le note vanno all'input processor, che le elabora nel suo thread,
+        e al buffer dei tasti che la GUI ridisegna a ogni frame.
+        """
+        self.input_processor.put(msg)
+        if msg.type == 'note_on' and msg.velocity > 0:
+            self.note_on(msg.note, msg.velocity)
+        elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
+            self.note_off(msg.note)
 
-            # Calcola il colore in base alla velocity
-            intensity = int((velocity / 127) * 100) + 155
-            color = f"#{intensity:02x}{intensity//2:02x}{intensity//2:02x}"
+    def note_on(self, note, velocity):
+        """Evidenzia il tasto premuto (al prossimo frame, da qualsiasi thread)"""
+        self.key_display.note_on(note, velocity)
 
-            # Colora il tasto
-            is_black = (note % 12) in [1, 3, 6, 8, 10]
-            if is_black:
-                self.canvas.itemconfig(self.key_positions[note], fill=color)
-            else:
-                self.canvas.itemconfig(self.key_positions[note], fill=color)
-    
     def note_off(self, note):
-        """Ripristina il colore originale del tasto"""
-        if note in self.key_positions and note in self.active_notes:
-            self.active_notes.remove(note)
-
-            # Aggiorna chord recognizer
-            self.chord_recognizer.note_off(note)
-            self.update_chord_display()
-
-            # Ripristina colore originale
-            is_black = (note % 12) in [1, 3, 6, 8, 10]
-            original_color = "black" if is_black else "white"
-            self.canvas.itemconfig(self.key_positions[note], fill=original_color)
-
-    def update_chord_display(self):
-        """Aggiorna il display dell'accordo riconosciuto e applica trasposizione"""
-        chord_name = self.chord_recognizer.get_chord_name()
-
-        if chord_name:
-            # Calcola trasposizione (da C = 0)
-            transpose_semitones = self.chord_recognizer.get_transposition_semitones(from_root=0)
-
-            # Crea il chord data
-            chord_data = {
-                'transpose': transpose_semitones,
-                'name': chord_name
-            }
-
-            # Controlla se l'accordo è cambiato rispetto al pending
-            if self.pending_chord is None or self.pending_chord != chord_data:
-                # Nuovo accordo o accordo diverso - cancella timer precedente
-                if self.chord_debounce_timer:
-                    self.root.after_cancel(self.chord_debounce_timer)
-
-                # Salva il nuovo accordo pending
-                self.pending_chord = chord_data
-
-                # Aggiorna display immediatamente (visual feedback)
-                self.chord_display_label.config(text=f"Accordo: {chord_name}", foreground="blue")
-
-                # Se il debounce è 0, applica immediatamente
-                if self.chord_debounce_ms == 0:
-                    self.apply_chord(chord_data)
-                else:
-                    # Altrimenti schedula l'applicazione dopo il debounce
-                    self.chord_debounce_timer = self.root.after(
-                        self.chord_debounce_ms,
-                        lambda: self.apply_chord(chord_data)
-                    )
-        else:
-            # Nessun accordo attivo
-            # Cancella pending chord e timer
-            if self.chord_debounce_timer:
-                self.root.after_cancel(self.chord_debounce_timer)
-                self.chord_debounce_timer = None
-            self.pending_chord = None
-
-            # Se tutte le note sono rilasciate, resetta il flag di attesa
-            if len(self.active_notes) == 0:
-                self.waiting_for_all_notes_off = False
-
-            if self.hold_chord_var.get():
-                # HOLD MODE: mantiene ultimo accordo
-                if self.last_valid_chord:
-                    # Mostra ultimo accordo tra parentesi
-                    self.chord_display_label.config(
-                        text=f"Accordo: ({self.last_valid_chord['name']})",
-                        foreground="orange"
-                    )
-                    # Mantieni trasposizione e filtro dell'ultimo accordo
-                    # (già impostati, non fare nulla)
-                else:
-                    self.chord_display_label.config(text="Accordo: ---", foreground="gray")
-            else:
-                # STOP MODE: ferma subito le note melodiche
-                self.chord_display_label.config(text="Accordo: ---", foreground="gray")
-                if self.style_player.is_playing():
-                    # Ferma immediatamente le note (drums continuano se Hold Drums attivo)
-                    hold_drums = self.hold_drums_var.get()
-                    self.style_player.stop_melodic_notes(hold_drums=hold_drums)
-
-    def apply_chord(self, chord_data):
+        """Ripristina il colore originale del tasto (al prossimo frame, da qualsiasi thread)"""
+        self.key_display.note_off(note)
+
+    def update_frame(self):
         """
-        Applica l'accordo dopo il debounce.
-        Chiamato dal timer dopo chord_debounce_ms millisecondi.
+        Applica i cambi accumulati dall'ultimo frame: solo i tasti il cui
+        colore è davvero cambiato e, se serve, l'accordo.
         """
-        # Verifica che sia ancora il chord atteso (potrebbe essere cambiato nel frattempo)
-        if self.pending_chord == chord_data:
-            # Accordo riconosciuto - avvia playback se non già attivo
-            if not self.style_player.is_playing() and self.current_style_file:
-                # Se stiamo aspettando il rilascio completo, non fare nulla
-                if not self.waiting_for_all_notes_off:
-                    self.auto_start_style()
-
-            # Riattiva le note melodiche (se erano bloccate)
-            self.style_player.block_melodic_notes = False
-
-            # Applica trasposizione
-            self.style_player.set_transpose(chord_data['transpose'])
+        keys, chord = self.key_display.take()
+        for note, color in keys.items():
+            if color is None:
+                self.active_notes.discard(note)
+                color = KEY_COLORS[note]
+            else:
+                self.active_notes.add(note)
+            if note in self.key_positions:
+                self.canvas.itemconfig(self.key_positions[note], fill=color)
+        if chord:
+            self.refresh_chord_display()
+
+        self.frame_timer = self.root.after(FRAME_INTERVAL_MS, self.update_frame)
+
+    def refresh_chord_display(self):
+        """Mostra l'accordo dell'input processor (più cambi nel frame: solo l'ultimo)"""
+        state = self.input_processor.get_display_state()
+        if state['name'] is None:
+            self.chord_display_label.config(text="Accordo: ---", foreground="gray")
+        elif state['held']:
+            # HOLD MODE: ultimo accordo tra parentesi
+            self.chord_display_label.config(text=f"Accordo: ({state['name']})",
+                                            foreground="orange")
+        else:
+            self.chord_display_label.config(text=f"Accordo: {state['name']}", foreground="blue")
 
-            # Salva come ultimo accordo valido
-            self.last_valid_chord = chord_data
+    def on_chord_start(self, chord):
+        """Accordo applicato a style fermo (thread dell'input processor): avvio automatico"""
+        self.root.after(0, self.auto_start_style)
 
     # ========== STYLE PLAYER METHODS ==========
 
     def load_style_file(self):
-        """Apre dialog per caricare un file .STY"""
+        """
+        Apre dialog per caricare un file .STY.
+
+        Lo style viene compilato in background (la GUI non si blocca); se uno
+        style sta suonando, il nuovo subentra al prossimo confine di battuta.
+        """
         filename = filedialog.askopenfilename(
             title="Seleziona file Style",
             initialdir="sty/stili_miei",
@@ -734,41 +733,65 @@ class VirtualKeyboard:
         )
 
         if filename:
-            if self.style_player.load_style(filename):
-                self.current_style_file = filename
-                info = self.style_player.get_style_info()
+            self.style_info_label.config(text=f"Caricamento {os.path.basename(filename)}...")
+            self.style_player.preload_style(
+                filename,
+                callback=lambda preloaded: self.root.after(0, lambda: self.on_style_preloaded(preloaded))
+            )
 
-                # Aggiorna label info
-                self.style_info_label.config(
-                    text=f"{info['name']} - {info['tempo']:.0f} BPM - {info['sections']} sezioni"
-                )
+    def on_style_preloaded(self, preloaded):
+        """Style compilato in background: installalo o programma il cambio (thread Tk)"""
+        if preloaded is None:
+            self.style_info_label.config(text="Errore caricamento style")
+            return
 
-                # Abilita/disabilita pulsanti sezioni in base a quelle disponibili
-                available_sections = info['section_list']
-                for section_name, button in self.section_buttons.items():
-                    if section_name in available_sections:
-                        button.config(state="normal", bg="#D0D0D0", fg="black", activebackground="#B0B0B0")
-                    else:
-                        button.config(state="disabled", bg="#E0E0E0")
+        if self.style_player.is_playing():
+            # Il cambio scatta a fine battuta: la GUI si aggiorna quando avviene
+            # (vedi update_progress_display)
+            if self.style_player.switch_style(preloaded, self.selected_section):
+                self.style_status_label.config(
+                    text=f"Prossimo style: {preloaded.style_name}", foreground="orange")
+            return
 
-                # Imposta tempo
-                self.tempo_var.set(str(int(info['tempo'])))
+        if self.style_player.switch_style(preloaded):
+            self.on_style_changed(playing=False)
 
-                # Abilita controllo stop
-                self.stop_button.config(state="normal")
+    def on_style_changed(self, playing):
+        """Aggiorna la GUI per lo style installato nello style player"""
+        self.current_style_file = self.style_player.style_file
+        info = self.style_player.get_style_info()
 
-                # Connetti lo style player all'output MIDI corrente
-                if self.midi_output:
-                    self.style_player.set_midi_output(self.midi_output)
+        # Aggiorna label info
+        self.style_info_label.config(
+            text=f"{info['name']} - {info['tempo']:.0f} BPM - {info['sections']} sezioni"
+        )
 
-                # Imposta trasposizione a 0 (nessuna trasposizione) come default
-                self.style_player.set_transpose(0)
+        # Abilita/disabilita pulsanti sezioni in base a quelle disponibili
+        available_sections = info['section_list']
+        for section_name, button in self.section_buttons.items():
+            if section_name in available_sections:
+                button.config(state="normal", bg="#D0D0D0", fg="black", activebackground="#B0B0B0")
+            else:
+                button.config(state="disabled", bg="#E0E0E0")
 
-                # Auto-seleziona primo Intro o Main disponibile
-                self.auto_select_initial_section()
+        # Imposta tempo
+        self.tempo_var.set(str(int(info['tempo'])))
 
-            else:
-                self.style_info_label.config(text="Errore caricamento style")
+        # Abilita controllo stop
+        self.stop_button.config(state="normal")
+
+        if playing:
+            # Cambio style durante il playback: accordo e sezione restano quelli in corso
+            self.selected_section = self.style_player.current_section
+            self.style_status_label.config(text=f"Playing: {self.selected_section}", foreground="green")
+            self.update_section_button_colors()
+            return
+
+        # Imposta trasposizione a 0 (nessuna trasposizione) come default
+        self.style_player.set_transpose(0)
+
+        # Auto-seleziona primo Intro o Main disponibile
+        self.auto_select_initial_section()
 
     def auto_select_initial_section(self):
         """Auto-seleziona primo Intro disponibile, o primo Main se nessun Intro"""
@@ -790,6 +813,9 @@ class VirtualKeyboard:
 
     def auto_start_style(self):
         """Avvia automaticamente il playback della sezione selezionata"""
+        if self.style_player.is_playing() or not self.current_style_file:
+            return
+
         # Se c'è una sezione selezionata, usa quella
         if self.selected_section and self.selected_section in self.section_buttons:
             if str(self.section_buttons[self.selected_section].cget('state')) == 'normal':
@@ -830,11 +856,7 @@ class VirtualKeyboard:
 
     def start_section(self, section_name):
         """Avvia il playback di una sezione specifica"""
-        # Imposta output MIDI se non già fatto
-        if self.midi_output:
-            self.style_player.set_midi_output(self.midi_output)
-
-        # Avvia playback
+        # Avvia playback (l'output dello style è impostato alla connessione)
         if self.style_player.play_section(section_name, loop=True):
             self.current_section_label.config(text=f"Sezione: {section_name}", foreground="blue")
             self.style_status_label.config(text=f"Playing: {section_name}", foreground="green")
@@ -850,25 +872,15 @@ class VirtualKeyboard:
         # Auto-seleziona primo Intro o Main
         self.auto_select_initial_section()
 
-        # Reset completo: resetta flag e pulisci active_notes
+        # Reset completo: resetta flag e spegne i tasti a schermo
         # (lo Stop manuale non deve aspettare - agisce subito)
-        self.waiting_for_all_notes_off = False
-        self.active_notes.clear()
-        self.chord_recognizer.clear()
-        self.update_chord_display()
+        self.input_processor.waiting_for_release = False
+        for note in list(self.active_notes):
+            self.note_off(note)
 
-        # Invia MIDI reset per spegnere eventuali note rimaste accese
-        if self.midi_output:
-            for channel in range(16):
-                try:
-                    # All Notes Off
-                    msg = mido.Message('control_change', control=123, value=0, channel=channel)
-                    self.midi_output.send(msg)
-                    # All Sound Off (più drastico)
-                    msg = mido.Message('control_change', control=120, value=0, channel=channel)
-                    self.midi_output.send(msg)
-                except:
-                    pass
+        # Spegne le note della tastiera rimaste accese (quelle dello style le
+        # ha già spente stop())
+        self.input_processor.release_all()
 
     def on_tempo_change(self):
         """Gestisce il cambio di tempo"""
@@ -882,10 +894,15 @@ class VirtualKeyboard:
         """Gestisce il cambio del tempo di debounce"""
         try:
             debounce_ms = int(self.debounce_var.get())
-            self.chord_debounce_ms = max(0, min(200, debounce_ms))
+            self.input_processor.debounce_ms = max(0, min(200, debounce_ms))
         except ValueError:
             pass
 
+    def on_hold_change(self):
+        """Copia Hold Chord / Hold Drums nell'input processor (che non legge variabili Tk)"""
+        self.input_processor.hold_chord = self.hold_chord_var.get()
+        self.input_processor.hold_drums = self.hold_drums_var.get()
+
     def draw_progress_bar(self, canvas, progress, num_divisions):
         """Disegna una barra di progresso con divisioni"""
         canvas.delete("all")
@@ -912,8 +929,36 @@ class VirtualKeyboard:
                 x = int((width / num_divisions) * i)
                 canvas.create_line(x, 0, x, height, fill="#333333", width=2)
 
+    def update_timing_display(self):
+        """Aggiorna l'overlay di timing (vuoto se disattivato)"""
+        if not self.show_timing_var.get():
+            self.timing_label.config(text="")
+            return
+
+        stats = self.style_player.get_timing_stats()
+        lateness = stats['lateness']
+        text = (f"Style p99 {lateness['p99_ms']:.2f} max {lateness['max_ms']:.1f} ms"
+                f" | Tk p99 {self.ui_lag.percentile(99) / 1000.0:.0f} ms")
+        if self.midi_dispatcher:
+            port = self.midi_dispatcher.get_stats()
+            text += f" | Porta max {port['max_latency_ms']:.1f} ms"
+        text += (f" | inv {stats['events_sent']} filt {stats['events_filtered']}"
+                 f" scart {stats['events_dropped']} err {stats['send_errors']}")
+        problems = stats['send_errors'] or lateness['p99_ms'] > 5.0
+        self.timing_label.config(text=text, foreground="red" if problems else "black")
+
     def update_progress_display(self):
         """Aggiorna la visualizzazione del progresso (misura, beat, barra)"""
+        # Ritardo di questo aggiornamento rispetto al timer: misura i blocchi della GUI
+        now = time.perf_counter()
+        if self._last_progress_update is not None:
+            self.ui_lag.record_seconds(now - self._last_progress_update - PROGRESS_UPDATE_MS / 1000.0)
+        self._last_progress_update = now
+
+        # Style cambiato dal thread di playback (cambio style a fine battuta)
+        if self.style_player.style_file and self.style_player.style_file != self.current_style_file:
+            self.on_style_changed(playing=self.style_player.is_playing())
+
         progress = self.style_player.get_playback_progress()
 
         if progress:
@@ -950,12 +995,9 @@ class VirtualKeyboard:
                 self.style_player.next_section_after_stop = None  # Reset
                 self.selected_section = next_section
                 self.update_section_button_colors()
-                # Attiva flag per attendere rilascio completo delle note
-                # MA se le note sono già tutte rilasciate, resetta subito la flag
-                if len(self.active_notes) == 0:
-                    self.waiting_for_all_notes_off = False
-                else:
-                    self.waiting_for_all_notes_off = True
+                # Attende il rilascio della zona accordi prima di ripartire
+                # (se è già vuota può ripartire subito)
+                self.input_processor.waiting_for_release = self.keyboard_split.chord is not None
 
             # Resetta visualizzazione
             self.measure_label.config(text="Misura: --/--")
@@ -963,8 +1005,10 @@ class VirtualKeyboard:
             self.draw_progress_bar(self.measure_progress_canvas, 0, 4)
             self.draw_progress_bar(self.section_progress_canvas, 0, 8)
 
+        self.update_timing_display()
+
         # Schedula prossimo aggiornamento (ogni 50ms per fluidità)
-        self.progress_update_timer = self.root.after(50, self.update_progress_display)
+        self.progress_update_timer = self.root.after(PROGRESS_UPDATE_MS, self.update_progress_display)
 
     # ========== END STYLE PLAYER METHODS ==========
 
@@ -973,9 +1017,12 @@ class VirtualKeyboard:
         # Ferma timer aggiornamento progresso
         if self.progress_update_timer:
             self.root.after_cancel(self.progress_update_timer)
+        if self.frame_timer:
+            self.root.after_cancel(self.frame_timer)
 
         self.style_player.stop()
         self.disconnect_midi_input()
+        self.input_processor.stop()
         self.disconnect_midi_output()
         self.root.destroy()
 
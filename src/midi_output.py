@@ -0,0 +1,153 @@
+"""
+MidiOutput - Porta di uscita che invia byte MIDI già codificati
+"""
+
+import threading
+import time
+
+import mido
+
+
+class MidiOutput:
+    """
+    Involucro di una porta mido che accetta messaggi già codificati in byte.
+
+    Con il backend rtmidi i byte vanno direttamente a send_message di
+    python-rtmidi, senza costruire, validare e copiare un mido.Message per
+    ogni evento. Con gli altri backend (o porte qualsiasi con send) i byte
+    vengono riconvertiti in messaggi mido.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        rt = getattr(port, '_rt', None)
+        self._send_message = getattr(rt, 'send_message', None)
+        self._lock = threading.Lock()
+
+    @property
+    def raw(self):
+        """True se i byte vengono scritti direttamente sul backend rtmidi"""
+        return self._send_message is not None
+
+    @property
+    def name(self):
+        return getattr(self.port, 'name', None)
+
+    @property
+    def closed(self):
+        return getattr(self.port, 'closed', False)
+
+    def send_bytes(self, data):
+        """
+        Invia un messaggio già codificato.
+
+        Args:
+            data: bytes (o sequenza di interi) con status e dati, es.
+                bytes((0x90, 60, 100)); i sysex includono F0 ... F7
+        """
+        send_message = self._send_message
+        if send_message is not None:
+            with self._lock:
+                send_message(data)
+        else:
+            self.port.send(mido.Message.from_bytes(data))
+
+    def send_many(self, messages):
+        """Invia in sequenza un gruppo di messaggi già codificati (es. un burst)"""
+        send_message = self._send_message
+        if send_message is not None:
+            with self._lock:
+                for data in messages:
+                    send_message(data)
+        else:
+            for data in messages:
+                self.port.send(mido.Message.from_bytes(data))
+
+    def send_panic(self, messages):
+        """Invia messaggi urgenti (stop, All Notes Off): qui partono subito come gli altri"""
+        self.send_many(messages)
+
+    def send(self, msg):
+        """Invia un messaggio mido (compatibile con le porte mido)"""
+        if self._send_message is not None:
+            self.send_bytes(msg.bytes())
+        else:
+            self.port.send(msg)
+
+    def close(self):
+        self.port.close()
+
+
+class RecordingPort:
+    """
+    Uscita in memoria che registra (istante, bytes) di ogni messaggio.
+
+    Accettata da StylePlayer.set_midi_output come una porta vera: con un
+    VirtualClock i test verificano il flusso in uscita con i tempi esatti.
+    Conta anche le chiamate ricevute e i thread che hanno scritto.
+
+    Args:
+        clock: orologio con clock() (None = time.perf_counter)
+    """
+
+    def __init__(self, clock=None, name='recording'):
+        self._clock = clock.clock if clock is not None else time.perf_counter
+        self.name = name
+        self.closed = False
+        self.events = []
+        self.calls = 0         # chiamate di invio ricevute
+        self.threads = set()   # thread che hanno inviato
+        self._lock = threading.Lock()
+
+    def send_bytes(self, data):
+        self.send_many((data,))
+
+    def send_many(self, messages):
+        with self._lock:
+            now = self._clock()
+            self.events.extend((now, bytes(data)) for data in messages)
+            self.calls += 1
+            self.threads.add(threading.get_ident())
+
+    def send_panic(self, messages):
+        self.send_many(messages)
+
+    def send(self, msg):
+        self.send_bytes(msg.bytes())
+
+    def close(self):
+        self.closed = True
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+            self.calls = 0
+
+    def messages(self, since=None):
+        """
+        Messaggi registrati come (istante, mido.Message).
+
+        Args:
+            since: se indicato, istanti relativi a since e solo quelli successivi
+        """
+        with self._lock:
+            events = list(self.events)
+        if since is None:
+            return [(when, mido.Message.from_bytes(data)) for when, data in events]
+        return [(when - since, mido.Message.from_bytes(data)) for when, data in events
+                if when >= since]
+
+
+def as_midi_output(port):
+    """
+    Ritorna port come uscita a byte: MidiOutput o QueuedOutput restano
+    invariati (None resta None), una porta mido viene avvolta.
+    """
+    if port is None or hasattr(port, 'send_bytes'):
+        return port
+    return MidiOutput(port)
+
+
+def open_output(name=None, **kwargs):
+    """Apre una porta di uscita mido e la avvolge in un MidiOutput"""
+    return MidiOutput(mido.open_output(name, **kwargs))
@@ -0,0 +1,397 @@
+"""
+NoteEngine - Trasposizione delle note di un'intera sezione secondo le regole CASM
+"""
+
+from itertools import compress
+
+from style_casm import (ChannelRule, RECOGNIZER_TO_YAMAHA, NTR_ROOT_TRANS, NTT_BYPASS,
+                        NTT_CHORD, NTT_DORIAN, NTT_HARMONIC_MINOR, NTT_MELODIC_MINOR,
+                        NTT_NATURAL_MINOR)
+from style_timeline import NOTE_OFF, NOTE_ON
+
+try:
+    import numpy as np
+except ImportError:  # numpy è opzionale: senza si usa il percorso Python puro
+    np = None
+
+
+DRUM_CHANNEL = 9
+
+# Modalità di trasposizione per canale
+MODE_BYPASS = 0
+MODE_ROOT_TRANS = 1
+MODE_ROOT_FIXED = 2
+
+_MAJOR = (0, 2, 4, 5, 7, 9, 11)
+_MIXOLYDIAN = (0, 2, 4, 5, 7, 9, 10)
+_MINOR = (0, 2, 3, 5, 7, 8, 10)
+_DORIAN = (0, 2, 3, 5, 7, 9, 10)
+_MELODIC_MINOR = (0, 2, 3, 5, 7, 9, 11)
+_HARMONIC_MINOR = (0, 2, 3, 5, 7, 8, 11)
+
+# Per ogni tipo di accordo Yamaha (stesso ordine di YAMAHA_CHORD_TYPES):
+# (scala a 7 gradi usata per le note di passaggio, note dell'accordo)
+_CHORD_TABLE = [
+    (_MAJOR, (0, 4, 7)),                              # Maj
+    (_MAJOR, (0, 4, 7, 9)),                           # Maj6
+    (_MAJOR, (0, 4, 7, 11)),                          # Maj7
+    ((0, 2, 4, 6, 7, 9, 11), (0, 4, 6, 7, 11)),       # Maj7(#11)
+    (_MAJOR, (0, 2, 4, 7)),                           # Maj(9)
+    (_MAJOR, (0, 2, 4, 7, 11)),                       # Maj7(9)
+    (_MAJOR, (0, 2, 4, 7, 9)),                        # Maj6(9)
+    ((0, 2, 4, 5, 8, 9, 11), (0, 4, 8)),              # aug
+    (_MINOR, (0, 3, 7)),                              # min
+    (_DORIAN, (0, 3, 7, 9)),                          # min6
+    (_DORIAN, (0, 3, 7, 10)),                         # min7
+    ((0, 2, 3, 5, 6, 8, 10), (0, 3, 6, 10)),          # min7b5
+    (_MINOR, (0, 2, 3, 7)),                           # min(9)
+    (_DORIAN, (0, 2, 3, 7, 10)),                      # min7(9)
+    (_DORIAN, (0, 3, 5, 7, 10)),                      # min7(11)
+    (_MELODIC_MINOR, (0, 3, 7, 11)),                  # minMaj7
+    (_MELODIC_MINOR, (0, 2, 3, 7, 11)),               # minMaj7(9)
+    ((0, 2, 3, 5, 6, 8, 9), (0, 3, 6)),               # dim
+    ((0, 2, 3, 5, 6, 8, 9), (0, 3, 6, 9)),            # dim7
+    (_MIXOLYDIAN, (0, 4, 7, 10)),                     # 7
+    ((0, 2, 5, 5, 7, 9, 10), (0, 5, 7, 10)),          # 7sus4
+    ((0, 2, 4, 5, 6, 9, 10), (0, 4, 6, 10)),          # 7b5
+    (_MIXOLYDIAN, (0, 2, 4, 7, 10)),                  # 7(9)
+    ((0, 2, 4, 6, 7, 9, 10), (0, 4, 6, 7, 10)),       # 7(#11)
+    (_MIXOLYDIAN, (0, 4, 7, 9, 10)),                  # 7(13)
+    ((0, 1, 4, 5, 7, 9, 10), (0, 1, 4, 7, 10)),       # 7(b9)
+    ((0, 2, 4, 5, 7, 8, 10), (0, 4, 7, 8, 10)),       # 7(b13)
+    ((0, 3, 4, 5, 7, 9, 10), (0, 3, 4, 7, 10)),       # 7(#9)
+    ((0, 2, 4, 5, 8, 9, 11), (0, 4, 8, 11)),          # Maj7aug
+    ((0, 2, 4, 5, 8, 9, 10), (0, 4, 8, 10)),          # 7aug
+    (_MAJOR, (0,)),                                   # 1+8
+    (_MAJOR, (0, 7)),                                 # 1+5
+    ((0, 2, 5, 5, 7, 9, 11), (0, 5, 7)),              # sus4
+    ((0, 2, 2, 5, 7, 9, 11), (0, 2, 7)),              # 1+2+5
+    (_MAJOR, (0, 4, 7)),                              # cancel
+]
+
+_MINOR_THIRD = 3
+
+# Scale delle NTT "minori": valgono quando l'accordo di destinazione è minore
+_NTT_MINOR_SCALES = {
+    NTT_MELODIC_MINOR: _MELODIC_MINOR,
+    NTT_HARMONIC_MINOR: _HARMONIC_MINOR,
+    NTT_NATURAL_MINOR: _MINOR,
+    NTT_DORIAN: _DORIAN,
+}
+
+_DEFAULT_CHORD_TYPE = 0  # Maj, per i tipi che il riconoscitore non sa nominare
+
+# Tabelle di conversione già calcolate: (tipo sorgente, tipo destinazione, ntt) -> delta
+_delta_tables = {}
+
+
+def yamaha_chord_type(chord_type):
+    """Converte un tipo del ChordRecognizer (es. 'min7') nell'indice Yamaha"""
+    if isinstance(chord_type, int):
+        return chord_type
+    return RECOGNIZER_TO_YAMAHA.get(chord_type, _DEFAULT_CHORD_TYPE)
+
+
+def _chord_entry(yamaha_type):
+    if 0 <= yamaha_type < len(_CHORD_TABLE):
+        return _CHORD_TABLE[yamaha_type]
+    return _CHORD_TABLE[_DEFAULT_CHORD_TYPE]
+
+
+def _snap_to_chord(interval, chord_tones):
+    """Nota dell'accordo più vicina (a parità di distanza quella sotto)"""
+    best = None
+    for tone in chord_tones:
+        for candidate in (tone - 12, tone, tone + 12):
+            distance = abs(candidate - interval)
+            if best is None or distance < best[0] or (distance == best[0] and candidate < best[1]):
+                best = (distance, candidate)
+    return best[1]
+
+
+def delta_table(source_type, target_type, ntt):
+    """
+    Calcola di quanti semitoni spostare ogni intervallo (0-11 dalla root
+    sorgente) per passare dall'accordo sorgente a quello di destinazione.
+
+    Le note sono ricondotte al grado della scala sorgente e spostate sullo
+    stesso grado della scala di destinazione; con NTT Chord vengono poi
+    agganciate alla nota dell'accordo più vicina.
+
+    Returns:
+        tuple di 12 interi (delta in semitoni)
+    """
+    cache_key = (source_type, target_type, ntt)
+    table = _delta_tables.get(cache_key)
+    if table is not None:
+        return table
+
+    if ntt == NTT_BYPASS:
+        table = (0,) * 12
+    else:
+        source_scale, _ = _chord_entry(source_type)
+        target_scale, target_tones = _chord_entry(target_type)
+        if ntt in _NTT_MINOR_SCALES and _MINOR_THIRD in target_tones:
+            target_scale = _NTT_MINOR_SCALES[ntt]
+
+        deltas = []
+        for interval in range(12):
+            degree = 0
+            for index, step in enumerate(source_scale):
+                if step <= interval:
+                    degree = index
+            target = target_scale[degree] + interval - source_scale[degree]
+            if ntt == NTT_CHORD:
+                target = _snap_to_chord(target, target_tones)
+            deltas.append(target - interval)
+        table = tuple(deltas)
+
+    _delta_tables[cache_key] = table
+    return table
+
+
+class ChannelParams:
+    """
+    Parametri di trasposizione per i 16 canali, già risolti per un accordo.
+
+    Liste parallele indicizzate per canale; delta è una lista piatta
+    di 16 * 12 valori (canale * 12 + intervallo).
+    """
+
+    __slots__ = ('mode', 'source_root', 'shift', 'low', 'high', 'muted', 'rhythm', 'delta')
+
+    def __init__(self):
+        self.mode = [MODE_BYPASS] * 16
+        self.source_root = [0] * 16
+        self.shift = [0] * 16
+        self.low = [0] * 16
+        self.high = [127] * 16
+        self.muted = [False] * 16
+        self.rhythm = [False] * 16
+        self.delta = [0] * (16 * 12)
+
+
+def build_channel_params(rules, root, chord_type, bass=None):
+    """
+    Risolve le regole CASM di una sezione per l'accordo dato.
+
+    Args:
+        rules: dict canale sorgente -> ChannelRule (canale assente = trasposizione
+            per la sola root)
+        root: root dell'accordo 0-11
+        chord_type: tipo del ChordRecognizer o indice Yamaha
+        bass: nota di basso 0-11 per i canali con Bass attivo (None = root)
+
+    Returns:
+        ChannelParams
+    """
+    target_type = yamaha_chord_type(chord_type)
+    params = ChannelParams()
+
+    for channel in range(16):
+        rule = rules.get(channel)
+        if rule is None and channel != DRUM_CHANNEL:
+            # Canale senza regole CASM: solo trasposizione per la root, gli
+            # intervalli originali restano (come _render_transposed)
+            params.mode[channel] = MODE_ROOT_TRANS
+            params.shift[channel] = root if root <= 6 else root - 12
+            continue
+        if rule is None:
+            rule = ChannelRule(channel, ntt=NTT_BYPASS)
+
+        # Bypass: canali ritmici, mai trasposti (il canale 9 lo è sempre)
+        if rule.ntt == NTT_BYPASS or channel == DRUM_CHANNEL:
+            params.rhythm[channel] = True
+            continue
+
+        params.muted[channel] = not rule.plays_chord(root, target_type)
+
+        chord_root = bass if (rule.bass and bass is not None) else root
+        shift = (chord_root - rule.source_root) % 12
+        if rule.ntr == NTR_ROOT_TRANS:
+            params.mode[channel] = MODE_ROOT_TRANS
+            # High key: le root sopra il limite vengono trasposte in giù
+            if chord_root > rule.high_key:
+                shift -= 12
+        else:
+            # Root fixed (e guitar): le note restano vicine all'originale
+            params.mode[channel] = MODE_ROOT_FIXED
+
+        params.source_root[channel] = rule.source_root
+        params.shift[channel] = shift
+        params.low[channel] = rule.note_low
+        params.high[channel] = rule.note_high
+        table = delta_table(rule.source_chord_type, target_type, rule.ntt)
+        params.delta[channel * 12:channel * 12 + 12] = table
+
+    return params
+
+
+class SectionArrays:
+    """
+    Colonne degli eventi di nota di una sezione compilata, per il calcolo in blocco.
+
+    index[i] è la posizione nella timeline della i-esima nota. Con
+    use_numpy=False (o senza numpy) le colonne sono liste Python.
+    """
+
+    __slots__ = ('index', 'channel', 'note')
+
+    def __init__(self, timeline, use_numpy=True):
+        index = []
+        channel = []
+        note = []
+        for position, (_, event_channel, status, data) in enumerate(timeline):
+            kind = status & 0xF0
+            if kind == NOTE_ON or kind == NOTE_OFF:
+                index.append(position)
+                channel.append(event_channel)
+                note.append(data[0])
+
+        if use_numpy and np is not None:
+            self.index = np.array(index, dtype=np.int64)
+            self.channel = np.array(channel, dtype=np.int64)
+            self.note = np.array(note, dtype=np.int64)
+        else:
+            self.index = index
+            self.channel = channel
+            self.note = note
+
+    def __len__(self):
+        return len(self.index)
+
+
+def _wrap(note, low, high):
+    """Riporta la nota nei limiti [low, high] spostandola di ottave"""
+    if note < low:
+        note += (low - note + 11) // 12 * 12
+    if note > high:
+        note -= (note - high + 11) // 12 * 12
+    return max(0, min(127, note))
+
+
+def chord_mask(chord_filter):
+    """Maschera a 12 bit delle classi di nota del filtro accordo (None = nessun filtro)"""
+    if chord_filter is None:
+        return None
+    mask = 0
+    for pitch_class in chord_filter:
+        mask |= 1 << pitch_class
+    return mask
+
+
+def _transform_python(arrays, params, melodic, mask):
+    notes = []
+    keep = []
+    delta = params.delta
+    for channel, note in zip(arrays.channel, arrays.note):
+        if params.rhythm[channel]:
+            notes.append(note)
+            keep.append(True)
+            continue
+
+        mode = params.mode[channel]
+        rel = (note - params.source_root[channel]) % 12
+        move = delta[channel * 12 + rel]
+        if mode == MODE_ROOT_TRANS:
+            new = note + params.shift[channel] + move
+        else:
+            new = note + (params.shift[channel] + move + 6) % 12 - 6
+        new = _wrap(new, params.low[channel], params.high[channel])
+        notes.append(new)
+        keep.append(melodic and not params.muted[channel]
+                    and (mask is None or bool((mask >> new % 12) & 1)))
+    return notes, keep
+
+
+def _transform_numpy(arrays, params, melodic, mask):
+    """Come _transform_python, ma ritorna array numpy (nota, flag)"""
+    channel = arrays.channel
+    note = arrays.note
+
+    mode = np.asarray(params.mode)[channel]
+    source_root = np.asarray(params.source_root)[channel]
+    shift = np.asarray(params.shift)[channel]
+    low = np.asarray(params.low)[channel]
+    high = np.asarray(params.high)[channel]
+    rhythm = np.asarray(params.rhythm, dtype=bool)[channel]
+
+    rel = (note - source_root) % 12
+    move = np.asarray(params.delta)[channel * 12 + rel]
+
+    transposed = note + shift + move
+    fixed = note + (shift + move + 6) % 12 - 6
+    new = np.where(mode == MODE_ROOT_TRANS, transposed, fixed)
+
+    # Wrapping di ottava nei limiti di nota del canale
+    below = np.maximum(low - new, 0)
+    new = new + (below + 11) // 12 * 12
+    above = np.maximum(new - high, 0)
+    new = np.clip(new - (above + 11) // 12 * 12, 0, 127)
+
+    new = np.where(rhythm, note, new)
+    if melodic:
+        keep = ~np.asarray(params.muted, dtype=bool)[channel]
+        if mask is not None:
+            keep &= ((mask >> (new % 12)) & 1).astype(bool)
+        keep |= rhythm
+    else:
+        keep = rhythm
+    return new, keep
+
+
+def transform_notes(arrays, params, melodic=True, chord_filter=None):
+    """
+    Applica le regole di trasposizione a tutte le note di una sezione.
+
+    Args:
+        arrays: SectionArrays della sezione
+        params: ChannelParams per l'accordo corrente
+        melodic: False = suonano solo i canali ritmici
+        chord_filter: classi di nota (0-11) ammesse sui canali non ritmici (None = tutte)
+
+    Returns:
+        tuple (notes, keep): nuova nota e flag "da suonare" per ogni nota di arrays
+    """
+    mask = chord_mask(chord_filter)
+    if np is not None and isinstance(arrays.note, np.ndarray):
+        if len(arrays.note) == 0:
+            return [], []
+        notes, keep = _transform_numpy(arrays, params, melodic, mask)
+        return notes.tolist(), keep.tolist()
+    return _transform_python(arrays, params, melodic, mask)
+
+
+def select_events(arrays, params, count, melodic=True, chord_filter=None):
+    """
+    Eventi della timeline da inviare per l'accordo: le maschere di note
+    tenute e filtro accordo si applicano in blocco, al chiamante resta
+    solo da raccogliere i messaggi (es. con itertools.compress).
+
+    Args:
+        arrays: SectionArrays della sezione
+        params: ChannelParams per l'accordo corrente
+        count: numero di eventi della timeline
+
+    Returns:
+        tuple (play, pitches): flag "da inviare" per ogni evento della
+        timeline e, per ogni evento tenuto, la nota da suonare (-1 se non
+        è una nota)
+    """
+    mask = chord_mask(chord_filter)
+    if np is not None and isinstance(arrays.note, np.ndarray):
+        pitch = np.full(count, -1, dtype=np.int64)
+        play = np.ones(count, dtype=bool)
+        if len(arrays.note):
+            notes, keep = _transform_numpy(arrays, params, melodic, mask)
+            pitch[arrays.index] = notes
+            play[arrays.index] = keep
+        return play.tolist(), pitch[play].tolist()
+
+    notes, keep = _transform_python(arrays, params, melodic, mask)
+    pitch = [-1] * count
+    play = [True] * count
+    for position, note, kept in zip(arrays.index, notes, keep):
+        pitch[position] = note
+        play[position] = kept
+    return play, list(compress(pitch, play))
@@ -0,0 +1,129 @@
+"""
+NoteRegistry - Registro delle note accese, per spegnere esattamente ciò che suona
+"""
+
+NO_SOURCE = 0xFF  # sources[i] per i messaggi che non sono note
+
+
+class ActiveNotes:
+    """
+    Note accese per canale e nota sorgente (16x128).
+
+    Per ogni nota sorgente (quella scritta nello style, o il tasto premuto)
+    ricorda il pitch effettivamente inviato: il note off si abbina alla
+    sorgente e spegne quel pitch anche se nel frattempo trasposizione o
+    accordo sono cambiati. Stop e cambi sezione spengono solo le note che
+    suonano davvero, senza inondare la porta di All Notes Off.
+
+    Non è thread-safe: va aggiornato da un solo thread alla volta.
+    """
+
+    __slots__ = ('_sent', 'count', 'dropped')
+
+    def __init__(self):
+        # slot = canale * 128 + nota sorgente; 0 = spenta, altrimenti pitch inviato + 1
+        self._sent = bytearray(16 * 128)
+        self.count = 0
+        self.dropped = 0  # note off scartati da track (nota non accesa)
+
+    def note_on(self, channel, source, pitch):
+        """
+        Registra un note on.
+
+        Returns:
+            int: pitch ancora acceso per la stessa sorgente (da spegnere
+            prima) oppure None
+        """
+        slot = (channel << 7) | source
+        previous = self._sent[slot]
+        self._sent[slot] = pitch + 1
+        if not previous:
+            self.count += 1
+            return None
+        return previous - 1 if previous - 1 != pitch else None
+
+    def note_off(self, channel, source):
+        """
+        Registra un note off.
+
+        Returns:
+            int: pitch da spegnere, None se la sorgente non stava suonando
+        """
+        slot = (channel << 7) | source
+        pitch = self._sent[slot]
+        if not pitch:
+            return None
+        self._sent[slot] = 0
+        self.count -= 1
+        return pitch - 1
+
+    def is_sounding(self, channel, source):
+        return self._sent[(channel << 7) | source] != 0
+
+    def track(self, messages, sources, start, end):
+        """
+        Aggiorna il registro con messages[start:end] (bytes già codificati).
+
+        I note off vengono riscritti sul pitch acceso dalla stessa sorgente,
+        oppure scartati se quella nota non sta suonando.
+
+        Args:
+            messages: lista di bytes
+            sources: nota sorgente di ogni messaggio (NO_SOURCE se non è una nota)
+
+        Returns:
+            list: messaggi da inviare
+        """
+        sent = self._sent
+        out = []
+        for i in range(start, end):
+            data = messages[i]
+            source = sources[i]
+            if source == NO_SOURCE:
+                out.append(data)
+                continue
+            status = data[0]
+            slot = ((status & 0x0F) << 7) | source
+            if status & 0xF0 == 0x90 and data[2] > 0:
+                previous = sent[slot]
+                if not previous:
+                    self.count += 1
+                elif previous - 1 != data[1]:
+                    out.append(bytes((0x80 | (status & 0x0F), previous - 1, 0)))
+                sent[slot] = data[1] + 1
+                out.append(data)
+            else:
+                pitch = sent[slot]
+                if not pitch:
+                    self.dropped += 1
+                    continue
+                sent[slot] = 0
+                self.count -= 1
+                out.append(data if data[1] == pitch - 1 else bytes((status, pitch - 1, data[2])))
+        return out
+
+    def release(self, channels=None):
+        """
+        Spegne le note accese (di tutti i canali o di quelli indicati).
+
+        Returns:
+            list: note off (bytes) delle note che stavano suonando
+        """
+        if not self.count:
+            return []
+        sent = self._sent
+        note_offs = []
+        for channel in (range(16) if channels is None else channels):
+            base = channel << 7
+            if not any(sent[base:base + 128]):
+                continue
+            for slot in range(base, base + 128):
+                pitch = sent[slot]
+                if pitch:
+                    note_offs.append(bytes((0x80 | channel, pitch - 1, 0)))
+                    sent[slot] = 0
+                    self.count -= 1
+        return note_offs
+
+    def __len__(self):
+        return self.count
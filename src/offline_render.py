@@ -0,0 +1,145 @@
+"""
+OfflineRender - Render di sezioni e arrangiamenti su file MIDI, più veloce del tempo reale
+"""
+
+import mido
+
+from channel_state import ChannelState
+from clocks import VirtualClock
+from midi_output import RecordingPort
+from note_registry import ActiveNotes
+from tempo_map import TempoMap
+from timing_stats import TimingStats
+
+
+# Attributi di StylePlayer modificati dal render e ripristinati alla fine
+_PLAYER_STATE = ('scheduler', 'midi_output', 'current_section', 'chord_root', 'chord_type',
+                 'chord_bass', 'transpose_semitones', 'block_melodic_notes',
+                 'next_section_after_stop', 'prefetch_variants', 'synth_state', 'timing',
+                 'active_notes')
+
+
+def to_midi_file(events, origin, tempo_map, ticks_per_beat, time_signature=(4, 4)):
+    """
+    Converte gli eventi registrati in un mido.MidiFile di tipo 0.
+
+    Args:
+        events: lista di (istante, bytes)
+        origin: istante del tick 0
+        tempo_map: TempoMap usata dal render (dà tick e meta set_tempo)
+    """
+    timed = []
+    numerator, denominator = time_signature
+    timed.append((0, 0, mido.MetaMessage('time_signature', numerator=numerator,
+                                         denominator=denominator)))
+    for tick, _, bpm_end, _ in tempo_map.segments():
+        # Il render non produce rampe: ogni segmento ha un tempo costante
+        tempo = mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm_end))
+        timed.append((tick, len(timed), tempo))
+    for when, data in events:
+        tick = max(0, int(round(tempo_map.tick_at(when - origin))))
+        timed.append((tick, len(timed), data))
+    timed.sort(key=lambda item: item[:2])
+
+    # I pattern si ripetono: i messaggi (immutabili) uguali con lo stesso
+    # delta sono costruiti una volta sola
+    shared = {}
+    track = mido.MidiTrack()
+    last_tick = 0
+    for tick, _, data in timed:
+        delta = tick - last_tick
+        last_tick = tick
+        if not isinstance(data, bytes):
+            track.append(data.copy(time=delta))
+            continue
+        msg = shared.get((data, delta))
+        if msg is None:
+            msg = mido.Message.from_bytes(data, time=delta)
+            shared[(data, delta)] = msg
+        track.append(msg)
+    track.append(mido.MetaMessage('end_of_track', time=0))
+
+    midi_file = mido.MidiFile(type=0, ticks_per_beat=ticks_per_beat)
+    midi_file.tracks.append(track)
+    return midi_file
+
+
+def render_arrangement(player, changes, bars=None, tempo=None):
+    """
+    Esegue il loop di playback di player su un orologio virtuale.
+
+    Args:
+        player: StylePlayer con uno style caricato (non in playback)
+        changes: sequenza di (battuta, sezione, accordo) con battuta da 1;
+            sezione None = invariata, accordo (root, tipo) oppure None
+        bars: battute totali da renderizzare (None = fino alla fine
+            dell'Ending o di un giro dell'ultima sezione)
+        tempo: bpm (None = tempo corrente del player)
+
+    Returns:
+        mido.MidiFile
+    """
+    changes = sorted(changes, key=lambda change: change[0])
+    if not changes or changes[0][1] is None:
+        raise ValueError("La prima voce dell'arrangiamento deve indicare una sezione")
+    for _, section_name, _ in changes:
+        if section_name is not None and section_name not in player.sections:
+            raise ValueError(f"Sezione '{section_name}' non trovata")
+
+    ticks_per_measure = player.time_signature_numerator * player.ticks_per_beat
+    clock = VirtualClock()
+    output = RecordingPort(clock)
+    tempo_map = TempoMap(player.ticks_per_beat, tempo or player.tempo_bpm)
+    scheduler = clock.make_scheduler()
+    clock.time_of = lambda tick: scheduler.origin + tempo_map.time_at(tick)
+
+    saved = {name: getattr(player, name) for name in _PLAYER_STATE}
+    try:
+        player.scheduler = scheduler
+        player.midi_output = output
+        # Il file parte vuoto: il setup va scritto per intero
+        player.synth_state = ChannelState()
+        # Note e statistiche del render non si mescolano a quelle del playback dal vivo
+        player.active_notes = ActiveNotes()
+        player.timing = TimingStats()
+        # Le varianti servono solo quando il loop ci arriva: niente prefetch
+        player.prefetch_variants = False
+
+        first_bar, first_section, first_chord = changes[0]
+        player.current_section = first_section
+        if first_chord is not None:
+            player.set_chord(*first_chord)
+
+        def apply(section_name, chord):
+            if section_name is not None:
+                player.change_section(section_name, quantize='bar')
+            if chord is not None:
+                player.set_chord(*chord)
+
+        for bar, section_name, chord in changes[1:]:
+            tick = (bar - first_bar) * ticks_per_measure
+            clock.schedule(tick, lambda s=section_name, c=chord: apply(s, c))
+
+        last_bar, last_section = first_bar, first_section
+        for bar, section_name, _ in changes:
+            if section_name is not None:
+                last_bar, last_section = bar, section_name
+        if bars is None and not last_section.startswith('Ending'):
+            length_ticks = player.sections[last_section]['length_ticks']
+            section_bars = max(1, length_ticks // ticks_per_measure)
+            bars = last_bar - first_bar + section_bars
+        if bars is not None:
+            clock.schedule(bars * ticks_per_measure, lambda: setattr(player, 'playing', False))
+
+        player.playing = True
+        player._next_section = None
+        player._playback_loop(first_section, True, tempo_map)
+    finally:
+        player.playing = False
+        for name, value in saved.items():
+            setattr(player, name, value)
+        player._stream = None
+
+    time_signature = (player.time_signature_numerator, player.time_signature_denominator)
+    return to_midi_file(output.events, scheduler.origin, tempo_map, player.ticks_per_beat,
+                        time_signature)
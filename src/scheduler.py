@@ -0,0 +1,99 @@
+"""
+Scheduler - Attesa a scadenze assolute per il playback senza deriva
+"""
+
+import time
+
+
+DEFAULT_SPIN_THRESHOLD = 0.0015   # ultimi 1.5 ms in attesa attiva
+DEFAULT_RESYNC_THRESHOLD = 0.25   # oltre 250 ms si riallinea l'origine
+MAX_SLEEP_SLICE = 0.005           # sleep massimo fra due controlli (stop, cambi di tempo)
+
+
+class DeadlineScheduler:
+    """
+    Calcola le scadenze degli eventi a partire da un'origine fissa
+    (time.perf_counter) invece di accumulare sleep relativi: l'errore di
+    ogni sleep non si somma ai successivi.
+
+    L'attesa è ibrida: sleep fino a poco prima della scadenza, poi attesa
+    attiva per gli ultimi istanti. I ritardi d'invio li misura TimingStats;
+    qui si contano solo i riallineamenti dell'origine.
+    """
+
+    def __init__(self, spin_threshold=DEFAULT_SPIN_THRESHOLD,
+                 resync_threshold=DEFAULT_RESYNC_THRESHOLD,
+                 clock=time.perf_counter, sleep=time.sleep,
+                 max_sleep_slice=MAX_SLEEP_SLICE):
+        self.spin_threshold = spin_threshold
+        self.resync_threshold = resync_threshold
+        self.max_sleep_slice = max_sleep_slice
+        self.clock = clock
+        self.sleep = sleep
+        self.origin = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Azzera il conteggio dei riallineamenti"""
+        self.resyncs = 0
+
+    def start(self, origin=None):
+        """Fissa l'origine (istante del tick 0) all'ora attuale o a origin"""
+        self.origin = self.clock() if origin is None else origin
+        return self.origin
+
+    def advance(self, seconds):
+        """Sposta l'origine in avanti (es. all'inizio del giro successivo della sezione)"""
+        self.origin += seconds
+
+    def deadline(self, offset):
+        """Istante assoluto di un evento a offset secondi dall'origine"""
+        return self.origin + offset
+
+    def wait(self, deadline, is_running=None):
+        """
+        Attende fino all'istante assoluto deadline.
+
+        Args:
+            deadline: istante in secondi sul clock dello scheduler, oppure una
+                funzione che lo calcola (rivalutata durante l'attesa, così un
+                cambio di tempo sposta la scadenza già attesa)
+            is_running: funzione opzionale; se ritorna False l'attesa si interrompe
+
+        Returns:
+            bool: False se l'attesa è stata interrotta
+        """
+        clock = self.clock
+        sleep = self.sleep
+        spin_threshold = self.spin_threshold
+        max_sleep_slice = self.max_sleep_slice
+        get_deadline = deadline if callable(deadline) else None
+
+        while True:
+            if get_deadline is not None:
+                deadline = get_deadline()
+            remaining = deadline - clock()
+            if remaining <= spin_threshold:
+                break
+            if is_running is not None and not is_running():
+                return False
+            sleep(min(remaining - spin_threshold, max_sleep_slice))
+
+        # Attesa attiva (cedendo il GIL) fino alla scadenza
+        while clock() < deadline:
+            sleep(0)
+
+        # Stop o richiesta arrivati proprio allo scadere: non inviare
+        if is_running is not None and not is_running():
+            return False
+
+        # Molto in ritardo (sistema sospeso, debugger...): riallinea invece di recuperare
+        late = clock() - deadline
+        if late > self.resync_threshold:
+            self.origin += late
+            self.resyncs += 1
+        return True
+
+    def get_stats(self):
+        """Ritorna i riallineamenti dell'origine (i ritardi sono in TimingStats)"""
+        return {'resyncs': self.resyncs}
@@ -0,0 +1,246 @@
+"""
+SmfReader - Lettore nativo della parte MThd/MTrk di file .STY/.MID
+"""
+
+import struct
+from array import array
+
+
+# Status speciali
+SYSEX = 0xF0
+SYSEX_ESCAPE = 0xF7
+META = 0xFF
+
+# Tipi di meta-evento usati dal loader
+META_TRACK_NAME = 0x03
+META_MARKER = 0x06
+META_END_OF_TRACK = 0x2F
+META_SET_TEMPO = 0x51
+META_TIME_SIGNATURE = 0x58
+
+_CHUNK_HEADER = struct.Struct('>4sI')
+_FILE_HEADER = struct.Struct('>hhh')
+
+
+class SmfFormatError(Exception):
+    """Il file contiene qualcosa che il lettore nativo non sa decodificare"""
+
+
+class SmfTrack:
+    """
+    Traccia decodificata in colonne parallele compatte.
+
+    Per ogni evento i:
+        ticks[i]      - tick assoluto dall'inizio della traccia
+        statuses[i]   - status byte (0x80-0xEF canale, 0xF0 sysex, 0xFF meta)
+        meta_types[i] - tipo di meta-evento (0 per gli altri eventi)
+        offsets[i]    - posizione dei dati nel buffer del file
+        lengths[i]    - numero di byte dati
+
+    I dati non vengono copiati: restano nel buffer originale.
+    """
+
+    __slots__ = ('buffer', 'ticks', 'statuses', 'meta_types', 'offsets', 'lengths', 'end_tick')
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.ticks = array('I')
+        self.statuses = bytearray()
+        self.meta_types = bytearray()
+        self.offsets = array('I')
+        self.lengths = array('I')
+        self.end_tick = 0
+
+    def __len__(self):
+        return len(self.statuses)
+
+    def data(self, index):
+        """Ritorna i byte dati dell'evento index"""
+        offset = self.offsets[index]
+        return bytes(self.buffer[offset:offset + self.lengths[index]])
+
+    def events(self):
+        """
+        Itera gli eventi nel formato normalizzato usato dal compilatore.
+
+        Yields:
+            tuple (tick, status, meta_type, data)
+        """
+        buffer = self.buffer
+        for tick, status, meta_type, offset, length in zip(
+                self.ticks, self.statuses, self.meta_types, self.offsets, self.lengths):
+            yield (tick, status, meta_type, bytes(buffer[offset:offset + length]))
+
+
+class SmfFile:
+    """File SMF decodificato: header, tracce e chunk successivi ai dati MIDI"""
+
+    def __init__(self, format, ticks_per_beat, tracks, trailing_chunks, buffer):
+        self.format = format
+        self.ticks_per_beat = ticks_per_beat
+        self.tracks = tracks
+        # Chunk dopo le tracce MIDI (CASM, OTSc, MDB, ...): lista (id, offset, size)
+        self.trailing_chunks = trailing_chunks
+        self.buffer = buffer
+
+    def chunk(self, chunk_id):
+        """Ritorna una memoryview sul primo chunk con l'id richiesto, o None"""
+        for cid, offset, size in self.trailing_chunks:
+            if cid == chunk_id:
+                return self.buffer[offset:offset + size]
+        return None
+
+
+def _read_track(buf, start, end, track):
+    """Decodifica gli eventi di un chunk MTrk in track"""
+    ticks = track.ticks
+    statuses = track.statuses
+    meta_types = track.meta_types
+    offsets = track.offsets
+    lengths = track.lengths
+
+    pos = start
+    tick = 0
+    running = 0
+
+    while pos < end:
+        # Delta time (variable length)
+        byte = buf[pos]
+        pos += 1
+        delta = byte & 0x7F
+        while byte & 0x80:
+            byte = buf[pos]
+            pos += 1
+            delta = (delta << 7) | (byte & 0x7F)
+        tick += delta
+
+        status = buf[pos]
+        if status < 0x80:
+            # Running status: il byte letto è già il primo dato
+            if not running:
+                raise SmfFormatError(f"Running status senza status precedente @ {pos}")
+            status = running
+        else:
+            pos += 1
+
+        if status < 0xF0:
+            running = status
+            size = 1 if 0xC0 <= status < 0xE0 else 2
+            if buf[pos] > 0x7F or (size == 2 and buf[pos + 1] > 0x7F):
+                raise SmfFormatError(f"Byte dati non valido @ {pos}")
+            ticks.append(tick)
+            statuses.append(status)
+            meta_types.append(0)
+            offsets.append(pos)
+            lengths.append(size)
+            pos += size
+            continue
+
+        # Meta-eventi e sysex interrompono il running status
+        running = 0
+
+        if status == META:
+            meta_type = buf[pos]
+            pos += 1
+        elif status == SYSEX or status == SYSEX_ESCAPE:
+            meta_type = 0
+        else:
+            raise SmfFormatError(f"Status 0x{status:02X} non supportato @ {pos}")
+
+        byte = buf[pos]
+        pos += 1
+        length = byte & 0x7F
+        while byte & 0x80:
+            byte = buf[pos]
+            pos += 1
+            length = (length << 7) | (byte & 0x7F)
+
+        data_start = pos
+        pos += length
+        if pos > end:
+            raise SmfFormatError("Evento oltre la fine della traccia")
+
+        if status != META:
+            # Come mido: il sysex è memorizzato senza F0 iniziale e F7 finale
+            status = SYSEX
+            if length and buf[data_start] == SYSEX:
+                data_start += 1
+                length -= 1
+            if length and buf[data_start + length - 1] == SYSEX_ESCAPE:
+                length -= 1
+
+        ticks.append(tick)
+        statuses.append(status)
+        meta_types.append(meta_type)
+        offsets.append(data_start)
+        lengths.append(length)
+
+    if pos != end:
+        raise SmfFormatError("Traccia non allineata alla dimensione del chunk")
+    track.end_tick = tick
+
+
+def parse_track(buffer):
+    """
+    Decodifica il corpo di un singolo chunk MTrk (es. quelli contenuti in OTSc).
+
+    Raises:
+        SmfFormatError: se la traccia contiene strutture non gestite
+    """
+    buf = memoryview(buffer)
+    track = SmfTrack(buf)
+    try:
+        _read_track(buf, 0, len(buf), track)
+    except IndexError as e:
+        raise SmfFormatError(f"Traccia troncata: {e}") from e
+    return track
+
+
+def parse_smf(buffer):
+    """
+    Decodifica un file SMF (o la parte MIDI di un .STY) da un buffer.
+
+    Args:
+        buffer: bytes, bytearray, mmap o memoryview con il contenuto del file
+
+    Returns:
+        SmfFile
+
+    Raises:
+        SmfFormatError: se il file contiene strutture non gestite
+            (il chiamante può ripiegare su mido)
+    """
+    buf = memoryview(buffer)
+    try:
+        chunk_id, size = _CHUNK_HEADER.unpack_from(buf, 0)
+        if chunk_id != b'MThd' or size < 6:
+            raise SmfFormatError("MThd non trovato")
+        format, num_tracks, division = _FILE_HEADER.unpack_from(buf, 8)
+        if division < 0:
+            raise SmfFormatError("Division SMPTE non supportata")
+
+        pos = 8 + size
+        tracks = []
+        trailing_chunks = []
+        while pos + 8 <= len(buf):
+            chunk_id, size = _CHUNK_HEADER.unpack_from(buf, pos)
+            start = pos + 8
+            end = start + size
+            if end > len(buf):
+                raise SmfFormatError(f"Chunk {chunk_id!r} troncato")
+
+            if chunk_id == b'MTrk' and len(tracks) < num_tracks:
+                track = SmfTrack(buf)
+                _read_track(buf, start, end, track)
+                tracks.append(track)
+            else:
+                trailing_chunks.append((bytes(chunk_id), start, size))
+            pos = end
+
+        if len(tracks) != num_tracks:
+            raise SmfFormatError("Numero di tracce diverso dall'header")
+
+    except (IndexError, struct.error) as e:
+        raise SmfFormatError(f"File troncato: {e}") from e
+
+    return SmfFile(format, division, tracks, trailing_chunks, buf)
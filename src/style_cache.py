@@ -0,0 +1,317 @@
+"""
+StyleCache - Cache persistente su disco degli style compilati
+"""
+
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from style_timeline import CompiledStyle, EventStore, event_to_message, message_to_event
+
+
+# Formato file cache (.stc):
+#   header:  magic 'MASC', versione, byteorder, tempo, ticks/beat, time signature
+#   stringa: nome style (lunghezza + utf-8)
+#   setup:   blocco eventi
+#   casm:    corpo grezzo del chunk CASM (lunghezza + byte)
+#   sezioni: numero sezioni, poi per ciascuna nome, lunghezza, start, cambi di
+#            tempo (numero + coppie tick/microsecondi per beat), blocco eventi
+# Un blocco eventi contiene le colonne di un EventStore: tick (uint32),
+# status (uint8), offset dei dati (uint32, uno in più degli eventi) e tutti i
+# byte dati concatenati.
+CACHE_MAGIC = b'MASC'
+CACHE_VERSION = 4
+CACHE_EXTENSION = '.stc'
+
+_HEADER = struct.Struct('<4sHBdIBB')
+_COUNT = struct.Struct('<I')
+_SECTION = struct.Struct('<II')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'midi-arranger', 'styles')
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def _pack_string(text):
+    data = (text or '').encode('utf-8')
+    return _COUNT.pack(len(data)) + data
+
+
+def _pack_events(events):
+    """Serializza eventi compilati (EventStore o lista di tuple) nelle colonne dell'EventStore"""
+    store = EventStore.from_events(events)
+    return b''.join((
+        _COUNT.pack(len(store)),
+        store.ticks.tobytes(),
+        store.statuses,
+        store.offsets.tobytes(),
+        _COUNT.pack(len(store.payload)),
+        store.payload
+    ))
+
+
+class _Reader:
+    """Lettore sequenziale di un buffer di cache"""
+
+    def __init__(self, data, swap):
+        self.view = memoryview(data)
+        self.pos = 0
+        self.swap = swap
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.view, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def take(self, size):
+        chunk = self.view[self.pos:self.pos + size]
+        if len(chunk) != size:
+            raise ValueError("File cache troncato")
+        self.pos += size
+        return chunk
+
+    def string(self):
+        (size,) = self.unpack(_COUNT)
+        return bytes(self.take(size)).decode('utf-8')
+
+    def column(self, typecode, count):
+        values = array(typecode)
+        values.frombytes(self.take(count * values.itemsize))
+        if self.swap:
+            values.byteswap()
+        return values
+
+    def events(self):
+        (count,) = self.unpack(_COUNT)
+        ticks = self.column('I', count)
+        statuses = bytes(self.take(count))
+        offsets = self.column('I', count + 1)
+        (payload_size,) = self.unpack(_COUNT)
+        payload = bytes(self.take(payload_size))
+        if offsets[-1] != payload_size:
+            raise ValueError("Blocco eventi non valido")
+        return EventStore(ticks, statuses, offsets, payload)
+
+
+def serialize_style(compiled):
+    """Serializza uno CompiledStyle nel formato binario della cache"""
+    setup = []
+    for msg in compiled.setup_events:
+        event = message_to_event(msg, 0)
+        if event is not None:
+            setup.append(event)
+
+    parts = [
+        _HEADER.pack(
+            CACHE_MAGIC, CACHE_VERSION, 0 if sys.byteorder == 'little' else 1,
+            float(compiled.tempo_bpm), compiled.ticks_per_beat,
+            compiled.time_signature_numerator, compiled.time_signature_denominator
+        ),
+        _pack_string(compiled.style_name),
+        _pack_events(setup),
+        _COUNT.pack(len(compiled.casm_data)),
+        bytes(compiled.casm_data),
+        _COUNT.pack(len(compiled.sections)),
+    ]
+    for name, section in compiled.sections.items():
+        parts.append(_pack_string(name))
+        parts.append(_SECTION.pack(section['length_ticks'], section['start_time']))
+        tempo_changes = section.get('tempo_changes', [])
+        parts.append(_COUNT.pack(len(tempo_changes)))
+        parts.extend(_SECTION.pack(tick, tempo) for tick, tempo in tempo_changes)
+        parts.append(_pack_events(section['timeline']))
+    return b''.join(parts)
+
+
+def deserialize_style(data):
+    """
+    Ricostruisce uno CompiledStyle dal formato binario della cache.
+
+    Raises:
+        ValueError: se il buffer non è un file cache valido o di un'altra versione
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("File cache troncato")
+    magic, version, byteorder, tempo_bpm, ticks_per_beat, numerator, denominator = \
+        _HEADER.unpack_from(data, 0)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        raise ValueError("Formato cache non riconosciuto")
+
+    swap = byteorder != (0 if sys.byteorder == 'little' else 1)
+    reader = _Reader(data, swap)
+    reader.pos = _HEADER.size
+
+    style_name = reader.string() or None
+    setup_events = [event_to_message(status, payload) for _, _, status, payload in reader.events()]
+    (casm_size,) = reader.unpack(_COUNT)
+    casm_data = bytes(reader.take(casm_size))
+
+    sections = {}
+    (section_count,) = reader.unpack(_COUNT)
+    for _ in range(section_count):
+        name = reader.string()
+        length_ticks, start_time = reader.unpack(_SECTION)
+        (tempo_count,) = reader.unpack(_COUNT)
+        tempo_changes = [reader.unpack(_SECTION) for _ in range(tempo_count)]
+        sections[name] = {
+            'timeline': reader.events(),
+            'length_ticks': length_ticks,
+            'start_time': start_time,
+            'tempo_changes': tempo_changes
+        }
+
+    return CompiledStyle(
+        style_name=style_name,
+        tempo_bpm=tempo_bpm,
+        ticks_per_beat=ticks_per_beat,
+        time_signature_numerator=numerator,
+        time_signature_denominator=denominator,
+        sections=sections,
+        setup_events=setup_events,
+        casm_data=casm_data
+    )
+
+
+class StyleCache:
+    """
+    Cache su disco degli style già compilati.
+
+    Ogni voce è identificata dall'hash del contenuto del file .STY e dalla
+    sua data di modifica. Quando la dimensione totale supera max_bytes
+    vengono eliminate le voci usate meno di recente (LRU).
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+
+        # Contatori
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def make_key(self, data, mtime_ns):
+        """Calcola la chiave di cache da contenuto e data di modifica del file"""
+        digest = hashlib.sha1(data)
+        digest.update(struct.pack('<q', mtime_ns))
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXTENSION)
+
+    def get(self, key):
+        """
+        Cerca uno style compilato nella cache.
+
+        Returns:
+            CompiledStyle oppure None se non presente (o non leggibile)
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            compiled = deserialize_style(data)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Cache style non valida ({path}): {e}")
+            self.errors += 1
+            self.misses += 1
+            self._remove(path)
+            return None
+
+        # Aggiorna la data di accesso per l'ordinamento LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return compiled
+
+    def put(self, key, compiled):
+        """Salva uno style compilato nella cache ed elimina le voci in eccesso"""
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._entry_path(key)
+            # File temporaneo univoco: due scritture della stessa voce (preload
+            # in background e load_style) non si troncano a vicenda
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(serialize_style(compiled))
+            os.replace(tmp_path, path)
+            self.writes += 1
+        except OSError as e:
+            print(f"Errore scrittura cache style: {e}")
+            self.errors += 1
+            if tmp_path is not None:
+                self._remove(tmp_path)
+            return False
+
+        self._evict()
+        return True
+
+    def _entries(self):
+        """Ritorna lista (mtime, size, path) delle voci in cache"""
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(CACHE_EXTENSION):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        """Elimina le voci meno usate finché la cache non rientra in max_bytes"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                self.evictions += 1
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self):
+        """Svuota completamente la cache"""
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    def get_stats(self):
+        """Ritorna i contatori della cache e l'occupazione su disco"""
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'errors': self.errors,
+            'entries': len(entries),
+            'size_bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes
+        }
@@ -0,0 +1,293 @@
+"""
+StyleCasm - Decodifica dei chunk CASM/OTSc/MDB che seguono i dati MIDI di un file .STY
+"""
+
+import struct
+
+from smf_reader import parse_track
+
+
+# Note Transposition Rule (NTR)
+NTR_ROOT_TRANS = 0
+NTR_ROOT_FIXED = 1
+NTR_GUITAR = 2
+
+# Note Transposition Table (NTT), normalizzata fra SFF1 e SFF2
+NTT_BYPASS = 0
+NTT_MELODY = 1
+NTT_CHORD = 2
+NTT_MELODIC_MINOR = 3
+NTT_HARMONIC_MINOR = 4
+NTT_NATURAL_MINOR = 5
+NTT_DORIAN = 6
+
+NTR_NAMES = ['Root Trans', 'Root Fixed', 'Guitar']
+NTT_NAMES = ['Bypass', 'Melody', 'Chord', 'Melodic Minor', 'Harmonic Minor',
+             'Natural Minor', 'Dorian']
+
+# SFF1: 0 Bypass, 1 Melody, 2 Chord, 3 Bass, 4 Melodic Minor, 5 Harmonic Minor
+_SFF1_NTT = {
+    0: (NTT_BYPASS, False),
+    1: (NTT_MELODY, False),
+    2: (NTT_CHORD, False),
+    3: (NTT_MELODY, True),
+    4: (NTT_MELODIC_MINOR, False),
+    5: (NTT_HARMONIC_MINOR, False),
+}
+
+# SFF2: le varianti "5th" sono ricondotte alla tabella base, bit 7 = bass on
+_SFF2_NTT = {
+    0: NTT_BYPASS, 1: NTT_MELODY, 2: NTT_CHORD,
+    3: NTT_MELODIC_MINOR, 4: NTT_MELODIC_MINOR,
+    5: NTT_HARMONIC_MINOR, 6: NTT_HARMONIC_MINOR,
+    7: NTT_NATURAL_MINOR, 8: NTT_NATURAL_MINOR,
+    9: NTT_DORIAN, 10: NTT_DORIAN,
+}
+
+# Tipi di accordo Yamaha (indice = bit nella chord mute mask / source chord type)
+YAMAHA_CHORD_TYPES = [
+    'Maj', 'Maj6', 'Maj7', 'Maj7(#11)', 'Maj(9)', 'Maj7(9)', 'Maj6(9)', 'aug',
+    'min', 'min6', 'min7', 'min7b5', 'min(9)', 'min7(9)', 'min7(11)', 'minMaj7',
+    'minMaj7(9)', 'dim', 'dim7', '7', '7sus4', '7b5', '7(9)', '7(#11)',
+    '7(13)', '7(b9)', '7(b13)', '7(#9)', 'Maj7aug', '7aug', '1+8', '1+5',
+    'sus4', '1+2+5', 'cancel'
+]
+
+# Tipi di ChordRecognizer -> tipo di accordo Yamaha
+RECOGNIZER_TO_YAMAHA = {
+    'Maj': 0, '6': 1, 'Maj7': 2, 'aug': 7, 'min': 8, 'min6': 9, 'min7': 10,
+    'm7b5': 11, 'dim': 17, 'dim7': 18, '7': 19, 'sus4': 32, 'sus2': 33,
+    'single': 30,
+    'Maj7#11': 3, 'add9': 4, 'Maj9': 5, '6/9': 6, 'madd9': 12, 'min9': 13,
+    'min11': 14, 'minMaj7': 15, 'minMaj9': 16, '7sus4': 20, '7b5': 21, '9': 22,
+    '7#11': 23, '13': 24, '7b9': 25, '7b13': 26, '7#9': 27, 'Maj7#5': 28,
+    '7#5': 29, '5': 31,
+    # Senza equivalente Yamaha: l'undicesima si suona come 7sus4
+    '11': 20,
+}
+
+_CHUNK_HEADER = struct.Struct('>4sI')
+_CTAB_HEAD = struct.Struct('>B8sBBH5sBB')
+_CTAB_RULE = struct.Struct('>6B')
+
+CTAB_SIZE = 27
+CTAB_SPECIAL_SIZE = 4
+CTB2_SIZE = 47
+
+
+class ChannelRule:
+    """Regole di trasposizione CASM di un canale sorgente in una sezione"""
+
+    __slots__ = ('source_channel', 'name', 'dest_channel', 'editable', 'note_mute',
+                 'chord_mute', 'source_root', 'source_chord_type', 'ntr', 'ntt', 'bass',
+                 'high_key', 'note_low', 'note_high', 'rtr')
+
+    def __init__(self, source_channel, name='', dest_channel=None, editable=True,
+                 note_mute=0x0FFF, chord_mute=(1 << 35) - 1, source_root=0,
+                 source_chord_type=2, ntr=NTR_ROOT_TRANS, ntt=NTT_CHORD, bass=False,
+                 high_key=6, note_low=0, note_high=127, rtr=1):
+        self.source_channel = source_channel
+        self.name = name
+        self.dest_channel = source_channel if dest_channel is None else dest_channel
+        self.editable = editable
+        # Bit i = la root i (0=C) suona; bit i della chord mute = il tipo Yamaha i suona
+        self.note_mute = note_mute
+        self.chord_mute = chord_mute
+        self.source_root = source_root
+        self.source_chord_type = source_chord_type
+        self.ntr = ntr
+        self.ntt = ntt
+        self.bass = bass
+        self.high_key = high_key
+        self.note_low = note_low
+        self.note_high = note_high
+        self.rtr = rtr
+
+    def plays_chord(self, root, yamaha_chord_type):
+        """Verifica se il canale suona per la root e il tipo di accordo dati"""
+        if not (self.note_mute >> root) & 1:
+            return False
+        return bool((self.chord_mute >> yamaha_chord_type) & 1)
+
+    def as_dict(self):
+        """Rappresentazione leggibile (per debug e analisi)"""
+        return {
+            'source_channel': self.source_channel,
+            'name': self.name,
+            'dest_channel': self.dest_channel,
+            'source_chord': f"{self.source_root}:{YAMAHA_CHORD_TYPES[self.source_chord_type]}"
+            if self.source_chord_type < len(YAMAHA_CHORD_TYPES) else str(self.source_chord_type),
+            'ntr': NTR_NAMES[self.ntr] if self.ntr < len(NTR_NAMES) else self.ntr,
+            'ntt': NTT_NAMES[self.ntt],
+            'bass': self.bass,
+            'high_key': self.high_key,
+            'note_range': (self.note_low, self.note_high),
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, ChannelRule):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"ChannelRule({self.as_dict()})"
+
+
+def iter_chunks(view):
+    """Itera i sotto-chunk (id, memoryview) di un buffer senza copiarlo"""
+    pos = 0
+    size_total = len(view)
+    while pos + 8 <= size_total:
+        chunk_id, size = _CHUNK_HEADER.unpack_from(view, pos)
+        start = pos + 8
+        yield bytes(chunk_id), view[start:start + size]
+        pos = start + size
+
+
+def find_chunk(data, chunk_id):
+    """
+    Cerca un chunk di primo livello (MThd, MTrk, CASM, OTSc, ...) nel file.
+
+    Returns:
+        memoryview sul corpo del chunk, oppure None se non presente
+    """
+    for cid, body in iter_chunks(memoryview(data)):
+        if cid == chunk_id:
+            return body
+    return None
+
+
+def _decode_name(raw):
+    return bytes(raw).decode('latin1').rstrip(' \x00')
+
+
+def _parse_ctab(view):
+    """Decodifica un chunk Ctab (SFF1)"""
+    (source_channel, name, dest_channel, editable, note_mute, chord_mute,
+     source_root, source_chord_type) = _CTAB_HEAD.unpack_from(view, 0)
+    ntr, ntt_raw, high_key, note_low, note_high, rtr = _CTAB_RULE.unpack_from(view, _CTAB_HEAD.size)
+    ntt, bass = _SFF1_NTT.get(ntt_raw, (NTT_MELODY, False))
+
+    return ChannelRule(
+        source_channel=source_channel,
+        name=_decode_name(name),
+        dest_channel=dest_channel,
+        editable=bool(editable),
+        note_mute=note_mute,
+        chord_mute=int.from_bytes(chord_mute, 'big'),
+        source_root=source_root,
+        source_chord_type=source_chord_type,
+        ntr=ntr,
+        ntt=ntt,
+        bass=bass,
+        high_key=high_key,
+        note_low=note_low,
+        note_high=note_high,
+        rtr=rtr
+    )
+
+
+def _parse_ctb2(view):
+    """
+    Decodifica un chunk Ctb2 (SFF2).
+
+    Un Ctb2 ha tre set di regole (low/middle/high) separati da due limiti
+    di nota: qui si usa il set "middle", che copre l'estensione normale.
+    """
+    (source_channel, name, dest_channel, editable, note_mute, chord_mute,
+     source_root, source_chord_type) = _CTAB_HEAD.unpack_from(view, 0)
+    middle = _CTAB_HEAD.size + 2 + _CTAB_RULE.size
+    ntr, ntt_raw, high_key, note_low, note_high, rtr = _CTAB_RULE.unpack_from(view, middle)
+
+    return ChannelRule(
+        source_channel=source_channel,
+        name=_decode_name(name),
+        dest_channel=dest_channel,
+        editable=bool(editable),
+        note_mute=note_mute,
+        chord_mute=int.from_bytes(chord_mute, 'big'),
+        source_root=source_root,
+        source_chord_type=source_chord_type,
+        ntr=ntr,
+        ntt=_SFF2_NTT.get(ntt_raw & 0x7F, NTT_MELODY),
+        bass=bool(ntt_raw & 0x80),
+        high_key=high_key,
+        note_low=note_low,
+        note_high=note_high,
+        rtr=rtr
+    )
+
+
+def parse_casm(view):
+    """
+    Decodifica il contenuto di un chunk CASM.
+
+    Args:
+        view: memoryview/bytes con il corpo del chunk CASM (senza header)
+
+    Returns:
+        dict: nome sezione -> dict canale sorgente -> ChannelRule
+    """
+    view = memoryview(view)
+    casm = {}
+
+    for chunk_id, cseg in iter_chunks(view):
+        if chunk_id != b'CSEG':
+            continue
+
+        section_names = []
+        rules = {}
+        for sub_id, body in iter_chunks(cseg):
+            if sub_id == b'Sdec':
+                section_names = [name for name in bytes(body).decode('latin1').split(',') if name]
+            elif sub_id == b'Ctab' and len(body) >= CTAB_SIZE:
+                rule = _parse_ctab(body)
+                rules[rule.source_channel] = rule
+            elif sub_id == b'Ctb2' and len(body) >= CTB2_SIZE:
+                rule = _parse_ctb2(body)
+                rules[rule.source_channel] = rule
+            elif sub_id == b'Cntt' and len(body) >= 2:
+                # Estensione NTT di SFF1: canale sorgente + NTT con flag bass
+                channel, ntt_raw = body[0], body[1]
+                if channel in rules:
+                    rules[channel].ntt = _SFF2_NTT.get(ntt_raw & 0x7F, NTT_MELODY)
+                    rules[channel].bass = bool(ntt_raw & 0x80)
+
+        for section_name in section_names:
+            casm[section_name] = rules
+
+    return casm
+
+
+def parse_ots(view):
+    """
+    Decodifica il chunk OTSc (One Touch Setting).
+
+    Returns:
+        list: una lista di eventi (tick, status, meta_type, data) per ogni OTS
+    """
+    settings = []
+    for chunk_id, body in iter_chunks(memoryview(view)):
+        if chunk_id == b'MTrk':
+            settings.append(list(parse_track(body).events()))
+    return settings
+
+
+def parse_mdb(view):
+    """
+    Decodifica il chunk FNRc (Music DataBase).
+
+    Returns:
+        list: dict per ogni record con i campi testuali (Mnam, Gnam, Kwd1, Kwd2)
+    """
+    view = memoryview(view)
+    records = []
+    for chunk_id, record in iter_chunks(view):
+        if chunk_id != b'FNRP' or len(record) < 5:
+            continue
+        fields = {}
+        # 5 byte di intestazione del record, poi sotto-chunk testuali
+        for field_id, body in iter_chunks(record[5:]):
+            fields[field_id.decode('latin1')] = bytes(body).decode('latin1').rstrip('\x00')
+        records.append(fields)
+    return records
@@ -2,9 +2,57 @@
 StylePlayer - Classe per gestire il playback di file .STY Yamaha
 """
 
+import io
+import math
+import os
+import struct
 import mido
-import time
 import threading
+from bisect import bisect_left, bisect_right
+
+from clocks import SystemClock
+from tempo_map import TempoMap
+from timing_stats import TimingStats
+from channel_state import ChannelState
+from chord_variants import ChordVariantCache, VariantKey, VariantPrefetcher
+from note_engine import DRUM_CHANNEL
+from midi_output import as_midi_output
+from note_registry import ActiveNotes
+from offline_render import render_arrangement
+from style_casm import find_chunk, parse_casm
+from smf_reader import (parse_smf, SmfFormatError, META, META_SET_TEMPO, META_TIME_SIGNATURE,
+                        META_TRACK_NAME)
+from style_timeline import (CompiledStyle, compile_sections, event_to_bytes, memory_report,
+                            mido_track_events, timeline_ticks)
+
+
+MELODIC_CHANNELS = tuple(channel for channel in range(16) if channel != DRUM_CHANNEL)
+
+
+class PreloadedStyle:
+    """
+    Style compilato in background, pronto per switch_style.
+
+    Ha la propria cache delle varianti, già riempita per l'accordo corrente:
+    al cambio il loop sostituisce solo dei riferimenti.
+    """
+
+    __slots__ = ('filename', 'compiled', 'casm', 'variant_cache', 'setup_state')
+
+    def __init__(self, filename, compiled, casm, variant_cache):
+        self.filename = filename
+        self.compiled = compiled
+        self.casm = casm
+        self.variant_cache = variant_cache
+        self.setup_state = ChannelState.from_messages(compiled.setup_events)
+
+    @property
+    def style_name(self):
+        return self.compiled.style_name
+
+    @property
+    def sections(self):
+        return self.compiled.sections
 
 
 class StylePlayer:
@@ -18,12 +66,15 @@ class StylePlayer:
         'ending': ['Ending A', 'Ending B', 'Ending C']
     }
 
-    def __init__(self):
-        self.midi_file = None
+    def __init__(self, style_cache=None, clock=None):
+        self.style_file = None
         self.style_name = None
         self.tempo_bpm = 120
+        self.style_tempo_bpm = 120  # tempo scritto nello style (base dei cambi di tempo interni)
         self.ticks_per_beat = 480
         self.sections = {}
+        self.casm = {}  # nome sezione -> {canale sorgente: ChannelRule}
+        self.casm_data = b''  # corpo grezzo del chunk CASM
         self.current_section = None
         self.playing = False
         self.play_thread = None
@@ -44,6 +95,11 @@ class StylePlayer:
         # Trasposizione - numero di semitoni da trasporre
         self.transpose_semitones = 0  # 0 = nessuna trasposizione
 
+        # Accordo corrente (root 0-11 e tipo del ChordRecognizer, None = nessuno)
+        self.chord_root = 0
+        self.chord_type = None
+        self.chord_bass = None  # basso di rivolti e slash chord (None = la root)
+
         # Stop a fine battuta
         self.stop_at_measure_end = False  # Se True, ferma alla fine della battuta corrente
 
@@ -56,16 +112,92 @@ class StylePlayer:
         # Eventi di setup iniziali (program_change, control_change)
         # Questi sono gli eventi PRIMA del primo marker
         self.initial_setup_events = []
+        # Stato dei canali che il setup dello style imposta (fotografia presa
+        # al caricamento) e stato che il synth sulla porta ha già ricevuto:
+        # all'avvio e ai cambi sezione si invia solo la differenza
+        self.setup_state = ChannelState()
+        self.synth_state = ChannelState()
+        self._forgotten_channels = []
+
+        # Cache su disco degli style compilati (opzionale, vedi StyleCache)
+        self.style_cache = style_cache
+
+        # Lettore SMF nativo (False = usa sempre mido.MidiFile)
+        self.use_native_reader = True
+
+        # Varianti renderizzate per accordo: il loop suona sempre self._stream,
+        # cambiare accordo sostituisce solo il riferimento
+        self.variant_cache = ChordVariantCache()
+        self._variant_prefetcher = VariantPrefetcher(self.variant_cache)
+        self.prefetch_variants = True  # False = niente render in anticipo (es. render offline)
+        self._stream = None
+
+        # Scadenze assolute degli eventi (niente deriva fra un evento e l'altro)
+        # sull'orologio del playback: reale, o virtuale per test e render
+        self.clock = None
+        self.scheduler = None
+        self.set_clock(clock or SystemClock())
+
+        # Mappa tick -> secondi del playback in corso (None se fermo). I tick
+        # contano dall'inizio del playback; _pass_base_tick è il tick di inizio
+        # del giro corrente della sezione
+        self.tempo_map = None
+        self._tempo_factor = 1.0  # rapporto fra tempo della sezione e tempo dello style
+        self._pass_base_tick = 0
+
+        # Richiesta di cambio sezione per il thread di playback: (nome, tick
+        # di quantizzazione, PreloadedStyle o None) oppure None. Il contatore
+        # segnala ogni richiesta
+        self._next_section = None
+        self._section_request_seq = 0
+
+        # Ultimo style compilato in background (vedi preload_style)
+        self.preloaded_style = None
+
+        # Note accese dal playback (pitch inviato per canale e nota sorgente).
+        # Aggiornato solo dal thread di playback, o dopo che è terminato
+        self.active_notes = ActiveNotes()
+
+        # Ritardi di invio e contatori del playback (vedi get_timing_stats)
+        self.timing = TimingStats()
 
     def load_style(self, filename):
-        """Carica un file .STY"""
+        """Carica un file .STY (dalla cache su disco se disponibile)"""
         try:
-            self.midi_file = mido.MidiFile(filename)
-            self.ticks_per_beat = self.midi_file.ticks_per_beat
+            with open(filename, 'rb') as f:
+                data = f.read()
+
+            # Prima di interpellare mido, cerca lo style già compilato in cache
+            cache_key = None
+            if self.style_cache:
+                cache_key = self.style_cache.make_key(data, os.stat(filename).st_mtime_ns)
+                compiled = self.style_cache.get(cache_key)
+                if compiled is not None:
+                    self._apply_compiled_style(compiled)
+                    self.variant_cache.set_sections(self.sections, self.casm)
+                    self.style_file = filename
+                    return True
+
+            tracks = self._read_tracks(data)
 
             # Analizza metadata e sezioni
-            self._parse_metadata()
-            self._parse_sections()
+            self._parse_metadata(tracks)
+            setup_events = self._parse_sections(tracks)
+            casm_data = self._read_casm(data)
+            self.variant_cache.set_sections(self.sections, self.casm)
+            self.style_file = filename
+
+            if self.style_cache:
+                self.style_cache.put(cache_key, CompiledStyle(
+                    style_name=self.style_name,
+                    tempo_bpm=self.tempo_bpm,
+                    ticks_per_beat=self.ticks_per_beat,
+                    time_signature_numerator=self.time_signature_numerator,
+                    time_signature_denominator=self.time_signature_denominator,
+                    sections=self.sections,
+                    setup_events=setup_events,
+                    casm_data=casm_data
+                ))
 
             return True
 
@@ -73,83 +205,144 @@ class StylePlayer:
             print(f"Errore caricamento style: {e}")
             return False
 
-    def _parse_metadata(self):
+    def _apply_compiled_style(self, compiled):
+        """Imposta lo stato del player da uno style già compilato"""
+        self.style_name = compiled.style_name
+        self.tempo_bpm = compiled.tempo_bpm
+        self.ticks_per_beat = compiled.ticks_per_beat
+        self.time_signature_numerator = compiled.time_signature_numerator
+        self.time_signature_denominator = compiled.time_signature_denominator
+        self.style_tempo_bpm = compiled.tempo_bpm
+        self.sections = compiled.sections
+        self.set_setup_events(compiled.setup_events)
+        self._apply_casm(compiled.casm_data)
+
+    def set_setup_events(self, setup_events):
+        """Sostituisce il setup dello style e la fotografia dello stato dei canali"""
+        self.initial_setup_events = list(setup_events)
+        self.setup_state = ChannelState.from_messages(self.initial_setup_events)
+
+    def _read_casm(self, data):
+        """
+        Decodifica il chunk CASM che segue i dati MIDI e lo associa alle sezioni.
+
+        Returns:
+            bytes: corpo grezzo del chunk CASM (vuoto se assente), per la cache
+        """
+        try:
+            view = find_chunk(data, b'CASM')
+            casm_data = bytes(view) if view is not None else b''
+            self._apply_casm(casm_data)
+        except (struct.error, IndexError) as e:
+            print(f"Chunk CASM non valido, uso regole di default: {e}")
+            casm_data = b''
+            self._apply_casm(casm_data)
+        return casm_data
+
+    def _apply_casm(self, casm_data):
+        """Imposta le regole CASM dello style (una volta sola, al caricamento)"""
+        self.casm_data = casm_data
+        self.casm = parse_casm(casm_data) if casm_data else {}
+
+    def get_channel_rules(self, section_name):
+        """
+        Ritorna le regole CASM di una sezione.
+
+        Returns:
+            dict: canale sorgente -> ChannelRule (vuoto se lo style non ha CASM)
+        """
+        return self.casm.get(section_name, {})
+
+    def get_timing_stats(self):
+        """
+        Ritorna la strumentazione del playback: contatori degli eventi e
+        istogrammi del ritardo d'invio rispetto alla scadenza ('lateness') e
+        della durata della chiamata alla porta ('send_time'), in millisecondi.
+        I note off scartati li conta ActiveNotes, i riallineamenti lo scheduler.
+        """
+        stats = self.timing.get_stats()
+        stats['events_dropped'] = self.active_notes.dropped
+        stats['resyncs'] = self.scheduler.resyncs
+        return stats
+
+    def reset_timing_stats(self):
+        """Azzera istogrammi e contatori del playback"""
+        self.timing.reset()
+        self.active_notes.dropped = 0
+        self.scheduler.reset_stats()
+
+    def get_variant_stats(self):
+        """Ritorna le statistiche della cache delle varianti per accordo"""
+        return self.variant_cache.get_stats()
+
+    def get_memory_report(self):
+        """
+        Ritorna la memoria occupata dalle timeline dello style: per sezione e
+        in totale, come EventStore compatto e come lista di tuple (vedi
+        style_timeline.memory_report)
+        """
+        return memory_report(self.sections)
+
+    def get_cache_stats(self):
+        """Ritorna le statistiche della cache style (hit/miss) o None se disattivata"""
+        if not self.style_cache:
+            return None
+        return self.style_cache.get_stats()
+
+    def _read_tracks(self, data):
+        """
+        Decodifica le tracce MIDI del file nel formato normalizzato del compilatore.
+
+        Usa il lettore nativo; se il file contiene strutture che non sa
+        gestire ripiega su mido.MidiFile.
+        """
+        if self.use_native_reader:
+            try:
+                smf = parse_smf(data)
+                self.ticks_per_beat = smf.ticks_per_beat
+                return [list(track.events()) for track in smf.tracks]
+            except SmfFormatError as e:
+                print(f"Lettore nativo non applicabile ({e}), uso mido")
+
+        # Il MidiFile serve solo per la conversione: non resta in memoria
+        midi_file = mido.MidiFile(file=io.BytesIO(data))
+        self.ticks_per_beat = midi_file.ticks_per_beat
+        return [mido_track_events(track) for track in midi_file.tracks]
+
+    def _parse_metadata(self, tracks):
         """Estrae metadata dallo style (nome, tempo, time signature, ecc.)"""
-        if not self.midi_file or len(self.midi_file.tracks) == 0:
+        if len(tracks) == 0:
             return
 
-        for msg in self.midi_file.tracks[0]:
-            if msg.type == 'track_name':
-                self.style_name = msg.name.strip()
-            elif msg.type == 'set_tempo':
-                self.tempo_bpm = mido.tempo2bpm(msg.tempo)
-            elif msg.type == 'time_signature':
-                self.time_signature_numerator = msg.numerator
-                self.time_signature_denominator = msg.denominator
-
-    def _parse_sections(self):
-        """Identifica le sezioni dello style (Main A, Intro, ecc.)"""
-        self.sections = {}
+        for _, status, meta_type, data in tracks[0]:
+            if status != META:
+                continue
+            if meta_type == META_TRACK_NAME:
+                self.style_name = data.decode('latin1').strip()
+            elif meta_type == META_SET_TEMPO:
+                self.tempo_bpm = mido.tempo2bpm(int.from_bytes(data[:3], 'big'))
+            elif meta_type == META_TIME_SIGNATURE:
+                self.time_signature_numerator = data[0]
+                self.time_signature_denominator = 2 ** data[1]
 
+        self.style_tempo_bpm = self.tempo_bpm
+
+    def _parse_sections(self, tracks):
+        """
+        Identifica le sezioni dello style (Main A, Intro, ecc.) e le compila in timeline.
+
+        Returns:
+            list: eventi di setup trovati in questo file
+        """
         # Unisci tutti i nomi di sezione validi
         all_section_names = []
         for section_list in self.SECTION_TYPES.values():
             all_section_names.extend(section_list)
 
-        # Scansiona tutte le tracce per trovare i markers di sezione
-        for track in self.midi_file.tracks:
-            current_section = None
-            section_start_time = 0
-            absolute_time = 0
-            section_events = []
-            first_marker_found = False
-
-            for msg in track:
-                absolute_time += msg.time
-
-                # Controlla se è un marker di sezione
-                if msg.type == 'marker' and msg.text in all_section_names:
-                    # Se è il primo marker, salva gli eventi precedenti come setup iniziali
-                    if not first_marker_found:
-                        first_marker_found = True
-                        # Gli eventi accumulati prima del primo marker sono setup events
-                        # Filtriamo per tenere solo program_change e control_change
-                        for event in section_events:
-                            if event.type in ['program_change', 'control_change']:
-                                self.initial_setup_events.append(event.copy())
-                        section_events = []  # Reset per la nuova sezione
-
-                    # Salva la sezione precedente se esiste
-                    elif current_section and section_events:
-                        if current_section not in self.sections:
-                            self.sections[current_section] = {
-                                'events': [],
-                                'length_ticks': absolute_time - section_start_time,
-                                'start_time': section_start_time
-                            }
-                        # Aggiungi gli eventi alla sezione
-                        self.sections[current_section]['events'].extend(section_events)
-
-                    # Inizia nuova sezione
-                    current_section = msg.text
-                    section_start_time = absolute_time
-                    section_events = []
-
-                # Aggiungi evento alla sezione corrente (o al buffer pre-primo-marker)
-                else:
-                    # Crea una copia del messaggio con tempo relativo alla sezione
-                    event_copy = msg.copy()
-                    section_events.append(event_copy)
-
-            # Salva l'ultima sezione
-            if current_section and section_events:
-                if current_section not in self.sections:
-                    self.sections[current_section] = {
-                        'events': [],
-                        'length_ticks': absolute_time - section_start_time,
-                        'start_time': section_start_time
-                    }
-                self.sections[current_section]['events'].extend(section_events)
+        # Compila ogni sezione in un'unica timeline ordinata a tick assoluti,
+        # unendo gli eventi di tutte le tracce
+        self.sections, setup_events = compile_sections(tracks, all_section_names)
+        self.set_setup_events(setup_events)
 
         # Debug: mostra quanti setup events sono stati trovati
         print(f"Setup events trovati: {len(self.initial_setup_events)}")
@@ -160,6 +353,8 @@ class StylePlayer:
             print(f"  - program_change: {len(program_changes)}")
             print(f"  - control_change: {len(control_changes)}")
 
+        return setup_events
+
     def get_available_sections(self):
         """Ritorna lista delle sezioni disponibili nello style"""
         return sorted(list(self.sections.keys()))
@@ -190,12 +385,37 @@ class StylePlayer:
             'name': section_name,
             'beats': beats,
             'length_ticks': info['length_ticks'],
-            'num_events': len(info['events'])
+            'num_events': len(info['timeline'])
         }
 
+    def set_clock(self, clock):
+        """
+        Imposta l'orologio del playback (SystemClock o VirtualClock, vedi clocks).
+
+        Con un orologio non in tempo reale play_section esegue il playback nel
+        thread chiamante e ritorna quando termina: le azioni programmate
+        sull'orologio (cambi sezione, accordi, stop) lo guidano in tempo virtuale.
+        """
+        if self.playing:
+            print("Orologio non modificabile durante il playback")
+            return False
+        self.clock = clock
+        self.scheduler = clock.make_scheduler()
+        return True
+
     def set_midi_output(self, midi_output):
-        """Imposta la porta MIDI output per il playback"""
-        self.midi_output = midi_output
+        """Imposta la porta MIDI output per il playback (porta mido o MidiOutput)"""
+        self.midi_output = as_midi_output(midi_output)
+        # Synth nuovo: il suo stato è ignoto, il prossimo avvio invia tutto il setup
+        self.synth_state = ChannelState()
+
+    def forget_channel_state(self, channel):
+        """
+        Segnala che un canale è stato modificato fuori dal player (es. un
+        program change dalla tastiera): il suo setup verrà reinviato per intero
+        al prossimo avvio o cambio sezione.
+        """
+        self._forgotten_channels.append(channel)
 
     def play_section(self, section_name, loop=True):
         """Avvia il playback di una sezione"""
@@ -211,8 +431,14 @@ class StylePlayer:
         self.stop()
 
         self.current_section = section_name
+        self._next_section = None
         self.playing = True
 
+        if not self.clock.realtime:
+            # Tempo virtuale: il playback gira qui fino allo stop
+            self._playback_loop(section_name, loop)
+            return True
+
         # Avvia thread di playback
         self.play_thread = threading.Thread(
             target=self._playback_loop,
@@ -223,49 +449,134 @@ class StylePlayer:
 
         return True
 
-    def _playback_loop(self, section_name, loop):
-        """Loop di playback (eseguito in thread separato)"""
-        section = self.sections[section_name]
-        events = section['events']
-
-        # Determina tipo sezione
-        is_intro_section = section_name.startswith('Intro')
-        is_ending_section = section_name.startswith('Ending')
+    def _playback_loop(self, section_name, loop, tempo_map=None):
+        """
+        Loop di playback (eseguito in thread separato, o dal render offline
+        con un orologio virtuale).
 
-        # Tempo in secondi per tick
-        seconds_per_tick = 60.0 / (self.tempo_bpm * self.ticks_per_beat)
+        Il thread resta attivo per tutto il playback: i cambi sezione chiesti
+        con change_section scattano al confine di battuta (o beat) successivo,
+        sulla stessa origine temporale, senza pause né eventi ripetuti.
+        """
+        # Mappa tick -> secondi: un cambio di tempo vale dal tick successivo
+        # senza riavviare il thread né perdere la posizione
+        if tempo_map is None:
+            tempo_map = TempoMap(self.ticks_per_beat, self.tempo_bpm)
+        self._tempo_factor = 1.0
+        self._pass_base_tick = 0
+        base_tick = 0
 
         # Calcola ticks per misura basato sulla time signature
         ticks_per_measure = self.time_signature_numerator * self.ticks_per_beat
         ticks_per_beat = self.ticks_per_beat
 
-        current_tick = 0
-
         # Reset tracciamento progresso
         self.current_tick_in_section = 0
         self.current_measure = 1
         self.current_beat = 1
 
-        # Invia gli eventi di setup iniziali (program_change e control_change)
-        # Questi sono gli eventi che nel file .sty si trovano prima del primo marker
-        print(f"Invio {len(self.initial_setup_events)} setup events...")
-        for setup_event in self.initial_setup_events:
-            if not self.playing:
-                break
-            try:
-                self.midi_output.send(setup_event)
-                # Debug dettagliato per i program_change
-                if setup_event.type == 'program_change':
-                    print(f"  program_change ch={setup_event.channel} prog={setup_event.program}")
-            except Exception as e:
-                print(f"Errore invio setup MIDI: {e}")
+        # Stato dei canali atteso all'inizio di ogni sezione (il setup prima
+        # del primo marker) e stato del synth, aggiornato a ogni invio: si
+        # inviano solo le differenze, all'avvio come ai cambi sezione
+        setup_state = self.setup_state
+        channel_state = self.synth_state
+        changes = self._send_setup_changes(channel_state, setup_state)
+        print(f"Invio {changes} setup events (su {len(setup_state)})...")
+
+        stream = self._current_stream(section_name)
+        send_many = self.midi_output.send_many
+        # Dietro al dispatcher il ritardo si misura quando il burst arriva alla porta
+        send_timed = getattr(self.midi_output, 'send_timed', None)
+        active_notes = self.active_notes
+        timing = self.timing
+        section_ticks = {}  # nome sezione -> tick della timeline (conteggio dei filtrati)
+
+        # Origine del tick 0: ogni evento ha una scadenza assoluta
+        scheduler = self.scheduler
+        clock = scheduler.clock
+        scheduler.start()
+        self.tempo_map = tempo_map
+
+        def deadline_of(song_tick):
+            return scheduler.origin + tempo_map.time_at(song_tick)
+
+        # Le attese si interrompono anche per una nuova richiesta di cambio sezione
+        seen_request = self._section_request_seq
+
+        def keep_waiting():
+            return (self.playing and self._section_request_seq == seen_request
+                    and self._stream is stream)
 
         while self.playing:
-            # Riproduci gli eventi della sezione
-            for event in events:
-                if not self.playing:
+            section = self.sections[section_name]
+            length_ticks = section['length_ticks']
+
+            # Cambi di tempo scritti nella sezione (relativi al tempo dello style)
+            tempo_changes = section.get('tempo_changes', [])
+            tempo_index = 0
+            if tempo_changes and tempo_changes[0][0] == 0:
+                self._apply_style_tempo(base_tick, tempo_changes[0][1])
+                tempo_index = 1
+            else:
+                self._apply_style_tempo(base_tick, None)
+
+            # Eventi della timeline non presenti nello stream = filtrati
+            base_ticks = section_ticks.get(section_name)
+            if base_ticks is None:
+                base_ticks = timeline_ticks(section['timeline'])
+                section_ticks[section_name] = base_ticks
+            base_index = 0
+
+            # Riproduci lo stream già renderizzato per l'accordo corrente
+            ticks = stream.ticks
+            messages = stream.messages
+            sources = stream.sources
+            count = len(messages)
+            index = 0
+            current_tick = 0
+            sent_tick = -1  # tick dell'ultimo burst inviato
+            switch_tick = None  # tick del cambio sezione richiesto (None = fine sezione)
+
+            while self.playing:
+                # Accordo cambiato: prosegui sulla nuova variante dal primo evento
+                # non ancora inviato; le note accese col vecchio accordo si spengono
+                if self._stream is not stream:
+                    stream = self._current_stream(section_name)
+                    ticks = stream.ticks
+                    messages = stream.messages
+                    sources = stream.sources
+                    count = len(messages)
+                    index = bisect_right(ticks, sent_tick)
+                    self._send_messages(active_notes.release(MELODIC_CHANNELS))
+
+                # Nuova richiesta di cambio sezione: fissa il confine a cui scatta
+                if self._section_request_seq != seen_request:
+                    seen_request = self._section_request_seq
+                    switch_tick = None
+                    if self._next_section is not None:
+                        switch_tick = self._quantized_switch_tick(
+                            base_tick, current_tick, length_ticks, self._next_section[1])
+
+                end_tick = length_ticks if switch_tick is None else switch_tick
+
+                if index >= count or ticks[index] >= end_tick:
+                    # Nessun altro evento: attendi la fine della sezione o il
+                    # confine del cambio (le ultime pause fanno parte del pattern)
+                    if end_tick > current_tick:
+                        while tempo_index < len(tempo_changes) and tempo_changes[tempo_index][0] < end_tick:
+                            self._apply_style_tempo(base_tick + tempo_changes[tempo_index][0],
+                                                    tempo_changes[tempo_index][1])
+                            tempo_index += 1
+                        song_end = base_tick + end_tick
+                        if not scheduler.wait(lambda: deadline_of(song_end), keep_waiting):
+                            timing.interrupted_waits += 1
+                            continue
+                        current_tick = end_tick
+                    timing.events_filtered += bisect_left(base_ticks, end_tick, base_index) - base_index
                     break
 
+                tick = ticks[index]
+
                 # Controlla se dobbiamo fermarci a fine battuta
                 if self.stop_at_measure_end:
                     # Se abbiamo completato una battuta, ferma
@@ -273,64 +584,102 @@ class StylePlayer:
                         self.playing = False
                         break
 
-                # Attendi il tempo dell'evento
-                if event.time > 0:
-                    time.sleep(event.time * seconds_per_tick)
-                    current_tick += event.time
-                    self.current_tick_in_section = current_tick
-
-                    # Calcola misura e beat correnti
-                    self.current_measure = int(current_tick / ticks_per_measure) + 1
-                    tick_in_measure = current_tick % ticks_per_measure
-                    self.current_beat = int(tick_in_measure / ticks_per_beat) + 1
-
-                # Invia il messaggio MIDI (solo messaggi non-meta)
-                if not event.is_meta:
-                    # Crea una copia del messaggio per non modificare l'originale
-                    msg = event.copy()
-
-                    # Se le note melodiche sono bloccate, suona solo drums
-                    should_send = True
-                    if self.block_melodic_notes and msg.type in ['note_on', 'note_off'] and msg.channel != 9:
-                        should_send = False
-
-                    # Applica trasposizione alle note (ma NON al canale drums - channel 9)
-                    if should_send and self.transpose_semitones != 0 and msg.type in ['note_on', 'note_off'] and msg.channel != 9:
-                        msg.note = max(0, min(127, msg.note + self.transpose_semitones))
-
-                    # Applica filtro accordo se impostato (ma NON al canale drums - channel 9)
-                    if should_send and self.chord_filter is not None and msg.type in ['note_on', 'note_off'] and msg.channel != 9:
-                        note_class = msg.note % 12
-                        if note_class not in self.chord_filter:
-                            should_send = False
-
-                    if should_send:
-                        try:
-                            self.midi_output.send(msg)
-                        except Exception as e:
-                            print(f"Errore invio MIDI: {e}")
+                while tempo_index < len(tempo_changes) and tempo_changes[tempo_index][0] <= tick:
+                    self._apply_style_tempo(base_tick + tempo_changes[tempo_index][0],
+                                            tempo_changes[tempo_index][1])
+                    tempo_index += 1
+
+                # Attendi la scadenza assoluta del tick dell'evento (ricalcolata
+                # durante l'attesa se il tempo cambia)
+                song_tick = base_tick + tick
+                if tick > current_tick:
+                    if not scheduler.wait(lambda: deadline_of(song_tick), keep_waiting):
+                        timing.interrupted_waits += 1
+                        continue
+                    current_tick = tick
+                    self._update_position(current_tick, ticks_per_measure, ticks_per_beat)
+
+                # Invia in un unico burst tutti gli eventi dello stesso tick
+                # (i note off spengono il pitch acceso dalla stessa nota sorgente)
+                burst_start = index
+                while index < count and ticks[index] == tick:
+                    index += 1
+                burst = active_notes.track(messages, sources, burst_start, index)
+                deadline = deadline_of(song_tick)
+                if send_timed is not None:
+                    send_timed(burst, deadline, timing)
+                else:
+                    started = clock()
+                    try:
+                        send_many(burst)
+                    except Exception as e:
+                        timing.send_errors += 1
+                        print(f"Errore invio MIDI: {e}")
+                    else:
+                        timing.record_send(deadline, started, clock(), len(burst))
+                sent_tick = tick
+                base_end = bisect_right(base_ticks, tick, base_index)
+                timing.events_filtered += base_end - base_index - (index - burst_start)
+                base_index = base_end
+
+            if not self.playing:
+                # Il synth ha ricevuto la timeline fino all'ultimo burst inviato
+                channel_state.apply_timeline(section['timeline'], sent_tick + 1)
+                break
+
+            # Il giro successivo (o la sezione seguente) parte esattamente dove finisce questo
+            base_tick += current_tick
+            self._pass_base_tick = base_tick
+            channel_state.apply_timeline(section['timeline'], current_tick)
+
+            # Cambio sezione richiesto: scatta ora, al confine scelto
+            next_section, next_style = (self._take_next_section() if switch_tick is not None
+                                        else (None, None))
+            if next_style is not None:
+                # Cambio style: le note del vecchio style si spengono, il nuovo
+                # riparte da qui con la propria mappa del tempo e il suo setup
+                self._send_messages(active_notes.release())
+                switch_time = deadline_of(base_tick)
+                self._install_style(next_style)
+                tempo_map = TempoMap(self.ticks_per_beat, self.tempo_bpm)
+                self.tempo_map = tempo_map
+                self._tempo_factor = 1.0
+                scheduler.start(switch_time)
+                base_tick = 0
+                self._pass_base_tick = 0
+                ticks_per_measure = self.time_signature_numerator * self.ticks_per_beat
+                ticks_per_beat = self.ticks_per_beat
+                setup_state = self.setup_state
+                section_ticks = {}
+            elif next_section is not None and current_tick < length_ticks:
+                # Sezione interrotta: chiudi le note rimaste accese
+                self._send_messages(active_notes.release())
+            if next_section is not None:
+                section_name = next_section
+                self.current_section = section_name
+                stream = self._current_stream(section_name)
+                self._send_setup_changes(channel_state, setup_state)
+                self._update_position(0, ticks_per_measure, ticks_per_beat)
+                continue
 
             # Fine della sezione raggiunta
 
             # Se è Intro, passa automaticamente a Main
-            if is_intro_section:
+            if section_name.startswith('Intro'):
                 # Trova primo Main disponibile
                 main_section = self._find_first_main()
                 if main_section:
                     self.current_section = main_section
                     section_name = main_section
-                    section = self.sections[section_name]
-                    events = section['events']
-                    is_intro_section = False
-                    # Reset per nuova sezione
-                    current_tick = 0
+                    stream = self._current_stream(section_name)
+                    self._send_setup_changes(channel_state, setup_state)
                     continue
                 else:
                     # Nessun Main disponibile, ferma
                     break
 
             # Se è una sezione Ending, ferma dopo la prima esecuzione
-            if is_ending_section:
+            if section_name.startswith('Ending'):
                 # Imposta il prossimo Intro da selezionare nell'UI
                 self.next_section_after_stop = self._find_first_intro()
                 if not self.next_section_after_stop:
@@ -346,12 +695,138 @@ class StylePlayer:
             if self.stop_at_measure_end:
                 break
 
-            # Reset tick count per il prossimo loop (Main e Fill ripartono)
-            current_tick = 0
+            timing.loop_restarts += 1
+
+        # Spegni solo le note ancora accese
+        self._send_messages(active_notes.release())
 
         self.playing = False
         self.stop_at_measure_end = False  # Reset flag
         self.block_melodic_notes = False  # Reset flag
+        self._next_section = None
+        self.tempo_map = None
+
+    def _quantized_switch_tick(self, base_tick, current_tick, length_ticks, quantum):
+        """
+        Primo confine di quantum tick (battuta o beat) dopo la posizione attuale.
+
+        Args:
+            base_tick: tick di inizio del giro corrente
+            current_tick: ultimo tick della sezione già suonato
+            length_ticks: lunghezza della sezione (il cambio non va oltre)
+            quantum: tick fra due confini utili
+
+        Returns:
+            int: tick nella sezione a cui passare alla sezione richiesta
+        """
+        position = current_tick
+        tempo_map = self.tempo_map
+        if tempo_map is not None:
+            live_tick = tempo_map.tick_at(self.scheduler.clock() - self.scheduler.origin) - base_tick
+            position = max(position, live_tick)
+        if quantum <= 0:
+            return length_ticks
+        boundary = (int(position // quantum) + 1) * quantum
+        return min(boundary, length_ticks)
+
+    def _take_next_section(self):
+        """
+        Consuma la richiesta di cambio sezione in attesa.
+
+        Returns:
+            tuple (nome sezione, PreloadedStyle o None), (None, None) se nessuna
+        """
+        request = self._next_section
+        self._next_section = None
+        if request is None:
+            return None, None
+        return request[0], request[2]
+
+    def _send_setup_changes(self, channel_state, setup_state):
+        """
+        Reinvia solo il setup che differisce dallo stato attuale dei canali.
+
+        Returns:
+            int: numero di messaggi inviati
+        """
+        forgotten = self._forgotten_channels
+        while forgotten:
+            channel_state.forget(forgotten.pop())
+        changes = channel_state.diff(setup_state)
+        if not changes:
+            return 0
+        self._send_messages(event_to_bytes(status, data) for status, data in changes)
+        for status, data in changes:
+            channel_state.apply(status, data)
+        return len(changes)
+
+    def _send_messages(self, messages):
+        """Invia in un unico gruppo una sequenza di messaggi già codificati in bytes"""
+        try:
+            self.midi_output.send_many(list(messages))
+        except Exception as e:
+            self.timing.send_errors += 1
+            print(f"Errore invio MIDI: {e}")
+
+    def _apply_style_tempo(self, song_tick, tempo):
+        """
+        Applica un cambio di tempo scritto nello style al tick dato.
+
+        Args:
+            song_tick: tick dall'inizio del playback
+            tempo: microsecondi per beat, None = tempo base dello style
+        """
+        factor = 1.0 if tempo is None else mido.tempo2bpm(tempo) / self.style_tempo_bpm
+        if factor == self._tempo_factor:
+            return
+        self._tempo_factor = factor
+        if self.tempo_map is not None:
+            self.tempo_map.set_tempo(song_tick, self.tempo_bpm * factor)
+
+    def _live_section_tick(self, length_ticks):
+        """Tick corrente nella sezione calcolato dall'orologio (non solo agli eventi)"""
+        tempo_map = self.tempo_map
+        if tempo_map is None:
+            return self.current_tick_in_section
+        song_tick = tempo_map.tick_at(self.scheduler.clock() - self.scheduler.origin)
+        tick = song_tick - self._pass_base_tick
+        return min(max(tick, 0), max(length_ticks - 1, 0))
+
+    def _variant_key(self, section_name):
+        """Chiave della variante da suonare per la sezione con lo stato corrente"""
+        return VariantKey(section_name, self.transpose_semitones, self.chord_root,
+                          self.chord_type, self.chord_filter, not self.block_melodic_notes,
+                          self.chord_bass)
+
+    def _select_stream(self):
+        """Seleziona (renderizzando se serve) la variante della sezione corrente"""
+        if self.current_section is None:
+            self._stream = None
+        else:
+            self._stream = self.variant_cache.get(self._variant_key(self.current_section))
+        return self._stream
+
+    def _current_stream(self, section_name):
+        """Stream attivo per section_name (riseleziona se appartiene a un'altra sezione)"""
+        stream = self._stream
+        if stream is None or stream.key.section_name != section_name:
+            stream = self._select_stream()
+        return stream
+
+    def _chord_state_changed(self, prefetch=True):
+        """Aggiorna la variante attiva e prepara in anticipo quelle delle altre sezioni"""
+        if self.current_section is None:
+            return
+        stream = self._select_stream()
+        if prefetch and self.prefetch_variants and stream is not None:
+            self._variant_prefetcher.request(stream.key, self.get_available_sections())
+
+    def _update_position(self, current_tick, ticks_per_measure, ticks_per_beat):
+        """Aggiorna misura e beat correnti a partire dal tick nella sezione"""
+        self.current_tick_in_section = current_tick
+        self.current_measure = int(current_tick / ticks_per_measure) + 1
+        tick_in_measure = current_tick % ticks_per_measure
+        self.current_beat = int(tick_in_measure / ticks_per_beat) + 1
 
     def stop(self):
         """Ferma il playback immediatamente"""
@@ -363,25 +838,33 @@ class StylePlayer:
         if self.play_thread and self.play_thread.is_alive():
             self.play_thread.join(timeout=1.0)
 
-        # Invia All Notes Off su tutti i canali
+        # Spegni le note rimaste accese (con priorità sugli altri messaggi)
         if self.midi_output:
-            for channel in range(16):
-                try:
-                    msg = mido.Message('control_change',
-                                      control=123,  # All Notes Off
-                                      value=0,
-                                      channel=channel)
-                    self.midi_output.send(msg)
-                except:
-                    pass
+            try:
+                self.midi_output.send_panic(self.active_notes.release())
+            except Exception as e:
+                self.timing.send_errors += 1
+                print(f"Errore invio MIDI: {e}")
 
     def request_stop_at_measure_end(self):
         """Richiede di fermare il playback alla fine della battuta corrente"""
         self.stop_at_measure_end = True
 
-    def set_tempo(self, bpm):
-        """Imposta il tempo di playback"""
+    def set_tempo(self, bpm, ramp_beats=0):
+        """
+        Imposta il tempo di playback (anche durante il playback).
+
+        Args:
+            bpm: nuovo tempo
+            ramp_beats: 0 = cambio dal prossimo tick, altrimenti numero di beat
+                per arrivare gradualmente a bpm (accelerando/ritardando)
+        """
         self.tempo_bpm = bpm
+        tempo_map = self.tempo_map
+        if self.playing and tempo_map is not None:
+            now_tick = tempo_map.tick_at(self.scheduler.clock() - self.scheduler.origin)
+            tempo_map.set_tempo(math.ceil(now_tick), bpm * self._tempo_factor,
+                                ramp_ticks=int(ramp_beats * self.ticks_per_beat))
 
     def set_chord_filter(self, chord_notes):
         """
@@ -395,6 +878,7 @@ class StylePlayer:
             self.chord_filter = None
         else:
             self.chord_filter = set(chord_notes)
+        self._chord_state_changed()
 
     def set_c_major(self):
         """Imposta filtro per C maggiore (C, E, G)"""
@@ -415,6 +899,34 @@ class StylePlayer:
                       -3 = traspone 1 tono e mezzo in giù
         """
         self.transpose_semitones = max(-11, min(11, semitones))
+        self._chord_state_changed()
+
+    def set_chord(self, root, chord_type, bass=None):
+        """
+        Applica un accordo: riattiva le note melodiche e passa alla variante
+        già renderizzata per (sezione, root, tipo, basso).
+
+        Args:
+            root: nota root 0-11 (0=C)
+            chord_type: tipo di accordo del ChordRecognizer (es. 'Maj', 'min7')
+            bass: basso 0-11 di un rivolto o slash chord (es. 4 per C/E),
+                suonato dai canali con Bass attivo; None = la root
+        """
+        # Distanza più breve da C (max 6 semitoni in su o giù), come ChordRecognizer
+        transpose = root if root <= 6 else root - 12
+        self.chord_root = root
+        self.chord_type = chord_type
+        self.chord_bass = None if bass == root else bass
+        self.transpose_semitones = transpose
+        self.block_melodic_notes = False
+        self._chord_state_changed()
+
+    def set_block_melodic_notes(self, blocked):
+        """Blocca (True) o riattiva (False) le note melodiche; i drums continuano"""
+        if self.block_melodic_notes == blocked:
+            return
+        self.block_melodic_notes = blocked
+        self._chord_state_changed(prefetch=False)
 
     def is_playing(self):
         """Verifica se è in corso un playback"""
@@ -430,63 +942,193 @@ class StylePlayer:
         if not self.midi_output:
             return
 
+        # Il thread di playback si accorge subito del cambio (anche durante
+        # un'attesa) e spegne esattamente le note accese nel registro
         if hold_drums:
             # Blocca la generazione di note melodiche, continua solo drums
-            self.block_melodic_notes = True
+            self.set_block_melodic_notes(True)
         else:
             # Ferma tutto
             self.playing = False
 
-        # Invia All Notes Off su tutti i canali tranne drums (se hold_drums=True)
-        for channel in range(16):
-            if hold_drums and channel == 9:
-                # Salta il canale drums
-                continue
-
-            try:
-                msg = mido.Message('control_change',
-                                  control=123,  # All Notes Off
-                                  value=0,
-                                  channel=channel)
-                self.midi_output.send(msg)
-            except:
-                pass
-
-    def change_section(self, section_name):
+    def change_section(self, section_name, quantize='bar'):
         """
         Cambia sezione in tempo reale senza fermare il playback.
 
+        Il thread di playback resta lo stesso: la nuova sezione (già
+        renderizzata qui) parte al prossimo confine di battuta o di beat.
+        Richiedere la sezione in esecuzione annulla un cambio in attesa.
+
         Args:
             section_name: Nome della nuova sezione da suonare
+            quantize: 'bar' (inizio della battuta successiva) o 'beat'
         """
         if section_name not in self.sections:
             print(f"Sezione '{section_name}' non trovata")
             return False
 
-        # Ferma il playback corrente
-        self.playing = False
+        if not self.playing:
+            return self.play_section(section_name, loop=True)
 
-        # Attendi che il thread termini
-        if self.play_thread and self.play_thread.is_alive():
-            self.play_thread.join(timeout=0.5)
+        if section_name == self.current_section:
+            self._next_section = None
+        else:
+            # Prepara subito lo stream: al confine basta sostituire il riferimento
+            self.variant_cache.get(self._variant_key(section_name))
+            if quantize == 'beat':
+                quantum = self.ticks_per_beat
+            else:
+                quantum = self.time_signature_numerator * self.ticks_per_beat
+            self._next_section = (section_name, quantum, None)
+        self._section_request_seq += 1
+        return True
 
-        # Avvia la nuova sezione
-        self.current_section = section_name
-        self.playing = True
+    def preload_style(self, filename, callback=None):
+        """
+        Compila uno style in un thread di background, senza toccare quello
+        in uso (che può continuare a suonare).
 
-        # Avvia nuovo thread di playback
-        self.play_thread = threading.Thread(
-            target=self._playback_loop,
-            args=(section_name, True),  # Loop sempre attivo
-            daemon=True
+        Il risultato (PreloadedStyle, o None se il caricamento fallisce) va in
+        self.preloaded_style ed è passato a callback, chiamata dal thread di
+        background.
+
+        Returns:
+            threading.Thread: il thread di caricamento
+        """
+        def worker():
+            preloaded = self._compile_preloaded(filename)
+            if preloaded is not None:
+                self.preloaded_style = preloaded
+            if callback:
+                callback(preloaded)
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
+
+    def _compile_preloaded(self, filename):
+        """Carica filename in un player separato e ne prepara le varianti"""
+        loader = StylePlayer(style_cache=self.style_cache, clock=self.clock)
+        loader.use_native_reader = self.use_native_reader
+        if not loader.load_style(filename):
+            return None
+
+        compiled = CompiledStyle(
+            style_name=loader.style_name,
+            tempo_bpm=loader.tempo_bpm,
+            ticks_per_beat=loader.ticks_per_beat,
+            time_signature_numerator=loader.time_signature_numerator,
+            time_signature_denominator=loader.time_signature_denominator,
+            sections=loader.sections,
+            setup_events=loader.initial_setup_events,
+            casm_data=loader.casm_data
         )
-        self.play_thread.start()
+        preloaded = PreloadedStyle(filename, compiled, loader.casm, loader.variant_cache)
+
+        # Varianti per l'accordo corrente: al cambio non serve renderizzare
+        for section_name in loader.get_available_sections():
+            preloaded.variant_cache.prefetch(self._variant_key(section_name))
+        return preloaded
+
+    def switch_style(self, preloaded, section_name=None, quantize='bar'):
+        """
+        Passa allo style precaricato.
+
+        In playback il cambio avviene nel thread di playback al prossimo
+        confine di battuta (o beat) dello style corrente, senza pause: lo
+        style in uso suona fino a lì. Altrimenti lo style è installato subito.
+        Una successiva change_section annulla un cambio style in attesa.
+
+        Args:
+            preloaded: PreloadedStyle (vedi preload_style)
+            section_name: sezione del nuovo style da cui partire (None = la
+                sezione corrente se esiste, altrimenti il primo Main)
+            quantize: 'bar' o 'beat'
+
+        Returns:
+            bool: False se la sezione non esiste nel nuovo style
+        """
+        sections = preloaded.sections
+        if section_name is None:
+            if self.current_section in sections:
+                section_name = self.current_section
+            else:
+                section_name = next((name for name in self.SECTION_TYPES['main'] if name in sections),
+                                    None)
+        if section_name not in sections:
+            print(f"Sezione '{section_name}' non trovata nel nuovo style")
+            return False
 
+        if not self.playing:
+            self._install_style(preloaded)
+            self.current_section = section_name
+            return True
+
+        preloaded.variant_cache.get(self._variant_key(section_name))
+        if quantize == 'beat':
+            quantum = self.ticks_per_beat
+        else:
+            quantum = self.time_signature_numerator * self.ticks_per_beat
+        self._next_section = (section_name, quantum, preloaded)
+        self._section_request_seq += 1
         return True
 
+    def _install_style(self, preloaded):
+        """Sostituisce lo style corrente con quello precaricato"""
+        compiled = preloaded.compiled
+        self.style_name = compiled.style_name
+        self.tempo_bpm = compiled.tempo_bpm
+        self.style_tempo_bpm = compiled.tempo_bpm
+        self.ticks_per_beat = compiled.ticks_per_beat
+        self.time_signature_numerator = compiled.time_signature_numerator
+        self.time_signature_denominator = compiled.time_signature_denominator
+        self.initial_setup_events = list(compiled.setup_events)
+        self.setup_state = preloaded.setup_state
+        self.casm_data = compiled.casm_data
+        self.casm = preloaded.casm
+        self.variant_cache = preloaded.variant_cache
+        self._variant_prefetcher.cache = preloaded.variant_cache
+        self._stream = None
+        self.sections = compiled.sections
+        self.style_file = preloaded.filename
+        if self.preloaded_style is preloaded:
+            self.preloaded_style = None
+
+    def render(self, changes, filename=None, bars=None, tempo=None):
+        """
+        Renderizza un arrangiamento su file MIDI senza attendere il tempo reale.
+
+        Usa lo stesso loop del playback (trasposizione, filtro, regole CASM,
+        passaggi fra sezioni) su un orologio virtuale.
+
+        Args:
+            changes: sequenza di (battuta, sezione, accordo) con battuta da 1;
+                sezione None = invariata, accordo (root 0-11, tipo) o None.
+                Es: [(1, 'Intro A', (0, 'Maj')), (5, None, (7, '7')), (9, 'Ending A', (0, 'Maj'))]
+            filename: se indicato, salva il file .mid
+            bars: battute totali (None = fino alla fine dell'arrangiamento)
+            tempo: bpm del render (None = tempo corrente)
+
+        Returns:
+            mido.MidiFile oppure None in caso di errore
+        """
+        if self.playing:
+            print("Render non disponibile durante il playback")
+            return None
+
+        try:
+            midi_file = render_arrangement(self, changes, bars=bars, tempo=tempo)
+        except ValueError as e:
+            print(f"Errore render: {e}")
+            return None
+
+        if filename:
+            midi_file.save(filename)
+        return midi_file
+
     def get_style_info(self):
         """Ritorna informazioni generali sullo style"""
-        if not self.midi_file:
+        if not self.style_file:
             return None
 
         return {
@@ -506,21 +1148,24 @@ class StylePlayer:
         if not section:
             return None
 
+        # Posizione dall'orologio e dalla mappa del tempo (precisa anche fra due eventi)
+        section_length_ticks = section['length_ticks']
+        current_tick = self._live_section_tick(section_length_ticks)
+
         # Calcola progresso nella misura corrente (0.0 a 1.0)
         ticks_per_measure = self.time_signature_numerator * self.ticks_per_beat
-        tick_in_measure = self.current_tick_in_section % ticks_per_measure
+        tick_in_measure = current_tick % ticks_per_measure
         measure_progress = tick_in_measure / ticks_per_measure
 
         # Calcola progresso nella sezione (0.0 a 1.0)
-        section_length_ticks = section['length_ticks']
-        section_progress = (self.current_tick_in_section % section_length_ticks) / section_length_ticks if section_length_ticks > 0 else 0
+        section_progress = (current_tick % section_length_ticks) / section_length_ticks if section_length_ticks > 0 else 0
 
         # Calcola numero totale di misure nella sezione
         total_measures = int(section_length_ticks / ticks_per_measure)
 
         return {
-            'measure': self.current_measure,
-            'beat': self.current_beat,
+            'measure': int(current_tick / ticks_per_measure) + 1,
+            'beat': int(tick_in_measure / self.ticks_per_beat) + 1,
             'total_beats': self.time_signature_numerator,
             'measure_progress': measure_progress,  # 0.0 a 1.0
             'section_progress': section_progress,  # 0.0 a 1.0
@@ -0,0 +1,372 @@
+"""
+StyleTimeline - Compilazione delle sezioni di uno style in timeline a tick assoluti
+"""
+
+import heapq
+import sys
+from array import array
+from itertools import accumulate
+from operator import itemgetter
+
+import mido
+
+
+# Indici dei campi di un evento compilato: (tick, channel, status, data)
+#   tick    - tick assoluto relativo all'inizio della sezione
+#   channel - canale MIDI 0-15, oppure -1 per i messaggi di sistema (sysex)
+#   status  - status byte completo (es. 0x93 = note_on sul canale 4)
+#   data    - bytes dei dati (per i sysex: payload senza F0/F7)
+TICK = 0
+CHANNEL = 1
+STATUS = 2
+DATA = 3
+
+# Tipi di messaggio (nibble alto dello status byte)
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+CONTROL_CHANGE = 0xB0
+PROGRAM_CHANGE = 0xC0
+SYSEX = 0xF0
+META = 0xFF
+META_MARKER = 0x06
+META_SET_TEMPO = 0x51
+
+_tick_key = itemgetter(TICK)
+
+
+def message_to_event(msg, tick):
+    """
+    Converte un messaggio mido in un evento compilato.
+
+    Args:
+        msg: messaggio mido (i meta-messaggi vengono ignorati)
+        tick: tick assoluto dell'evento
+
+    Returns:
+        tuple (tick, channel, status, data) oppure None per i meta-messaggi
+    """
+    if msg.is_meta:
+        return None
+
+    raw = msg.bytes()
+    status = raw[0]
+    if status == SYSEX:
+        return (tick, -1, status, bytes(raw[1:-1]))
+    channel = status & 0x0F if status < 0xF0 else -1
+    return (tick, channel, status, bytes(raw[1:]))
+
+
+def mido_track_events(track):
+    """
+    Converte una traccia mido nel formato normalizzato del compilatore.
+
+    Returns:
+        list di tuple (tick assoluto, status, meta_type, data), come SmfTrack.events()
+    """
+    events = []
+    absolute_time = 0
+    for msg in track:
+        absolute_time += msg.time
+        raw = msg.bytes()
+        if msg.is_meta:
+            # FF <tipo> <lunghezza variabile> <dati>
+            pos = 2
+            while raw[pos] & 0x80:
+                pos += 1
+            events.append((absolute_time, META, raw[1], bytes(raw[pos + 1:])))
+        elif raw[0] == SYSEX:
+            events.append((absolute_time, SYSEX, 0, bytes(raw[1:-1])))
+        else:
+            events.append((absolute_time, raw[0], 0, bytes(raw[1:])))
+    return events
+
+
+def _is_note_off(status, data):
+    """Verifica se un evento è un note-off (anche note_on con velocity 0)"""
+    kind = status & 0xF0
+    return kind == NOTE_OFF or (kind == NOTE_ON and data[1] == 0)
+
+
+def event_to_message(status, data):
+    """Ricostruisce un messaggio mido da status byte e dati di un evento compilato"""
+    if status == SYSEX:
+        return mido.Message('sysex', data=data)
+    return mido.Message.from_bytes([status, *data])
+
+
+def event_to_bytes(status, data):
+    """Codifica status byte e dati di un evento compilato nei byte da inviare alla porta"""
+    if status == SYSEX:
+        return b'\xf0' + data + b'\xf7'
+    return bytes((status,)) + data
+
+
+def merge_timelines(timelines):
+    """
+    Unisce più timeline (una per traccia) già ordinate per tick.
+
+    A parità di tick viene mantenuto l'ordine delle tracce e,
+    all'interno della traccia, l'ordine originale del file.
+    """
+    if len(timelines) == 1:
+        return list(timelines[0])
+    return list(heapq.merge(*timelines, key=_tick_key))
+
+
+class EventStore:
+    """
+    Timeline compatta: colonne parallele al posto di una lista di tuple.
+
+    ticks è un array('I'), statuses un bytes con uno status byte per evento,
+    payload i dati di tutti gli eventi concatenati e offsets (array('I'),
+    un elemento in più degli eventi) la posizione dei dati di ciascuno. Il
+    canale si ricava dallo status. Si legge come la lista di tuple
+    (tick, channel, status, data) che sostituisce: iterazione, len,
+    indice e confronto restituiscono gli stessi eventi.
+    """
+
+    __slots__ = ('ticks', 'statuses', 'offsets', 'payload')
+
+    def __init__(self, ticks=None, statuses=b'', offsets=None, payload=b''):
+        self.ticks = ticks if ticks is not None else array('I')
+        self.statuses = statuses
+        self.offsets = offsets if offsets is not None else array('I', (0,))
+        self.payload = payload
+
+    @classmethod
+    def from_events(cls, events):
+        """Costruisce lo store da eventi compilati (tick, channel, status, data)"""
+        if isinstance(events, EventStore):
+            return events
+        events = events if isinstance(events, list) else list(events)
+        offsets = array('I', (0,))
+        offsets.extend(accumulate(len(event[DATA]) for event in events))
+        return cls(array('I', (event[TICK] for event in events)),
+                   bytes(event[STATUS] for event in events),
+                   offsets,
+                   b''.join(event[DATA] for event in events))
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def _event(self, index):
+        status = self.statuses[index]
+        return (self.ticks[index], status & 0x0F if status < 0xF0 else -1, status,
+                self.payload[self.offsets[index]:self.offsets[index + 1]])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._event(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Indice evento fuori dalla timeline")
+        return self._event(index)
+
+    def __iter__(self):
+        payload = self.payload
+        offsets = self.offsets
+        start = 0
+        for index, (tick, status) in enumerate(zip(self.ticks, self.statuses), 1):
+            end = offsets[index]
+            yield (tick, status & 0x0F if status < 0xF0 else -1, status, payload[start:end])
+            start = end
+
+    def __eq__(self, other):
+        if isinstance(other, EventStore):
+            return (self.ticks == other.ticks and self.statuses == other.statuses
+                    and self.offsets == other.offsets and self.payload == other.payload)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"EventStore({len(self)} eventi)"
+
+    def memory_size(self):
+        """Byte occupati dallo store e dalle sue colonne"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.ticks) + sys.getsizeof(self.statuses)
+                + sys.getsizeof(self.offsets) + sys.getsizeof(self.payload))
+
+
+def timeline_ticks(timeline):
+    """Tick degli eventi di una timeline (EventStore o lista di tuple) come array('I')"""
+    if isinstance(timeline, EventStore):
+        return timeline.ticks
+    return array('I', (event[TICK] for event in timeline))
+
+
+def tuple_memory_size(events):
+    """
+    Byte occupati da una timeline come lista di tuple: lista, tuple e
+    oggetti referenziati (ogni oggetto contato una volta sola)
+    """
+    seen = set()
+    total = sys.getsizeof(events)
+    for event in events:
+        total += sys.getsizeof(event)
+        for value in event:
+            if id(value) not in seen:
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+    return total
+
+
+def memory_report(sections):
+    """
+    Confronta la memoria delle timeline di uno style nelle due rappresentazioni.
+
+    La lista di tuple è quella prodotta dal compilatore prima della
+    compattazione: ogni evento ha la sua tupla, il suo int per il tick e il
+    suo bytes per i dati.
+
+    Returns:
+        dict con 'sections' (nome -> events, tuple_bytes, compact_bytes) e i
+        totali 'events', 'tuple_bytes', 'compact_bytes', 'ratio'
+    """
+    report = {'sections': {}, 'events': 0, 'tuple_bytes': 0, 'compact_bytes': 0}
+    for name, section in sections.items():
+        store = EventStore.from_events(section['timeline'])
+        # L'iterazione crea tuple, tick e dati nuovi per ogni evento
+        events = list(store)
+        entry = {
+            'events': len(store),
+            'tuple_bytes': tuple_memory_size(events),
+            'compact_bytes': store.memory_size(),
+        }
+        report['sections'][name] = entry
+        for key in ('events', 'tuple_bytes', 'compact_bytes'):
+            report[key] += entry[key]
+    report['ratio'] = (report['tuple_bytes'] / report['compact_bytes']
+                       if report['compact_bytes'] else 0.0)
+    return report
+
+
+def compile_sections(tracks, section_names):
+    """
+    Compila le tracce di un file .STY in timeline unificate per sezione.
+
+    I marker di sezione (da qualunque traccia) definiscono gli intervalli
+    di tick assoluti di ciascuna sezione; ogni evento di canale di ogni
+    traccia viene assegnato alla sezione che contiene il suo tick.
+
+    Args:
+        tracks: lista di tracce in formato normalizzato, cioè liste di
+            tuple (tick assoluto, status, meta_type, data)
+            (vedi SmfTrack.events() e mido_track_events())
+        section_names: nomi di marker validi come inizio sezione
+
+    Returns:
+        tuple (sections, setup_events):
+            sections: dict nome -> {'timeline', 'length_ticks', 'start_time',
+                'tempo_changes'}; la timeline è un EventStore, tempo_changes è una lista di
+                (tick nella sezione, microsecondi per beat)
+            setup_events: messaggi program_change/control_change prima del primo marker
+    """
+    valid_names = set(section_names)
+
+    # Prima passata: raccogli i marker di sezione e la fine del file
+    boundaries = []
+    marker_tracks = set()
+    end_tick = 0
+    for track_index, track in enumerate(tracks):
+        for tick, status, meta_type, data in track:
+            if status == META and meta_type == META_MARKER:
+                text = data.decode('latin1')
+                if text in valid_names:
+                    boundaries.append((tick, text))
+                    marker_tracks.add(track_index)
+        if track:
+            end_tick = max(end_tick, track[-1][0])
+    boundaries.sort(key=itemgetter(0))
+
+    # Intervalli [start, end) di ciascuna sezione
+    ranges = []
+    for index, (start, name) in enumerate(boundaries):
+        end = boundaries[index + 1][0] if index + 1 < len(boundaries) else end_tick
+        ranges.append((start, end, name))
+
+    sections = {}
+    for start, end, name in ranges:
+        if name not in sections:
+            sections[name] = {
+                'timeline': EventStore(),
+                'length_ticks': end - start,
+                'start_time': start,
+                'tempo_changes': []
+            }
+
+    # Seconda passata: assegna gli eventi di ogni traccia alle sezioni
+    setup_events = []
+    per_section = {name: [] for name in sections}
+
+    for track_index, track in enumerate(tracks):
+        range_index = -1
+        has_markers = track_index in marker_tracks
+        track_events = {}
+
+        for tick, status, meta_type, data in track:
+            if status == META:
+                # Nella traccia dei marker conta l'ordine del file: gli eventi
+                # allo stesso tick ma prima del marker chiudono la sezione precedente
+                if meta_type == META_MARKER and data.decode('latin1') in valid_names:
+                    while range_index + 1 < len(ranges) and ranges[range_index + 1][0] <= tick:
+                        range_index += 1
+                elif meta_type == META_SET_TEMPO and len(data) >= 3:
+                    tempo_range = range_index
+                    if not has_markers:
+                        while tempo_range + 1 < len(ranges) and ranges[tempo_range + 1][0] <= tick:
+                            tempo_range += 1
+                    if tempo_range >= 0:
+                        start, _, name = ranges[tempo_range]
+                        sections[name]['tempo_changes'].append(
+                            (tick - start, int.from_bytes(data[:3], 'big')))
+                continue
+
+            # Nelle altre tracce decide il tick; i note-off esattamente sul
+            # confine appartengono ancora alla sezione precedente
+            if not has_markers:
+                while range_index + 1 < len(ranges):
+                    next_start = ranges[range_index + 1][0]
+                    if tick > next_start or (
+                            tick == next_start and not _is_note_off(status, data)):
+                        range_index += 1
+                    else:
+                        break
+
+            # Eventi prima del primo marker: setup iniziale
+            if range_index < 0:
+                if status & 0xF0 in (CONTROL_CHANGE, PROGRAM_CHANGE):
+                    setup_events.append(event_to_message(status, data))
+                continue
+
+            start, _, name = ranges[range_index]
+            channel = status & 0x0F if status < 0xF0 else -1
+            track_events.setdefault(name, []).append((tick - start, channel, status, data))
+
+        for name, events in track_events.items():
+            per_section[name].append(events)
+
+    for name, section in sections.items():
+        if per_section[name]:
+            section['timeline'] = EventStore.from_events(merge_timelines(per_section[name]))
+        section['tempo_changes'].sort(key=itemgetter(0))
+
+    return sections, setup_events
+
+
+class CompiledStyle:
+    """Contenitore dei dati compilati di uno style, pronti per il playback"""
+
+    def __init__(self, style_name=None, tempo_bpm=120, ticks_per_beat=480,
+                 time_signature_numerator=4, time_signature_denominator=4,
+                 sections=None, setup_events=None, casm_data=b''):
+        self.style_name = style_name
+        self.tempo_bpm = tempo_bpm
+        self.ticks_per_beat = ticks_per_beat
+        self.time_signature_numerator = time_signature_numerator
+        self.time_signature_denominator = time_signature_denominator
+        self.sections = sections if sections is not None else {}
+        self.setup_events = setup_events if setup_events is not None else []
+        # Corpo grezzo del chunk CASM (decodificato con style_casm.parse_casm)
+        self.casm_data = casm_data
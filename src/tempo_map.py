@@ -0,0 +1,110 @@
+"""
+TempoMap - Conversione tick <-> secondi con cambi di tempo e rampe
+"""
+
+import math
+import threading
+from bisect import bisect_right
+
+
+class TempoMap:
+    """
+    Mappa tick -> secondi a partire dal tick 0.
+
+    È una lista di segmenti (tick, secondi, bpm iniziale, bpm finale, tick di
+    rampa): dentro la rampa i bpm variano linearmente coi tick
+    (accelerando/ritardando), dopo restano al valore finale.
+
+    Le letture non prendono lock: ogni modifica sostituisce l'intera tabella,
+    quindi il thread di playback vede sempre una versione coerente.
+    """
+
+    def __init__(self, ticks_per_beat, bpm=120.0):
+        self.ticks_per_beat = ticks_per_beat
+        self._lock = threading.Lock()
+        # (lista tick di inizio, lista secondi di inizio, segmenti)
+        self._table = ([0], [0.0], [(0, 0.0, float(bpm), float(bpm), 0)])
+
+    def _seconds_per_tick(self, bpm):
+        return 60.0 / (bpm * self.ticks_per_beat)
+
+    def _segment_time(self, segment, ticks):
+        """Secondi trascorsi dopo ticks tick dall'inizio del segmento"""
+        _, _, bpm_start, bpm_end, ramp_ticks = segment
+        if ramp_ticks <= 0:
+            return ticks * self._seconds_per_tick(bpm_end)
+
+        ramp = min(ticks, ramp_ticks)
+        if bpm_end == bpm_start:
+            seconds = ramp * self._seconds_per_tick(bpm_start)
+        else:
+            # Integrale di 60 / (tpb * bpm(x)) con bpm lineare nei tick
+            slope = (bpm_end - bpm_start) / ramp_ticks
+            bpm_at = bpm_start + slope * ramp
+            seconds = 60.0 / (self.ticks_per_beat * slope) * math.log(bpm_at / bpm_start)
+        if ticks > ramp_ticks:
+            seconds += (ticks - ramp_ticks) * self._seconds_per_tick(bpm_end)
+        return seconds
+
+    def _segment_ticks(self, segment, seconds):
+        """Inverso di _segment_time"""
+        _, _, bpm_start, bpm_end, ramp_ticks = segment
+        if ramp_ticks <= 0:
+            return seconds / self._seconds_per_tick(bpm_end)
+
+        ramp_time = self._segment_time(segment, ramp_ticks)
+        if seconds >= ramp_time:
+            return ramp_ticks + (seconds - ramp_time) / self._seconds_per_tick(bpm_end)
+        if bpm_end == bpm_start:
+            return seconds / self._seconds_per_tick(bpm_start)
+        slope = (bpm_end - bpm_start) / ramp_ticks
+        bpm_at = bpm_start * math.exp(seconds * self.ticks_per_beat * slope / 60.0)
+        return (bpm_at - bpm_start) / slope
+
+    def time_at(self, tick):
+        """Secondi dal tick 0 al tick dato"""
+        ticks, _, segments = self._table
+        segment = segments[bisect_right(ticks, tick) - 1]
+        return segment[1] + self._segment_time(segment, tick - segment[0])
+
+    def tick_at(self, seconds):
+        """Tick (frazionario) raggiunto dopo seconds secondi dal tick 0"""
+        _, times, segments = self._table
+        segment = segments[max(0, bisect_right(times, seconds) - 1)]
+        return segment[0] + self._segment_ticks(segment, max(0.0, seconds - segment[1]))
+
+    def tempo_at(self, tick):
+        """BPM al tick dato"""
+        ticks, _, segments = self._table
+        start, _, bpm_start, bpm_end, ramp_ticks = segments[bisect_right(ticks, tick) - 1]
+        offset = tick - start
+        if ramp_ticks <= 0 or offset >= ramp_ticks:
+            return bpm_end
+        return bpm_start + (bpm_end - bpm_start) * offset / ramp_ticks
+
+    def segments(self):
+        """Segmenti attuali come lista di (tick, bpm iniziale, bpm finale, tick di rampa)"""
+        return [(tick, bpm_start, bpm_end, ramp_ticks)
+                for tick, _, bpm_start, bpm_end, ramp_ticks in self._table[2]]
+
+    def set_tempo(self, tick, bpm, ramp_ticks=0):
+        """
+        Imposta il tempo a partire da tick (i cambi successivi vengono scartati).
+
+        Args:
+            tick: tick da cui vale il nuovo tempo
+            bpm: tempo di destinazione
+            ramp_ticks: 0 = cambio immediato, altrimenti durata in tick della
+                rampa lineare dal tempo attuale a bpm
+        """
+        with self._lock:
+            tick = max(0, int(tick))
+            start_bpm = self.tempo_at(tick) if ramp_ticks > 0 else float(bpm)
+            seconds = self.time_at(tick)
+
+            ticks, times, segments = self._table
+            keep = bisect_right(ticks, tick - 1) if tick > 0 else 0
+            new_segment = (tick, seconds, start_bpm, float(bpm), max(0, int(ramp_ticks)))
+            self._table = (ticks[:keep] + [tick],
+                           times[:keep] + [seconds],
+                           segments[:keep] + [new_segment])
@@ -0,0 +1,158 @@
+"""
+TimingStats - Istogrammi dei ritardi e contatori del playback
+"""
+
+from array import array
+
+
+SUB_BUCKET_BITS = 5      # 32 sotto-intervalli lineari per ottava: errore massimo ~3%
+MAX_VALUE_US = 1 << 26   # ~67 secondi: oltre si registra nell'ultimo intervallo
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Istogramma a precisione relativa costante (stile HDR) di valori in microsecondi.
+
+    Fino a 2 * 32 us ogni valore ha il suo intervallo; oltre, ogni ottava è
+    divisa in 32 intervalli lineari. Registrare costa un calcolo di indice e
+    un incremento, la memoria è fissa (~700 contatori) qualunque sia il
+    numero di campioni: può restare attivo per tutta una serata.
+    """
+
+    __slots__ = ('counts', 'total', 'sum_us', 'min_us', 'max_us')
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * (self._index(MAX_VALUE_US) + 1)))
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.total = 0
+        self.sum_us = 0
+        self.min_us = 0
+        self.max_us = 0
+
+    @staticmethod
+    def _index(value):
+        if value < (2 << SUB_BUCKET_BITS):
+            return value
+        magnitude = value.bit_length() - SUB_BUCKET_BITS - 1
+        return ((magnitude + 1) << SUB_BUCKET_BITS) + (value >> magnitude) - (1 << SUB_BUCKET_BITS)
+
+    @staticmethod
+    def _highest_value(index):
+        """Valore più alto che finisce nell'intervallo index"""
+        if index < (2 << SUB_BUCKET_BITS):
+            return index
+        magnitude = (index >> SUB_BUCKET_BITS) - 1
+        sub_bucket = (index & ((1 << SUB_BUCKET_BITS) - 1)) + (1 << SUB_BUCKET_BITS)
+        return ((sub_bucket + 1) << magnitude) - 1
+
+    def record(self, value_us, count=1):
+        """Registra count campioni del valore value_us (interi, negativi = 0)"""
+        value = min(max(int(value_us), 0), MAX_VALUE_US)
+        self.counts[self._index(value)] += count
+        if not self.total or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+        self.total += count
+        self.sum_us += value * count
+
+    def record_seconds(self, seconds, count=1):
+        self.record(seconds * 1000000.0, count)
+
+    def percentile(self, pct):
+        """Valore (us) sotto cui cade pct% dei campioni (0 se vuoto)"""
+        if not self.total:
+            return 0
+        target = max(1, int(self.total * pct / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            if seen >= target:
+                return min(self._highest_value(index), self.max_us)
+        return self.max_us
+
+    def mean(self):
+        return self.sum_us / self.total if self.total else 0.0
+
+    def get_stats(self):
+        """Riepilogo in millisecondi: count, mean, min, max e percentili"""
+        stats = {
+            'count': self.total,
+            'mean_ms': self.mean() / 1000.0,
+            'min_ms': self.min_us / 1000.0,
+            'max_ms': self.max_us / 1000.0,
+        }
+        for pct in PERCENTILES:
+            stats[f'p{pct:g}_ms'] = self.percentile(pct) / 1000.0
+        return stats
+
+    def __len__(self):
+        return self.total
+
+
+class TimingStats:
+    """
+    Strumentazione del loop di playback.
+
+    Per ogni burst registra il ritardo dell'invio rispetto alla scadenza
+    (thread di playback in ritardo) e la durata della chiamata alla porta
+    (porta lenta), una volta per ogni evento del burst. I contatori dicono
+    quanti eventi sono stati inviati, filtrati (filtro accordo, note
+    melodiche bloccate, regole CASM), gli errori di invio, i giri di
+    sezione e le attese interrotte. I note off scartati li conta ActiveNotes.
+
+    Aggiornato dal thread di playback; dietro a un MidiDispatcher ritardo,
+    durata ed eventi inviati li registra il thread del dispatcher, quando
+    scrive davvero sulla porta. La lettura da altri thread dà una
+    fotografia non atomica, adeguata per la diagnostica.
+    """
+
+    __slots__ = ('lateness', 'send_time', 'events_sent', 'events_filtered', 'send_errors',
+                 'loop_restarts', 'interrupted_waits')
+
+    def __init__(self):
+        self.lateness = LatencyHistogram()
+        self.send_time = LatencyHistogram()
+        self.reset()
+
+    def reset(self):
+        self.lateness.reset()
+        self.send_time.reset()
+        self.events_sent = 0
+        self.events_filtered = 0
+        self.send_errors = 0
+        self.loop_restarts = 0
+        self.interrupted_waits = 0
+
+    def record_send(self, deadline, started, finished, count):
+        """
+        Registra l'invio di count eventi con scadenza deadline.
+
+        Args:
+            deadline: istante previsto (secondi, orologio dello scheduler)
+            started: istante di inizio della chiamata alla porta
+            finished: istante di fine della chiamata
+        """
+        if not count:
+            return
+        self.lateness.record((started - deadline) * 1000000.0, count)
+        self.send_time.record((finished - started) * 1000000.0, count)
+        self.events_sent += count
+
+    def get_stats(self):
+        return {
+            'events_sent': self.events_sent,
+            'events_filtered': self.events_filtered,
+            'send_errors': self.send_errors,
+            'loop_restarts': self.loop_restarts,
+            'interrupted_waits': self.interrupted_waits,
+            'lateness': self.lateness.get_stats(),
+            'send_time': self.send_time.get_stats(),
+        }
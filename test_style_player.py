@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Test della classe StylePlayer"""
 
+import os
 import sys
 sys.path.insert(0, 'src')
 
@@ -15,7 +16,7 @@ print("=" * 80)
 player = StylePlayer()
 
 # Carica uno style
-sty_file = r'sty\stili_miei\Swing1.S733.sty'
+sty_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join('sty', 'stili_miei', 'Swing1.S733.sty')
 print(f"\n[1] Caricamento file: {sty_file}")
 
 if player.load_style(sty_file):
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Configurazione pytest: rende importabili i moduli di src/ come fanno gli script di esempio
+e fornisce il fixture rig condiviso dai test di playback.
+"""
+
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from clocks import VirtualClock  # noqa: E402
+from midi_output import RecordingPort  # noqa: E402
+from style_player import StylePlayer  # noqa: E402
+
+
+@pytest.fixture
+def rig(request):
+    """
+    StylePlayer in tempo virtuale a 120 BPM (1 battuta = 2 s) che suona su una
+    RecordingPort. Il modulo di test può definire rig_style(player) per
+    installare le sue sezioni e il setup. Ritorna (player, clock, port).
+    """
+    clock = VirtualClock(start=100.0)
+    player = StylePlayer(clock=clock)
+    port = RecordingPort(clock)
+    player.set_midi_output(port)
+    player.tempo_bpm = 120
+    player.prefetch_variants = False
+    rig_style = getattr(request.module, 'rig_style', None)
+    if rig_style is not None:
+        rig_style(player)
+    return player, clock, port
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il riconoscimento accordi a tabella (maschera delle classi di nota).
+"""
+
+from chord_recognizer import ChordRecognizer
+
+# Vocabolario del riconoscitore prima dell'estensione
+LEGACY_PATTERNS = dict(list(ChordRecognizer.CHORD_PATTERNS.items())[:13])
+
+
+class _LegacyRecognizer:
+    """
+    Algoritmo precedente alla tabella, copiato com'era. Unica differenza:
+    le root candidate si provano nell'ordine dato da order (l'originale
+    iterava il set, il cui ordine dipende da come sono state premute le note).
+    """
+
+    NOTE_NAMES = ChordRecognizer.NOTE_NAMES
+    CHORD_PATTERNS = LEGACY_PATTERNS
+
+    def __init__(self, order=sorted):
+        self.active_notes = set()
+        self.current_chord = None
+        self.bass_note = None
+        self.order = order
+
+    def _analyze_chord(self):
+        if len(self.active_notes) == 0:
+            self.current_chord = None
+            self.bass_note = None
+            return
+
+        note_classes = set(note % 12 for note in self.active_notes)
+        self.bass_note = min(self.active_notes) % 12
+
+        if len(note_classes) == 1:
+            root = list(note_classes)[0]
+            self.current_chord = {
+                'root': root,
+                'root_name': self.NOTE_NAMES[root],
+                'type': 'single',
+                'type_name': '',
+                'notes': note_classes,
+                'bass': self.bass_note
+            }
+            return
+
+        best_match = None
+        best_score = 0
+
+        for potential_root in self.order(note_classes):
+            for chord_type, pattern in self.CHORD_PATTERNS.items():
+                expected_notes = set((potential_root + interval) % 12 for interval in pattern)
+                matches = len(note_classes & expected_notes)
+                total = len(note_classes | expected_notes)
+                score = matches / total if total > 0 else 0
+                if note_classes >= expected_notes:
+                    score += 0.5
+
+                if score > best_score:
+                    best_score = score
+                    best_match = {
+                        'root': potential_root,
+                        'root_name': self.NOTE_NAMES[potential_root],
+                        'type': chord_type,
+                        'type_name': chord_type,
+                        'notes': note_classes,
+                        'bass': self.bass_note,
+                        'confidence': score
+                    }
+
+        if best_match and best_score > 0.6:
+            self.current_chord = best_match
+        else:
+            root = min(note_classes)
+            self.current_chord = {
+                'root': root,
+                'root_name': self.NOTE_NAMES[root],
+                'type': 'unknown',
+                'type_name': '?',
+                'notes': note_classes,
+                'bass': self.bass_note,
+                'confidence': best_score
+            }
+
+
+def _legacy_chord(notes, order=sorted):
+    legacy = _LegacyRecognizer(order)
+    legacy.active_notes.update(notes)
+    legacy._analyze_chord()
+    return legacy.current_chord
+
+
+def test_table_matches_legacy_algorithm_for_every_mask():
+    recognizer = ChordRecognizer(patterns=LEGACY_PATTERNS, rootless=False)
+    for mask in range(1, 4096):
+        # Basso una ottava sotto, così la nota più bassa non è sempre la root
+        classes = [pc for pc in range(12) if mask >> pc & 1]
+        notes = [36 + classes[-1]] + [60 + pc for pc in classes]
+
+        recognizer.clear()
+        for note in notes:
+            recognizer.note_on(note)
+        chord = recognizer.get_current_chord()
+        legacy = _legacy_chord(notes)
+
+        # Lo score non dipende dall'ordine di prova delle root
+        assert chord.get('confidence') == legacy.get('confidence') == \
+            _legacy_chord(notes, list).get('confidence'), mask
+
+        # Con un solo accordo migliore il risultato è identico; a parità di
+        # score la tabella preferisce la root uguale al basso
+        if legacy == _legacy_chord(notes, lambda classes: sorted(classes, reverse=True)):
+            assert chord == legacy, mask
+
+
+def test_extended_vocabulary_inversions_and_rootless():
+    recognizer = ChordRecognizer()
+
+    def name(*notes):
+        recognizer.clear()
+        for note in notes:
+            recognizer.note_on(note)
+        return recognizer.get_chord_name()
+
+    assert name(60, 64, 67, 70, 74) == 'C9'
+    assert name(60, 62, 64, 67) == 'Cadd9'
+    assert name(60, 64, 67, 70, 73) == 'C7b9'
+    assert name(60, 64, 68, 70) == 'C7#5'
+    assert name(60, 65, 67, 70) == 'C7sus4'
+    assert name(55, 62) == 'G5'
+    assert name(48, 64, 67, 69, 74) == 'C6/9'
+
+    # Stesse note, lettura decisa dal basso
+    assert name(57, 60, 64, 67) == 'Amin7'
+    assert name(48, 57, 64, 67) == 'C6'
+    assert name(52, 60, 67) == 'CMaj/E'
+    assert recognizer.get_slash_bass() == 4
+
+    # Voicing senza root (terza, settima, nona): nessun basso slash
+    assert name(64, 70, 74) == 'C9'
+    assert recognizer.get_current_chord()['notes'] == {4, 10, 2}
+    assert recognizer.get_slash_bass() is None
+    # Se le stesse note formano un accordo con root, vince quello
+    assert name(64, 67, 70, 74) == 'Em7b5'
+
+    # Preferenze configurabili: 6 prima di min7
+    preferring = ChordRecognizer(preferences=['6'])
+    for note in (52, 57, 60, 67):
+        preferring.note_on(note)
+    assert preferring.get_chord_name() == 'C6/E'
+
+
+def test_note_off_keeps_pitch_class_held_in_another_octave():
+    recognizer = ChordRecognizer()
+    for note in (48, 60, 64, 67):
+        recognizer.note_on(note)
+    recognizer.note_on(60)  # già premuta: nessun effetto
+    recognizer.note_off(60)
+    assert recognizer.get_chord_name() == 'CMaj'
+
+    recognizer.note_off(48)
+    assert recognizer.get_current_chord()['notes'] == {4, 7}
+    recognizer.note_off(71)  # mai premuta
+    recognizer.note_on(59)
+    assert recognizer.get_chord_name() == 'Emin/B'
+
+    for note in (59, 64, 67):
+        recognizer.note_off(note)
+    assert recognizer.get_current_chord() is None
+    assert recognizer._mask == 0
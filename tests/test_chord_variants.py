@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Test per la cache delle varianti renderizzate per accordo.
+"""
+
+import os
+
+import mido
+import pytest
+
+from chord_variants import ChordVariantCache, VariantKey, render_variant
+from style_player import StylePlayer
+from style_timeline import event_to_message
+
+STYLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'sty', 'stili_miei', 'Swing1.S733.sty')
+
+
+@pytest.fixture(scope='module')
+def player():
+    player = StylePlayer()
+    assert player.load_style(STYLE_FILE)
+    return player
+
+
+def _reference_messages(section, transpose, chord_filter, melodic):
+    """Regole applicate evento per evento dal vecchio loop di playback"""
+    messages = []
+    for tick, channel, status, data in section['timeline']:
+        kind = status & 0xF0
+        if kind in (0x80, 0x90) and channel != 9:
+            if not melodic:
+                continue
+            note = max(0, min(127, data[0] + transpose))
+            if chord_filter is not None and note % 12 not in chord_filter:
+                continue
+            messages.append((tick, mido.Message.from_bytes([status, note, data[1]])))
+        else:
+            messages.append((tick, event_to_message(status, data)))
+    return messages
+
+
+@pytest.mark.parametrize('transpose, chord_filter, melodic', [
+    (0, None, True),
+    (5, None, True),
+    (-6, {2, 5, 9}, True),
+    (3, None, False),
+])
+def test_variant_matches_per_event_rules(player, transpose, chord_filter, melodic):
+    cache = ChordVariantCache()
+    cache.set_sections(player.sections)
+    section = player.sections['Main A']
+
+    variant = cache.get(VariantKey('Main A', transpose=transpose, chord_filter=chord_filter,
+                                   melodic=melodic))
+    expected = _reference_messages(section, transpose, chord_filter, melodic)
+
+    assert list(variant.ticks) == [tick for tick, _ in expected]
+    assert variant.messages == [bytes(msg.bytes()) for _, msg in expected]
+    assert variant.length_ticks == section['length_ticks']
+
+
+def test_variant_cache_hits_and_lru(player):
+    cache = ChordVariantCache(max_variants=2)
+    cache.set_sections(player.sections)
+
+    first = cache.get(VariantKey('Main A', transpose=2))
+    assert cache.get(VariantKey('Main A', transpose=2)) is first
+    cache.get(VariantKey('Main B', transpose=2))
+    cache.get(VariantKey('Main C', transpose=2))
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 3, 1)
+    assert not cache.contains(VariantKey('Main A', transpose=2))
+    assert cache.get(VariantKey('Missing')) is None
+
+
+def test_variants_share_unchanged_messages(player):
+    cache = ChordVariantCache()
+    cache.set_sections(player.sections)
+    c_major = cache.get(VariantKey('Main A', transpose=0))
+    drums_only = cache.get(VariantKey('Main A', transpose=0, melodic=False))
+
+    shared = {id(msg) for msg in c_major.messages}
+    assert all(id(msg) in shared for msg in drums_only.messages)
+
+
+def test_style_change_during_render_leaves_new_cache_clean(player):
+    def renderer(section, key, message_for, **kwargs):
+        cache.set_sections({'Main A': dict(section)})  # nuovo style a metà render
+        return render_variant(section, key, message_for, **kwargs)
+
+    cache = ChordVariantCache(renderer=renderer)
+    cache.set_sections(player.sections, player.casm)
+    variant = cache.get(VariantKey('Main A', root=2, chord_type='min7'))
+
+    # La variante torna al chiamante, ma nulla del vecchio style entra nella cache
+    assert variant.messages
+    assert cache.get_stats()['variants'] == 0
+    assert cache.get_stats()['shared_messages'] == 0
+
+
+def test_set_chord_swaps_stream(player):
+    player.current_section = 'Main A'
+    player.set_chord(7, 'Maj')
+    g_major = player._stream
+    assert g_major.key.transpose == 7 - 12
+
+    player.set_chord(2, 'min7')
+    assert player._stream is not g_major
+    player.set_chord(7, 'Maj')
+    assert player._stream is g_major
+
+    player.set_block_melodic_notes(True)
+    assert player._stream.key.melodic is False
+    player.set_chord(7, 'Maj')
+    assert player._stream is g_major
+    player.current_section = None
+
+
+def test_chord_variant_applies_channel_rules(player):
+    cache = ChordVariantCache()
+    cache.set_sections(player.sections, player.casm)
+    variant = cache.get(VariantKey('Main A', root=7, chord_type='min7'))
+
+    bass = [msg[1] for msg in variant.messages if msg[0] == 0x92 and msg[2] > 0]
+    assert bass and all(28 <= note <= 41 for note in bass)
+    drums = [msg[1] for msg in variant.messages if msg[0] == 0x99]
+    expected = [data[0] for _, channel, status, data in player.sections['Main A']['timeline']
+                if status == 0x99]
+    assert drums == expected
+
+
+def test_style_without_casm_keeps_original_intervals(player):
+    cache = ChordVariantCache()
+    cache.set_sections(player.sections, {})
+    variant = cache.get(VariantKey('Main A', root=2, chord_type='min7'))
+
+    # Niente regole CASM: ogni nota sale di un tono, nessun adattamento all'accordo
+    source = [(status, data[0]) for _, _, status, data in player.sections['Main A']['timeline']
+              if status & 0xE0 == 0x80 and status & 0x0F != 9 and data[1] > 0]
+    played = [(msg[0], msg[1]) for msg in variant.messages
+              if msg[0] & 0xE0 == 0x80 and msg[0] & 0x0F != 9 and msg[2] > 0]
+    assert played == [(status, note + 2) for status, note in source]
+
+
+def test_slash_chord_moves_only_bass_channels(player):
+    cache = ChordVariantCache()
+    cache.set_sections(player.sections, player.casm)
+    c_major = cache.get(VariantKey('Main A', root=0, chord_type='Maj'))
+    c_over_e = cache.get(VariantKey('Main A', root=0, chord_type='Maj', bass=4))
+
+    def notes(variant, status):
+        return [msg[1] for msg in variant.messages if msg[0] == status and msg[2] > 0]
+
+    # Canale 3 (basso, Bass attivo) segue E; il pad (canale 8) resta su C
+    assert notes(c_over_e, 0x92) != notes(c_major, 0x92)
+    assert {note % 12 for note in notes(c_over_e, 0x92)} & {4}
+    assert notes(c_over_e, 0x97) == notes(c_major, 0x97)
+
+    player.current_section = 'Main A'
+    player.set_chord(0, 'Maj', 0)
+    assert player._stream.key.bass is None
+    player.set_chord(0, 'Maj', 4)
+    assert player._stream.key.bass == 4
+    player.set_chord(0, 'Maj')
+    player.current_section = None
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Test per i comandi da riga di comando (render, info, parsing degli accordi).
+"""
+
+import json
+import os
+
+import mido
+import pytest
+
+import cli
+
+STYLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'sty', 'stili_miei')
+STYLE_FILE = os.path.join(STYLE_DIR, 'Swing1.S733.sty')
+
+
+def test_parse_chord_and_change():
+    assert cli.parse_chord('C') == (0, 'Maj')
+    assert cli.parse_chord('F#m7') == (6, 'min7')
+    assert cli.parse_chord('Bb7') == (10, '7')
+    assert cli.parse_chord('Cbmaj7') == (11, 'Maj7')
+    assert cli.parse_chord('ebm7b5') == (3, 'm7b5')
+    assert cli.parse_chord('Bb13') == (10, '13')
+    assert cli.parse_chord('C6/9') == (0, '6/9')
+    assert cli.parse_chord('C/E') == (0, 'Maj', 4)
+    assert cli.parse_chord('Am7/G') == (9, 'min7', 7)
+    with pytest.raises(ValueError):
+        cli.parse_chord('H7')
+    with pytest.raises(ValueError):
+        cli.parse_chord('Cxyz')
+
+    assert cli.parse_change('1:Intro A:C') == (1, 'Intro A', (0, 'Maj'))
+    assert cli.parse_change('5::G7') == (5, None, (7, '7'))
+    assert cli.parse_change('9:Ending A') == (9, 'Ending A', None)
+    with pytest.raises(ValueError):
+        cli.parse_change('Intro A')
+
+
+def test_render_writes_midi_file(tmp_path, capsys):
+    output = str(tmp_path / 'song.mid')
+    result = cli.main(['render', '--no-cache', STYLE_FILE, output,
+                       '1:main a:C', '3::G7', '--bars', '4', '--tempo', '120'])
+    assert result == 0
+    midi_file = mido.MidiFile(output)
+    assert any(msg.type == 'note_on' for msg in midi_file.tracks[0])
+    assert 'renderizzati' in capsys.readouterr().out
+
+    assert cli.main(['render', '--no-cache', STYLE_FILE, output, '1:Main Z:C']) == 1
+
+
+def test_info_json_and_directory(capsys):
+    assert cli.main(['info', '--no-cache', '--json', STYLE_FILE]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert len(stats) == 1
+    assert stats[0]['name'] == 'Swing1.S733.sty'
+    assert stats[0]['time_signature'] == '4/4'
+    assert 'Main A' in stats[0]['sections']
+    assert stats[0]['sections']['Main A']['notes'] > 0
+
+    assert cli.main(['info', '--no-cache', STYLE_DIR]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    files = [line for line in lines if not line.startswith(' ')]
+    assert files == cli.find_styles([STYLE_DIR])
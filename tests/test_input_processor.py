@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il thread di input: debounce degli accordi e stato per la GUI.
+"""
+
+import time
+
+import mido
+
+from input_processor import InputProcessor
+
+
+class _Player:
+    """Registra le chiamate che l'input processor fa allo style player"""
+
+    def __init__(self):
+        self.calls = []
+        self.playing = False
+
+    def set_chord(self, root, chord_type, bass=None):
+        self.calls.append(('chord', root, chord_type, bass))
+
+    def is_playing(self):
+        return self.playing
+
+    def stop_melodic_notes(self, hold_drums=True):
+        self.calls.append(('stop', hold_drums))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _rig(**kwargs):
+    player = _Player()
+    clock = _Clock()
+    posted = []
+    processor = InputProcessor(player, clock=clock, on_display=lambda: posted.append(1),
+                               **kwargs)
+    return processor, player, clock, posted
+
+
+def _press(processor, *notes):
+    for note in notes:
+        processor.put(mido.Message('note_on', note=note, velocity=90))
+
+
+def test_chord_applied_once_after_debounce():
+    processor, player, clock, posted = _rig()
+    _press(processor, 48)
+    assert processor.poll() == 0.05
+    clock.now = 0.02
+    _press(processor, 52, 43)
+    processor.put(mido.Message('control_change', control=64, value=127))
+    assert processor.poll() == 0.05
+
+    clock.now = 0.069
+    assert processor.poll() is not None
+    assert player.calls == []
+
+    clock.now = 0.07
+    assert processor.poll() is None
+    assert player.calls == [('chord', 0, 'Maj', None)]
+    assert processor.chords_applied == 1
+
+    # Tre cambi prima che la GUI legga: una sola notifica, con l'ultimo stato
+    assert posted == [1]
+    assert processor.get_display_state() == {'name': 'CMaj', 'held': False}
+
+
+def test_release_stops_melody_or_holds_last_chord():
+    started = []
+    processor, player, clock, posted = _rig(debounce_ms=0, on_start=started.append)
+    _press(processor, 45, 48, 52)
+    processor.poll()
+    assert started[-1]['name'] == 'Amin'
+
+    player.playing = True
+    for note in (45, 48, 52):
+        processor.note_off(note)
+    processor.poll()
+    assert player.calls[-1] == ('stop', True)
+    assert processor.get_display_state() == {'name': None, 'held': False}
+
+    processor.hold_chord = True
+    processor.note_on(50, 90)
+    processor.note_off(50)
+    processor.poll()
+    assert player.calls[-1] == ('chord', 2, 'single', None)
+    assert processor.get_display_state() == {'name': 'D', 'held': True}
+
+
+def test_thread_applies_chord_with_real_clock():
+    player = _Player()
+    processor = InputProcessor(player, debounce_ms=20)
+    processor.start()
+    try:
+        start = time.perf_counter()
+        _press(processor, 43, 47, 50)
+        while not player.calls and time.perf_counter() - start < 2.0:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+    finally:
+        processor.stop()
+
+    assert player.calls == [('chord', 7, 'Maj', None)]
+    assert 0.02 <= elapsed < 0.5
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il buffer dei tasti ridisegnati a ogni frame.
+"""
+
+import threading
+
+from key_display import KEY_COLORS, VELOCITY_COLORS, KeyDisplayBuffer
+
+
+def test_palette_matches_per_note_formula():
+    for velocity in (1, 64, 100, 127):
+        intensity = int((velocity / 127) * 100) + 155
+        assert VELOCITY_COLORS[velocity] == f"#{intensity:02x}{intensity//2:02x}{intensity//2:02x}"
+    assert (KEY_COLORS[60], KEY_COLORS[61]) == ('white', 'black')
+
+
+def test_only_net_changes_reach_the_frame():
+    buffer = KeyDisplayBuffer()
+    buffer.note_on(60, 100)
+    buffer.note_on(62, 80)
+    buffer.note_off(62)          # premuto e rilasciato nello stesso frame
+    buffer.chord_changed()
+    assert buffer.take() == ({60: VELOCITY_COLORS[100]}, True)
+    assert buffer.take() == ({}, False)
+
+    buffer.note_off(60)
+    buffer.note_on(60, 100)      # stesso colore già a schermo
+    buffer.note_on(64, 90)
+    buffer.note_on(64, 127)      # vale l'ultima velocity
+    assert buffer.take() == ({64: VELOCITY_COLORS[127]}, False)
+
+    buffer.note_off(60)
+    buffer.note_off(64)
+    buffer.note_off(67)          # mai acceso
+    assert buffer.take() == ({60: None, 64: None}, False)
+    assert buffer.shown == {}
+    assert buffer.frames == 3
+
+
+def test_glissando_from_threads_is_one_frame():
+    buffer = KeyDisplayBuffer()
+
+    def glissando(start):
+        for note in range(start, start + 24):
+            buffer.note_on(note, 100)
+            buffer.note_off(note)
+        buffer.note_on(start + 24, 100)
+
+    threads = [threading.Thread(target=glissando, args=(start,)) for start in (36, 72)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    keys, _ = buffer.take()
+    assert keys == {60: VELOCITY_COLORS[100], 96: VELOCITY_COLORS[100]}
+    assert buffer.changes == 2 * 49
+
+
+class _InterleavingLock:
+    """Lock che alla prima acquisizione fa arrivare un chord_changed da un altro thread"""
+
+    def __init__(self, buffer):
+        self.lock = threading.Lock()
+        self.buffer = buffer
+        self.thread = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.buffer.chord_changed)
+            self.thread.start()
+            self.thread.join(0.05)
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+def test_chord_change_during_take_is_not_lost():
+    buffer = KeyDisplayBuffer()
+    buffer.chord_changed()
+    buffer._lock = _InterleavingLock(buffer)
+
+    # Il cambio arriva mentre take() legge e azzera il flag: vale per il frame dopo
+    assert buffer.take() == ({}, True)
+    buffer._lock.thread.join()
+    assert buffer.take() == ({}, True)
+    assert buffer.take() == ({}, False)
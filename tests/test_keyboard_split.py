@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Test per lo split della tastiera e le diteggiature accordi.
+"""
+
+import mido
+
+from keyboard_split import (FINGERING_AI, FINGERING_FULL, FINGERING_ON_BASS,
+                            FINGERING_SINGLE, KeyboardSplit)
+from midi_output import RecordingPort
+
+
+def _split(**kwargs):
+    chords = []
+    port = RecordingPort()
+    split = KeyboardSplit(port, live_channel=3, on_chord=chords.append, **kwargs)
+    return split, port, chords
+
+
+def _names(chords):
+    return [chord['name'] if chord else None for chord in chords]
+
+
+def _sent(port):
+    return [(msg.type, msg.channel, msg.note) for _, msg in port.messages()]
+
+
+def test_melody_above_split_plays_live_and_leaves_chord_alone():
+    split, port, chords = _split()
+    for note in (43, 48, 52):
+        split.note_on(note, 90)
+    assert chords[-1]['name'] == 'CMaj'
+    changes = len(chords)
+
+    split.note_on(71, 100)   # B4: insieme alla zona accordi sarebbe CMaj7
+    split.note_on(74, 100)
+    split.note_off(71)
+    assert len(chords) == changes
+    assert _sent(port) == [('note_on', 3, 71), ('note_on', 3, 74), ('note_off', 3, 71)]
+
+    # Cambio canale con la nota tenuta: il note off va dove era partita
+    split.live_channel = 5
+    split.note_off(74)
+    assert _sent(port)[-1] == ('note_off', 3, 74)
+
+    for note in (43, 48, 52):
+        split.note_off(note)
+    assert chords[-1] is None
+    assert split.live_notes.count == 0
+
+
+def test_fingered_inversion_keeps_root_on_bass_makes_slash():
+    split, _, chords = _split()
+    for note in (40, 48, 43):  # E2 C3 G2 = C/E
+        split.note_on(note, 90)
+    assert (chords[-1]['root'], chords[-1]['type'], chords[-1]['bass']) == (0, 'Maj', None)
+
+    assert split.set_fingering(FINGERING_ON_BASS)
+    assert chords[-1]['name'] == 'CMaj/E'
+    assert chords[-1]['bass'] == 4
+    assert not split.set_fingering('two hands')
+
+    # Note che non formano un accordo: resta il precedente
+    for note in (40, 48, 43):
+        split.note_off(note)
+    split.note_on(40, 90)
+    split.note_on(41, 90)
+    split.note_on(42, 90)
+    assert split.recognizer.get_current_chord()['type'] == 'unknown'
+    assert _names(chords[-2:]) == [None, 'E']
+
+
+def test_single_finger_keys_to_the_left():
+    split, _, chords = _split(fingering=FINGERING_SINGLE)
+    split.note_on(43, 90)                # G
+    split.note_on(39, 90)                # + nero a sinistra (D#)
+    split.note_on(36, 90)                # + bianco a sinistra (C)
+    split.note_off(39)                   # solo bianco
+    assert _names(chords) == ['GMaj', 'Gmin', 'Gmin7', 'G7']
+
+
+def test_ai_fingering_completes_from_previous_chord():
+    split, _, chords = _split(fingering=FINGERING_AI)
+    for note in (45, 48, 52):            # A, A-C (single finger), Amin
+        split.note_on(note, 90)
+    split.note_off(52)
+    split.note_off(45)                   # A-C e poi C: note di Amin, non cambia
+    split.note_on(50, 90)                # C-D: fuori da Amin -> single finger
+    assert _names(chords) == ['AMaj', 'C7', 'Amin', 'D7']
+
+
+def test_full_keyboard_has_no_split():
+    split, port, chords = _split(fingering=FINGERING_FULL, split_point=40)
+    for message in (mido.Message('note_on', note=62, velocity=80),
+                    mido.Message('note_on', note=66, velocity=80),
+                    mido.Message('note_on', note=69, velocity=80),
+                    mido.Message('control_change', control=64, value=127)):
+        split.process(message)
+    assert chords[-1]['name'] == 'DMaj'
+    assert len(_sent(port)) == 3
+
+    assert len(split.release_all()) == 3
+    assert chords[-1] is None
+    assert not split.recognizer.active_notes
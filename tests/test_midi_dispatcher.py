@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il dispatcher unico dell'uscita MIDI.
+"""
+
+import threading
+import time
+
+from clocks import VirtualClock
+from midi_dispatcher import MidiDispatcher, PRIORITY_PANIC, PRIORITY_SCHEDULED, PRIORITY_UI
+from midi_output import RecordingPort
+from timing_stats import TimingStats
+
+
+def _sent(output):
+    return [data for _, data in output.events]
+
+
+def _note_on(note, channel=0):
+    return bytes((0x90 | channel, note, 100))
+
+
+def test_queues_drain_by_priority():
+    output = RecordingPort()
+    dispatcher = MidiDispatcher(output)
+    ui = dispatcher.output_for(PRIORITY_UI)
+    style = dispatcher.output_for(PRIORITY_SCHEDULED)
+
+    ui.send_bytes(_note_on(60))
+    style.send_many([_note_on(36), _note_on(40)])
+    style.send_panic([bytes((0xB5, 123, 0))])
+
+    assert dispatcher.depth() == {'panic': 1, 'scheduled': 2, 'ui': 1}
+    assert dispatcher.flush() == 4
+    assert _sent(output) == [bytes((0xB5, 123, 0)), _note_on(36), _note_on(40), _note_on(60)]
+    assert dispatcher.get_stats()['batches'] == 1
+    assert output.calls == 1
+
+
+def test_panic_waits_for_earlier_notes_on_its_channels():
+    output = RecordingPort()
+    clock = VirtualClock()
+    dispatcher = MidiDispatcher(output, clock=clock.clock)
+    style = dispatcher.output_for(PRIORITY_SCHEDULED)
+
+    style.send_bytes(_note_on(36, channel=2))
+    style.send_bytes(_note_on(60, channel=4))
+    clock.now = 0.0002
+    dispatcher.put((bytes((0x82, 36, 0)),), PRIORITY_PANIC)
+    clock.now = 0.0004
+    style.send_bytes(_note_on(38, channel=2))
+
+    # Il note on del canale 2 accodato prima del panic parte prima del suo note off;
+    # il canale 4 e il note on successivo restano dietro al panic
+    dispatcher.flush()
+    assert _sent(output) == [_note_on(36, channel=2), bytes((0x82, 36, 0)),
+                             _note_on(60, channel=4), _note_on(38, channel=2)]
+    assert output.calls == 1
+
+
+def test_batches_split_by_millisecond():
+    output = RecordingPort()
+    clock = VirtualClock()
+    dispatcher = MidiDispatcher(output, clock=clock.clock)
+    style = dispatcher.output_for(PRIORITY_SCHEDULED)
+
+    style.send_bytes(_note_on(60))
+    clock.now = 0.0004
+    style.send_bytes(_note_on(62))
+    clock.now = 0.003
+    style.send_bytes(_note_on(64))
+    clock.now = 0.004
+
+    dispatcher.flush()
+    stats = dispatcher.get_stats()
+    assert stats['sent'] == 3
+    assert stats['batches'] == 2
+    assert stats['max_latency_ms'] == 4.0
+
+
+def test_timed_burst_measured_when_written():
+    output = RecordingPort()
+    clock = VirtualClock()
+    dispatcher = MidiDispatcher(output, clock=clock.clock)
+    style = dispatcher.output_for(PRIORITY_SCHEDULED)
+    timing = TimingStats()
+
+    # Accodato in orario, scritto 3 ms dopo la scadenza: conta la scrittura
+    clock.now = 1.0
+    style.send_timed([_note_on(36), _note_on(40)], 1.0, timing)
+    assert timing.events_sent == 0
+    clock.now = 1.003
+    dispatcher.flush()
+    assert timing.events_sent == 2
+    assert 2.9 < timing.lateness.get_stats()['max_ms'] < 3.1
+
+
+def test_dispatcher_thread_owns_the_port():
+    output = RecordingPort()
+    dispatcher = MidiDispatcher(output)
+    dispatcher.start()
+
+    def play(priority, base):
+        port = dispatcher.output_for(priority)
+        for note in range(20):
+            port.send_bytes(_note_on(base + note))
+
+    threads = [threading.Thread(target=play, args=(PRIORITY_SCHEDULED, 30)),
+               threading.Thread(target=play, args=(PRIORITY_UI, 60))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    deadline = time.perf_counter() + 2.0
+    while len(output.events) < 40 and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    dispatcher.close()
+
+    expected = [_note_on(note) for note in list(range(30, 50)) + list(range(60, 80))]
+    assert sorted(_sent(output)) == sorted(expected)
+    assert len(output.threads) == 1
+    assert threading.get_ident() not in output.threads
+    assert output.closed
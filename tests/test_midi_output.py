@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Test per l'uscita MIDI a byte già codificati.
+"""
+
+import mido
+
+from midi_output import MidiOutput, as_midi_output
+from style_timeline import event_to_bytes, message_to_event
+
+
+class FakeRtMidiOut:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, data):
+        self.sent.append(bytes(data))
+
+
+class FakeRtPort:
+    """Porta con l'oggetto rtmidi interno, come mido.backends.rtmidi.Output"""
+
+    def __init__(self):
+        self._rt = FakeRtMidiOut()
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+class PlainPort:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+def test_raw_path_bypasses_mido():
+    port = FakeRtPort()
+    output = MidiOutput(port)
+    assert output.raw
+
+    output.send_bytes(bytes((0x91, 60, 100)))
+    output.send(mido.Message('control_change', channel=0, control=7, value=90))
+
+    assert port._rt.sent == [bytes((0x91, 60, 100)), bytes((0xB0, 7, 90))]
+    assert port.sent == []
+
+
+def test_fallback_rebuilds_mido_messages():
+    port = PlainPort()
+    output = as_midi_output(port)
+    assert not output.raw
+    assert as_midi_output(output) is output
+
+    output.send_bytes(bytes((0x91, 60, 100)))
+    output.send_bytes(event_to_bytes(0xF0, bytes((0x43, 0x10, 0x4C))))
+
+    assert port.sent[0] == mido.Message('note_on', channel=1, note=60, velocity=100)
+    assert port.sent[1] == mido.Message('sysex', data=[0x43, 0x10, 0x4C])
+
+
+def test_event_bytes_match_mido_encoding():
+    for msg in (mido.Message('note_on', channel=3, note=64, velocity=1),
+                mido.Message('program_change', channel=9, program=25),
+                mido.Message('pitchwheel', channel=2, pitch=-100),
+                mido.Message('sysex', data=[0x7E, 0x7F, 0x09, 0x01])):
+        _, _, status, data = message_to_event(msg, 0)
+        assert event_to_bytes(status, data) == bytes(msg.bytes())
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il motore di trasposizione delle note secondo le regole CASM.
+"""
+
+import contextlib
+import io
+import os
+
+import pytest
+
+from note_engine import (SectionArrays, build_channel_params, delta_table, select_events,
+                         transform_notes, yamaha_chord_type)
+from style_casm import (ChannelRule, NTR_ROOT_FIXED, NTR_ROOT_TRANS, NTT_BYPASS, NTT_CHORD,
+                        NTT_MELODY)
+from style_player import StylePlayer
+
+STYLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'sty', 'stili_miei', 'Swing1.S733.sty')
+
+
+def _timeline(*notes):
+    """Timeline di soli note_on (channel, note) a tick crescenti"""
+    return [(i * 10, channel, 0x90 | channel, bytes((note, 100)))
+            for i, (channel, note) in enumerate(notes)]
+
+
+def _transform(rules, root, chord_type, *notes, melodic=True):
+    arrays = SectionArrays(_timeline(*notes), use_numpy=False)
+    return transform_notes(arrays, build_channel_params(rules, root, chord_type), melodic)
+
+
+def test_delta_tables_fit_chord_tones():
+    # C Maj7 -> C min: E -> Eb, B -> C (root sopra), G resta
+    table = delta_table(2, yamaha_chord_type('min'), NTT_CHORD)
+    assert table[4] == -1
+    assert table[11] == 1
+    assert table[7] == 0
+    # Melody: C Maj7 -> C7, solo la settima maggiore scende
+    assert delta_table(2, yamaha_chord_type('7'), NTT_MELODY) == (0,) * 11 + (-1,)
+    assert delta_table(2, 8, NTT_BYPASS) == (0,) * 12
+
+
+def test_root_trans_high_key_wraps_down():
+    rules = {0: ChannelRule(0, ntr=NTR_ROOT_TRANS, ntt=NTT_CHORD, high_key=5)}
+    notes, keep = _transform(rules, 5, 'Maj7', (0, 60), (0, 64))
+    assert notes == [65, 69]
+    notes, _ = _transform(rules, 7, 'Maj7', (0, 60), (0, 64))
+    assert notes == [55, 59]
+    assert keep == [True, True]
+
+
+def test_root_fixed_stays_close():
+    rules = {0: ChannelRule(0, ntr=NTR_ROOT_FIXED, ntt=NTT_CHORD)}
+    # C E G B in C Maj7 -> F Maj7: le note si spostano al più di 6 semitoni
+    notes, _ = _transform(rules, 5, 'Maj7', (0, 60), (0, 64), (0, 67), (0, 71))
+    assert sorted(n % 12 for n in notes) == [0, 4, 5, 9]
+    assert all(abs(new - old) <= 6 for new, old in zip(notes, [60, 64, 67, 71]))
+
+
+def test_bass_note_limits_wrap_by_octave():
+    rules = {2: ChannelRule(2, ntr=NTR_ROOT_TRANS, ntt=NTT_MELODY, bass=True,
+                            high_key=11, note_low=28, note_high=41)}
+    notes, _ = _transform(rules, 11, 'Maj7', (2, 36), (2, 40))
+    assert notes == [35, 39]
+    assert all(28 <= note <= 41 for note in notes)
+
+
+def test_drums_and_bypass_channels_untouched():
+    rules = {1: ChannelRule(1, ntt=NTT_BYPASS)}
+    notes, keep = _transform(rules, 3, 'min', (9, 36), (1, 49), (0, 60), melodic=False)
+    assert notes[:2] == [36, 49]
+    assert keep == [True, True, False]
+
+
+def test_chord_mute_drops_channel():
+    # Tutti i tipi suonano tranne il minore (bit 8)
+    rules = {0: ChannelRule(0, chord_mute=((1 << 35) - 1) & ~(1 << 8))}
+    _, keep = _transform(rules, 0, 'min', (0, 60))
+    assert keep == [False]
+    _, keep = _transform(rules, 0, 'Maj', (0, 60))
+    assert keep == [True]
+
+
+def test_numpy_matches_python_on_real_style():
+    pytest.importorskip('numpy')
+    player = StylePlayer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert player.load_style(STYLE_FILE)
+
+    for name, section in player.sections.items():
+        fast = SectionArrays(section['timeline'])
+        slow = SectionArrays(section['timeline'], use_numpy=False)
+        for root in range(12):
+            for chord_type in ('Maj', 'min7', '7', 'dim', 'unknown'):
+                params = build_channel_params(player.casm.get(name, {}), root, chord_type)
+                assert transform_notes(fast, params) == transform_notes(slow, params)
+                count = len(section['timeline'])
+                assert (select_events(fast, params, count, chord_filter={0, 4, 7})
+                        == select_events(slow, params, count, chord_filter={0, 4, 7}))
+
+
+def test_select_events_applies_chord_filter_to_melodic_channels():
+    timeline = _timeline((0, 60), (0, 61), (9, 37)) + [(40, 0, 0xB0, bytes((7, 100)))]
+    arrays = SectionArrays(timeline, use_numpy=False)
+    params = build_channel_params({}, 0, 'Maj')
+
+    # C# fuori dal filtro resta fuori; drums e control change passano sempre
+    play, pitches = select_events(arrays, params, len(timeline), chord_filter={0, 4, 7})
+    assert play == [True, False, True, True]
+    assert pitches == [60, 37, -1]
+    play, _ = select_events(arrays, params, len(timeline), melodic=False)
+    assert play == [False, False, True, True]
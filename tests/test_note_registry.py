@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il registro delle note accese.
+"""
+
+from chord_variants import ChordVariantCache, VariantKey
+from note_registry import NO_SOURCE, ActiveNotes
+
+from .test_section_switch import _section as section
+
+
+def _section():
+    timeline = [
+        (0, 0, 0xB0, bytes((7, 100))),
+        (0, 0, 0x90, bytes((60, 100))),
+        (0, 9, 0x99, bytes((36, 100))),
+        (240, 9, 0x89, bytes((36, 0))),
+        (960, 0, 0x80, bytes((60, 0))),
+    ]
+    return {'timeline': timeline, 'length_ticks': 1920, 'start_time': 0, 'tempo_changes': []}
+
+
+def test_note_off_follows_sent_pitch_across_transposition():
+    cache = ChordVariantCache()
+    cache.set_sections({'Main A': _section()})
+    c_major = cache.get(VariantKey('Main A', transpose=0))
+    d_major = cache.get(VariantKey('Main A', transpose=2))
+    assert d_major.sources == c_major.sources
+    assert c_major.sources[0] == NO_SOURCE
+
+    notes = ActiveNotes()
+    sent = notes.track(c_major.messages, c_major.sources, 0, 3)
+    assert sent == list(c_major.messages[:3])
+    assert len(notes) == 2
+
+    # Il note off arriva dalla variante trasposta ma spegne la nota accesa (60, non 62)
+    sent = notes.track(d_major.messages, d_major.sources, 3, 5)
+    assert sent == [bytes((0x89, 36, 0)), bytes((0x80, 60, 0))]
+    assert len(notes) == 0
+
+
+def test_note_off_without_note_on_is_dropped():
+    notes = ActiveNotes()
+    messages = [bytes((0x80, 64, 0))]
+    assert notes.track(messages, bytes((64,)), 0, 1) == []
+
+
+def test_release_only_sounding_notes():
+    notes = ActiveNotes()
+    notes.note_on(0, 60, 62)
+    notes.note_on(9, 36, 36)
+    notes.note_on(3, 48, 43)
+    notes.note_off(3, 48)
+
+    assert notes.release(channels=[0, 1, 2]) == [bytes((0x80, 62, 0))]
+    assert notes.release() == [bytes((0x89, 36, 0))]
+    assert notes.release() == []
+    assert not notes.is_sounding(0, 60)
+
+
+def test_chord_change_leaves_no_hanging_notes(rig):
+    player, clock, port = rig
+    timeline = [(0, 0, 0x90, bytes((60, 100))), (1800, 0, 0x80, bytes((60, 0))),
+                (0, 9, 0x99, bytes((36, 100))), (240, 9, 0x89, bytes((36, 0)))]
+    player.sections = {'Main A': section(timeline, 1920)}
+    player.variant_cache.set_sections(player.sections)
+
+    clock.call_later(0.3, lambda: player.set_transpose(2))
+    clock.call_later(2.5, lambda: setattr(player, 'playing', False))
+    player.current_section = 'Main A'
+    player.playing = True
+    player._playback_loop('Main A', True)
+
+    sounding = set()
+    for _, msg in port.messages():
+        if msg.type == 'note_on' and msg.velocity > 0:
+            sounding.add((msg.channel, msg.note))
+        elif msg.type in ('note_on', 'note_off'):
+            sounding.discard((msg.channel, msg.note))
+    assert sounding == set()
+    assert len(player.active_notes) == 0
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il render offline degli arrangiamenti su file MIDI.
+"""
+
+import os
+
+import mido
+import pytest
+
+from style_player import StylePlayer
+
+STYLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'sty', 'stili_miei', 'Swing1.S733.sty')
+
+
+@pytest.fixture(scope='module')
+def player():
+    player = StylePlayer()
+    assert player.load_style(STYLE_FILE)
+    return player
+
+
+def _absolute(midi_file):
+    tick = 0
+    events = []
+    for msg in midi_file.tracks[0]:
+        tick += msg.time
+        events.append((tick, msg))
+    return events
+
+
+def _hanging_notes(events):
+    sounding = set()
+    for _, msg in events:
+        if msg.type == 'note_on' and msg.velocity > 0:
+            sounding.add((msg.channel, msg.note))
+        elif msg.type in ('note_on', 'note_off'):
+            sounding.discard((msg.channel, msg.note))
+    return sounding
+
+
+def test_section_change_lands_on_bar(player):
+    ticks_per_measure = player.time_signature_numerator * player.ticks_per_beat
+    timing, active_notes = player.timing, player.active_notes
+    midi_file = player.render([(1, 'Main A', (0, 'Maj')), (3, 'Main B', (7, '7'))], bars=4)
+    events = _absolute(midi_file)
+
+    def first_note(section_name):
+        return min(tick for tick, _, status, data in player.sections[section_name]['timeline']
+                   if status & 0xF0 == 0x90 and data[1])
+
+    notes = [tick for tick, msg in events if msg.type == 'note_on' and msg.velocity > 0]
+    assert notes[0] == first_note('Main A')
+    assert 2 * ticks_per_measure + first_note('Main B') in notes
+    assert max(tick for tick, _ in events) <= 4 * ticks_per_measure
+    assert _hanging_notes(events) == set()
+    assert not player.playing
+    assert player.chord_type is None
+    # Il render non tocca note e statistiche del playback dal vivo
+    assert player.timing is timing and timing.events_sent == 0
+    assert player.active_notes is active_notes and active_notes.count == 0
+
+
+def test_render_is_deterministic_and_saves(player, tmp_path):
+    changes = [(1, 'Intro A', (0, 'Maj')), (5, None, (5, 'Maj')), (7, 'Main B', (9, 'min7')),
+               (11, 'Ending A', (0, 'Maj'))]
+    filename = str(tmp_path / 'song.mid')
+    first = player.render(changes, filename=filename, tempo=140)
+    second = player.render(changes, tempo=140)
+
+    assert [msg.bytes() for msg in first.tracks[0]] == [msg.bytes() for msg in second.tracks[0]]
+    assert _hanging_notes(_absolute(first)) == set()
+
+    loaded = mido.MidiFile(filename)
+    assert loaded.ticks_per_beat == player.ticks_per_beat
+    tempos = [msg.tempo for msg in loaded.tracks[0] if msg.type == 'set_tempo']
+    assert tempos and tempos[0] == mido.bpm2tempo(140)
+
+
+def test_render_rejects_unknown_section(player):
+    assert player.render([(1, 'Main Z', None)]) is None
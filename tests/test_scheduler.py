@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Test per lo scheduler a scadenze assolute.
+"""
+
+from clocks import VirtualClock
+from scheduler import DeadlineScheduler
+
+
+def _scheduler(clock, sleeps=None, **kwargs):
+    """Scheduler sul VirtualClock; se passata, la lista sleeps raccoglie le attese"""
+    def sleep(seconds):
+        if sleeps is not None:
+            sleeps.append(seconds)
+        clock.sleep(seconds)
+
+    # spin_threshold 0: sleep(0) del clock virtuale non fa avanzare il tempo
+    return DeadlineScheduler(clock=clock.clock, sleep=sleep, spin_threshold=0.0, **kwargs)
+
+
+def test_deadlines_do_not_drift():
+    """Con sleep che sfora sempre, l'errore non si accumula fra gli eventi"""
+    clock = VirtualClock(start=100.0, oversleep=0.0004)
+    scheduler = _scheduler(clock)
+    scheduler.start()
+
+    for beat in range(1, 1001):
+        deadline = scheduler.deadline(beat * 0.5)
+        assert scheduler.wait(deadline)
+        assert clock.now - deadline < 0.001
+
+    assert clock.now - scheduler.origin < 500.001
+    assert scheduler.get_stats() == {'resyncs': 0}
+
+
+def test_wait_can_be_cancelled():
+    clock = VirtualClock(start=100.0)
+    sleeps = []
+    scheduler = _scheduler(clock, sleeps)
+    scheduler.start()
+    calls = []
+
+    def is_running():
+        calls.append(clock.now)
+        return len(calls) < 3
+
+    assert not scheduler.wait(scheduler.deadline(10.0), is_running)
+    assert clock.now < scheduler.deadline(10.0)
+    assert max(sleeps) <= 0.005
+
+
+def test_large_lateness_resyncs_origin():
+    clock = VirtualClock(start=100.0)
+    scheduler = _scheduler(clock)
+    origin = scheduler.start()
+
+    clock.now += 2.0
+    assert scheduler.wait(scheduler.deadline(0.5))
+    assert scheduler.get_stats()['resyncs'] == 1
+    assert scheduler.origin > origin + 1.0
+
+
+def test_stop_at_deadline_cancels_wait():
+    """Uno stop arrivato durante l'ultima attesa attiva annulla l'invio"""
+    clock = VirtualClock(start=100.0)
+    scheduler = _scheduler(clock)
+    scheduler.start()
+    deadline = scheduler.deadline(1.0)
+
+    assert not scheduler.wait(deadline, lambda: clock.now < deadline)
+    assert clock.now >= deadline
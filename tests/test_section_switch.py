@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il cambio sezione quantizzato nel thread di playback persistente.
+"""
+
+import mido
+import pytest
+
+
+def _note(tick, note, length, channel=0):
+    return [(tick, channel, 0x90 | channel, bytes((note, 100))),
+            (tick + length, channel, 0x80 | channel, bytes((note, 0)))]
+
+
+def _section(events, length_ticks):
+    return {'timeline': sorted(events, key=lambda event: event[0]), 'length_ticks': length_ticks,
+            'start_time': 0, 'tempo_changes': []}
+
+
+def rig_style(player):
+    """Main A e Main B di una battuta ciascuna (installati dal fixture rig in conftest)"""
+    main_a = [(0, 0, 0xB0, bytes((7, 50)))]
+    for beat in range(8):
+        main_a += _note(beat * 480, 60, 240)
+    main_a += _note(1440, 62, 960)  # attraversa la fine della prima battuta
+    main_b = []
+    for beat in range(8):
+        main_b += _note(beat * 480, 72, 240)
+
+    player.sections = {'Main A': _section(main_a, 3840), 'Main B': _section(main_b, 3840)}
+    player.variant_cache.set_sections(player.sections)
+    player.set_setup_events([
+        mido.Message('program_change', channel=0, program=10),
+        mido.Message('control_change', channel=0, control=7, value=100),
+    ])
+
+
+def _run(player, clock, port, seconds):
+    clock.call_later(seconds, lambda: setattr(player, 'playing', False))
+    player.current_section = 'Main A'
+    player.playing = True
+    start = clock.now
+    player._playback_loop('Main A', True)
+    return [(round(when, 3), msg) for when, msg in port.messages(since=start)]
+
+
+def _first(sent, predicate):
+    return next((when, msg) for when, msg in sent if predicate(msg))
+
+
+def test_switch_waits_for_next_bar(rig):
+    player, clock, port = rig
+    clock.call_later(0.7, lambda: player.change_section('Main B'))
+    sent = _run(player, clock, port, 3.0)
+
+    when, _ = _first(sent, lambda msg: msg.type == 'note_on' and msg.note == 72)
+    assert when == pytest.approx(2.0, abs=1e-3)
+    assert player.current_section == 'Main B'
+
+    # Main A suona fino al confine e non oltre
+    a_notes = [when for when, msg in sent if msg.type == 'note_on' and msg.note == 60]
+    assert a_notes == pytest.approx([0.0, 0.5, 1.0, 1.5], abs=1e-3)
+
+
+def test_switch_on_beat(rig):
+    player, clock, port = rig
+    clock.call_later(0.7, lambda: player.change_section('Main B', quantize='beat'))
+    sent = _run(player, clock, port, 2.0)
+
+    when, _ = _first(sent, lambda msg: msg.type == 'note_on' and msg.note == 72)
+    assert when == pytest.approx(1.0, abs=1e-3)
+
+
+def test_switch_releases_notes_and_resends_only_changed_setup(rig):
+    player, clock, port = rig
+    clock.call_later(0.7, lambda: player.change_section('Main B'))
+    sent = _run(player, clock, port, 2.5)
+
+    at_switch = [msg for when, msg in sent if when == pytest.approx(2.0, abs=1e-3)]
+    assert any(msg.type == 'note_off' and msg.note == 62 for msg in at_switch)
+
+    # Il volume cambiato da Main A torna a quello del setup, il program no
+    setup_resent = [msg for msg in at_switch if msg.type in ('program_change', 'control_change')]
+    assert [(msg.type, msg.value) for msg in setup_resent] == [('control_change', 100)]
+
+
+def test_requesting_current_section_cancels_switch(rig):
+    player, clock, port = rig
+    clock.call_later(0.7, lambda: player.change_section('Main B'))
+    clock.call_later(1.2, lambda: player.change_section('Main A'))
+    sent = _run(player, clock, port, 3.0)
+
+    assert not any(msg.type == 'note_on' and msg.note == 72 for _, msg in sent)
+    assert player.current_section == 'Main A'
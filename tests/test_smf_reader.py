@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il lettore SMF nativo.
+"""
+
+import glob
+import io
+import os
+
+import mido
+import pytest
+
+from smf_reader import parse_smf, SmfFormatError
+from style_player import StylePlayer
+from style_timeline import mido_track_events
+
+STY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'sty', 'stili_miei')
+
+
+def _midi_bytes(track):
+    midi_file = mido.MidiFile(type=0, ticks_per_beat=480)
+    midi_file.tracks.append(track)
+    out = io.BytesIO()
+    midi_file.save(file=out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('filename', sorted(glob.glob(os.path.join(STY_DIR, '*'))))
+def test_native_reader_matches_mido(filename):
+    """Il lettore nativo decodifica gli stessi eventi di mido"""
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    smf = parse_smf(data)
+    midi_file = mido.MidiFile(file=io.BytesIO(data))
+
+    assert smf.ticks_per_beat == midi_file.ticks_per_beat
+    assert len(smf.tracks) == len(midi_file.tracks)
+    for native_track, mido_track in zip(smf.tracks, midi_file.tracks):
+        assert list(native_track.events()) == mido_track_events(mido_track)
+
+
+def test_native_reader_handles_running_status_and_sysex():
+    """Running status, sysex e meta vengono decodificati correttamente"""
+    track = mido.MidiTrack([
+        mido.MetaMessage('marker', text='Main A', time=0),
+        mido.Message('sysex', data=[0x43, 0x10, 0x4C], time=0),
+        mido.Message('note_on', note=60, velocity=100, time=0),
+        mido.Message('note_on', note=64, velocity=100, time=10),
+        mido.Message('note_on', note=60, velocity=0, time=470),
+    ])
+    data = _midi_bytes(track)
+
+    events = list(parse_smf(data).tracks[0].events())
+    assert events == mido_track_events(mido.MidiFile(file=io.BytesIO(data)).tracks[0])
+    assert events[1] == (0, 0xF0, 0, bytes([0x43, 0x10, 0x4C]))
+    assert [tick for tick, _, _, _ in events[2:5]] == [0, 10, 480]
+
+
+def test_native_reader_exposes_trailing_chunks():
+    """I chunk dopo le tracce MIDI (es. CASM) restano accessibili"""
+    with open(os.path.join(STY_DIR, 'Swing1.S733.sty'), 'rb') as f:
+        smf = parse_smf(f.read())
+
+    assert [cid for cid, _, _ in smf.trailing_chunks] == [b'CASM', b'OTSc', b'FNRc']
+    assert bytes(smf.chunk(b'CASM')[:4]) == b'CSEG'
+
+
+def test_native_reader_rejects_unknown_structures():
+    """Running status senza status precedente: il lettore nativo rinuncia"""
+    header = b'MThd' + (6).to_bytes(4, 'big') + bytes([0, 0, 0, 1, 1, 0xE0])
+    body = bytes([0x00, 0x3C, 0x40])
+    data = header + b'MTrk' + len(body).to_bytes(4, 'big') + body
+
+    with pytest.raises(SmfFormatError):
+        parse_smf(data)
+
+
+def test_load_style_falls_back_to_mido(tmp_path, capsys):
+    """Se il lettore nativo rinuncia, load_style usa mido"""
+    track = mido.MidiTrack([
+        mido.MetaMessage('marker', text='Main A', time=0),
+        mido.Message('note_on', note=60, velocity=100, time=0),
+        mido.MetaMessage('text', text='x', time=0),
+        mido.Message('note_on', note=60, velocity=0, time=480),
+    ])
+    data = bytearray(_midi_bytes(track))
+    # Rende l'ultimo note-on dipendente dal running status dopo un meta-evento
+    # (accettato da mido, rifiutato dal lettore nativo)
+    index = data.rindex(bytes([0x90, 60, 0]))
+    del data[index]
+    data[18:22] = (int.from_bytes(data[18:22], 'big') - 1).to_bytes(4, 'big')
+
+    filename = tmp_path / 'fallback.sty'
+    filename.write_bytes(bytes(data))
+
+    player = StylePlayer()
+    assert player.load_style(str(filename))
+    assert 'uso mido' in capsys.readouterr().out
+    assert not hasattr(player, 'midi_file')
+    assert [event[0] for event in player.sections['Main A']['timeline']] == [0, 480]
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Test per la cache su disco degli style compilati.
+"""
+
+import os
+import threading
+
+import pytest
+
+from style_cache import StyleCache, deserialize_style, serialize_style
+from style_player import StylePlayer
+from style_timeline import EventStore
+
+STYLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'sty', 'stili_miei', 'Swing1.S733.sty')
+
+
+@pytest.fixture
+def loaded_player():
+    player = StylePlayer()
+    assert player.load_style(STYLE_FILE)
+    return player
+
+
+def test_serialize_roundtrip(loaded_player):
+    """Uno style serializzato e riletto è identico all'originale"""
+    from style_timeline import CompiledStyle
+
+    compiled = CompiledStyle(
+        style_name=loaded_player.style_name,
+        tempo_bpm=loaded_player.tempo_bpm,
+        ticks_per_beat=loaded_player.ticks_per_beat,
+        sections=loaded_player.sections,
+        setup_events=loaded_player.initial_setup_events,
+        casm_data=loaded_player.casm_data
+    )
+    restored = deserialize_style(serialize_style(compiled))
+
+    assert restored.style_name == compiled.style_name
+    assert restored.tempo_bpm == pytest.approx(compiled.tempo_bpm)
+    assert restored.ticks_per_beat == compiled.ticks_per_beat
+    assert restored.sections == compiled.sections
+    assert restored.casm_data == compiled.casm_data
+    assert [m.bytes() for m in restored.setup_events] == \
+        [m.bytes() for m in compiled.setup_events]
+
+
+def test_load_style_hits_cache_on_second_load(tmp_path, loaded_player):
+    """Il secondo caricamento dello stesso file viene servito dalla cache"""
+    cache = StyleCache(cache_dir=str(tmp_path))
+
+    first = StylePlayer(style_cache=cache)
+    assert first.load_style(STYLE_FILE)
+    assert cache.get_stats()['misses'] == 1
+    assert cache.get_stats()['writes'] == 1
+
+    second = StylePlayer(style_cache=cache)
+    assert second.load_style(STYLE_FILE)
+    assert cache.get_stats()['hits'] == 1
+    assert isinstance(second.sections['Main A']['timeline'], EventStore)
+
+    assert second.sections == loaded_player.sections
+    assert second.casm == loaded_player.casm
+    assert second.get_style_info() == loaded_player.get_style_info()
+
+
+def test_cache_evicts_least_recently_used(tmp_path, loaded_player):
+    """Superata la dimensione massima vengono eliminate le voci meno recenti"""
+    from style_timeline import CompiledStyle
+
+    compiled = CompiledStyle(sections=loaded_player.sections)
+    entry_size = len(serialize_style(compiled))
+    cache = StyleCache(cache_dir=str(tmp_path), max_bytes=entry_size * 2)
+
+    cache.put('a', compiled)
+    cache.put('b', compiled)
+    os.utime(os.path.join(str(tmp_path), 'a.stc'), ns=(1, 1))
+    os.utime(os.path.join(str(tmp_path), 'b.stc'), ns=(2, 2))
+    cache.put('c', compiled)
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['entries'] == 2
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+
+
+def test_corrupted_entry_is_a_miss(tmp_path):
+    """Una voce corrotta conta come miss e viene rimossa"""
+    cache = StyleCache(cache_dir=str(tmp_path))
+    with open(os.path.join(str(tmp_path), 'bad.stc'), 'wb') as f:
+        f.write(b'not a cache file')
+
+    assert cache.get('bad') is None
+    assert cache.get_stats()['misses'] == 1
+    assert not os.path.exists(os.path.join(str(tmp_path), 'bad.stc'))
+
+
+def test_concurrent_writers_of_one_entry(tmp_path, loaded_player):
+    """Scritture contemporanee della stessa voce: ognuna ha il suo file temporaneo"""
+    from style_timeline import CompiledStyle
+
+    compiled = CompiledStyle(sections=loaded_player.sections)
+    cache = StyleCache(cache_dir=str(tmp_path))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.put('song', compiled)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 8
+    assert os.listdir(str(tmp_path)) == ['song.stc']
+    assert cache.get('song').sections == loaded_player.sections
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Test per la decodifica dei chunk CASM/OTSc/MDB.
+"""
+
+import glob
+import os
+import struct
+
+import pytest
+
+from smf_reader import parse_smf
+from style_casm import (ChannelRule, find_chunk, parse_casm, parse_mdb, parse_ots,
+                        NTR_ROOT_FIXED, NTR_ROOT_TRANS, NTT_BYPASS, NTT_CHORD, NTT_MELODY)
+from style_player import StylePlayer
+
+STY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'sty', 'stili_miei')
+STYLE_FILE = os.path.join(STY_DIR, 'Swing1.S733.sty')
+
+
+def _chunk(chunk_id, body):
+    return struct.pack('>4sI', chunk_id, len(body)) + body
+
+
+def test_parse_ctab_fields():
+    """Tutti i campi di un Ctab SFF1 vengono decodificati"""
+    ctab = bytes([
+        2, *b'Bass    ', 10, 1,
+        0x0F, 0xFF,                        # note mute: tutte le root
+        0x07, 0xFF, 0xFF, 0xFF, 0xFE,      # chord mute: tutti tranne Maj
+        0, 2,                              # source: C Maj7
+        NTR_ROOT_TRANS, 3,                 # NTR, NTT SFF1 "Bass"
+        6, 28, 41, 1, 0
+    ])
+    casm = _chunk(b'CSEG', _chunk(b'Sdec', b'Main A,Main B') + _chunk(b'Ctab', ctab))
+
+    rules = parse_casm(casm)
+    assert set(rules) == {'Main A', 'Main B'}
+    rule = rules['Main A'][2]
+    assert rule == ChannelRule(2, 'Bass', dest_channel=10, editable=True, note_mute=0x0FFF,
+                               chord_mute=0x07FFFFFFFE, source_root=0, source_chord_type=2,
+                               ntr=NTR_ROOT_TRANS, ntt=NTT_MELODY, bass=True, high_key=6,
+                               note_low=28, note_high=41, rtr=1)
+    assert rule.plays_chord(0, 8)
+    assert not rule.plays_chord(0, 0)
+
+
+def test_swing1_main_a_rules():
+    """Le regole di Main A di Swing1 corrispondono al contenuto del file"""
+    with open(STYLE_FILE, 'rb') as f:
+        data = f.read()
+    rules = parse_casm(parse_smf(data).chunk(b'CASM'))['Main A']
+
+    bass = rules[2]
+    assert bass.name == 'bass'
+    assert bass.dest_channel == 10
+    assert (bass.ntt, bass.bass) == (NTT_MELODY, True)
+    assert (bass.note_low, bass.note_high) == (28, 41)
+
+    assert rules[9].ntt == NTT_BYPASS
+    assert rules[4].source_chord_type == 2  # Maj7
+    assert (rules[3].ntr, rules[3].ntt) == (NTR_ROOT_FIXED, NTT_CHORD)
+
+
+def test_trailing_chunks_do_not_copy():
+    """find_chunk ritorna viste sul buffer originale"""
+    with open(STYLE_FILE, 'rb') as f:
+        data = f.read()
+    view = find_chunk(data, b'CASM')
+    assert view.obj is data
+    assert bytes(view) == bytes(parse_smf(data).chunk(b'CASM'))
+    assert find_chunk(data, b'XXXX') is None
+
+
+def test_parse_ots_and_mdb():
+    with open(STYLE_FILE, 'rb') as f:
+        data = f.read()
+    settings = parse_ots(find_chunk(data, b'OTSc'))
+    assert len(settings) == 4
+    assert all(any(status & 0xF0 == 0xC0 for _, status, _, _ in ots) for ots in settings)
+
+    records = parse_mdb(find_chunk(data, b'FNRc'))
+    assert records[0]['Mnam'] == "It's Swinging, Milord!"
+
+
+@pytest.mark.parametrize('filename', sorted(glob.glob(os.path.join(STY_DIR, '*'))))
+def test_every_section_has_channel_rules(filename):
+    player = StylePlayer()
+    assert player.load_style(filename)
+    for section_name in player.get_available_sections():
+        rules = player.get_channel_rules(section_name)
+        assert rules
+        assert all(0 <= rule.dest_channel < 16 for rule in rules.values())
+
+
+def test_load_style_without_casm(tmp_path):
+    """Uno style senza CASM si carica con regole vuote"""
+    with open(STYLE_FILE, 'rb') as f:
+        data = f.read()
+    casm = find_chunk(data, b'CASM')
+    start = data.index(b'CASM')
+    stripped = data[:start] + data[start + 8 + len(casm):]
+
+    path = tmp_path / 'nocasm.sty'
+    path.write_bytes(stripped)
+
+    player = StylePlayer()
+    assert player.load_style(str(path))
+    assert player.casm == {}
+    assert player.get_channel_rules('Main A') == {}
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Test per il precaricamento in background e il cambio style al confine di battuta.
+"""
+
+import os
+
+import mido
+import pytest
+
+from chord_variants import ChordVariantCache
+from style_player import PreloadedStyle, StylePlayer
+from style_timeline import CompiledStyle
+
+STYLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'sty', 'stili_miei')
+
+
+def _beats(pitch, ticks_per_beat, beats):
+    events = []
+    for beat in range(beats):
+        tick = beat * ticks_per_beat
+        events.append((tick, 0, 0x90, bytes((pitch, 100))))
+        events.append((tick + ticks_per_beat // 2, 0, 0x80, bytes((pitch, 0))))
+    return events
+
+
+def _preloaded(name, tempo, ticks_per_beat, pitch, program):
+    sections = {'Main A': {'timeline': _beats(pitch, ticks_per_beat, 8),
+                           'length_ticks': 8 * ticks_per_beat, 'start_time': 0,
+                           'tempo_changes': []}}
+    compiled = CompiledStyle(style_name=name, tempo_bpm=tempo, ticks_per_beat=ticks_per_beat,
+                             sections=sections,
+                             setup_events=[mido.Message('program_change', channel=0,
+                                                        program=program)])
+    cache = ChordVariantCache()
+    cache.set_sections(sections)
+    return PreloadedStyle(name + '.sty', compiled, {}, cache)
+
+
+def rig_style(player):
+    """Style A installato dal fixture rig in conftest"""
+    player.switch_style(_preloaded('A', 120, 480, 60, 10), 'Main A')
+
+
+def test_switch_at_bar_with_new_tempo_and_resolution(rig):
+    player, clock, port = rig
+    style_b = _preloaded('B', 90, 960, 67, 20)
+    clock.call_at(100.7, lambda: player.switch_style(style_b))
+    clock.call_at(104.1, player.stop)
+    player.play_section('Main A')
+
+    sent = [(round(when, 6), msg) for when, msg in port.messages(since=100.0)]
+    a_notes = [when for when, msg in sent if msg.type == 'note_on' and msg.note == 60]
+    b_notes = [when for when, msg in sent if msg.type == 'note_on' and msg.note == 67]
+    assert a_notes == [0.0, 0.5, 1.0, 1.5]
+    assert b_notes == pytest.approx([2.0 + beat * 60.0 / 90 for beat in range(4)], abs=1e-6)
+
+    # Al confine: solo il program change che differisce dal vecchio setup
+    at_switch = [msg for when, msg in sent if when == 2.0 and msg.type == 'program_change']
+    assert [msg.program for msg in at_switch] == [20]
+    assert (player.style_name, player.tempo_bpm, player.ticks_per_beat) == ('B', 90, 960)
+    assert player.style_file == 'B.sty'
+
+
+def test_change_section_cancels_pending_style(rig):
+    player, clock, port = rig
+    style_b = _preloaded('B', 90, 960, 67, 20)
+    clock.call_at(100.5, lambda: player.switch_style(style_b))
+    clock.call_at(101.0, lambda: player.change_section('Main A'))
+    clock.call_at(103.0, player.stop)
+    player.play_section('Main A')
+
+    assert not any(msg.type == 'note_on' and msg.note == 67 for _, msg in port.messages())
+    assert player.style_name == 'A'
+
+
+def test_preload_in_background_and_install_when_stopped():
+    player = StylePlayer()
+    assert player.load_style(os.path.join(STYLE_DIR, 'Swing1.S733.sty'))
+    player.current_section = 'Main A'
+    player.set_chord(7, '7')
+    results = []
+
+    thread = player.preload_style(os.path.join(STYLE_DIR, 'Swing2.S249.sty'), results.append)
+    thread.join(timeout=10.0)
+
+    preloaded = results[0]
+    assert preloaded is player.preloaded_style
+    assert player.style_file.endswith('Swing1.S733.sty')
+    assert preloaded.variant_cache.get_stats()['variants'] == len(preloaded.sections)
+
+    assert player.switch_style(preloaded)
+    assert player.style_file.endswith('Swing2.S249.sty')
+    assert player.sections is preloaded.sections
+    assert player.current_section == 'Main A'
+    assert player.initial_setup_events == preloaded.compiled.setup_events
+    assert player.preloaded_style is None
+
+    failed = []
+    player.preload_style(os.path.join(STYLE_DIR, 'missing.sty'), failed.append).join(timeout=10.0)
+    assert failed == [None]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Test per la compilazione delle sezioni in timeline a tick assoluti.
+"""
+
+import mido
+
+from style_timeline import (EventStore, compile_sections, event_to_message, memory_report,
+                            mido_track_events, timeline_ticks)
+
+
+SECTION_NAMES = ['Intro A', 'Main A']
+
+
+def _build_tracks():
+    """Crea due tracce: marker + basso nella prima, accordi nella seconda"""
+    track1 = mido.MidiTrack([
+        mido.Message('program_change', channel=0, program=33, time=0),
+        mido.MetaMessage('marker', text='Main A', time=480),
+        mido.Message('note_on', channel=0, note=36, velocity=100, time=0),
+        mido.Message('note_off', channel=0, note=36, velocity=0, time=480),
+        mido.MetaMessage('marker', text='Intro A', time=1440),
+        mido.Message('note_on', channel=0, note=40, velocity=100, time=0),
+        mido.Message('note_off', channel=0, note=40, velocity=0, time=960),
+    ])
+    track2 = mido.MidiTrack([
+        mido.Message('control_change', channel=1, control=7, value=100, time=0),
+        mido.Message('note_on', channel=1, note=60, velocity=90, time=720),
+        mido.Message('note_off', channel=1, note=60, velocity=0, time=1680),
+        mido.Message('note_on', channel=1, note=64, velocity=90, time=120),
+    ])
+    return [mido_track_events(track1), mido_track_events(track2)]
+
+
+def test_compile_merges_tracks_at_absolute_ticks():
+    """Gli eventi di tracce diverse sono uniti e ordinati per tick assoluto"""
+    sections, _ = compile_sections(_build_tracks(), SECTION_NAMES)
+
+    timeline = sections['Main A']['timeline']
+    assert [(tick, channel) for tick, channel, _, _ in timeline] == [
+        (0, 0), (240, 1), (480, 0), (1920, 1)
+    ]
+    assert sections['Main A']['length_ticks'] == 1920
+
+
+def test_compile_note_off_on_boundary_stays_in_previous_section():
+    """Un note-off esattamente sul confine chiude la sezione precedente"""
+    sections, _ = compile_sections(_build_tracks(), SECTION_NAMES)
+
+    assert sections['Main A']['timeline'][-1][0] == 1920
+    intro = sections['Intro A']['timeline']
+    assert [(tick, channel) for tick, channel, _, _ in intro] == [(0, 0), (120, 1), (960, 0)]
+
+
+def test_compile_collects_setup_events_before_first_marker():
+    """Program e control change prima del primo marker diventano setup"""
+    _, setup_events = compile_sections(_build_tracks(), SECTION_NAMES)
+
+    assert [msg.type for msg in setup_events] == ['program_change', 'control_change']
+
+
+def test_event_to_message_roundtrip():
+    """Un evento compilato si riconverte nel messaggio mido originale"""
+    sections, _ = compile_sections(_build_tracks(), SECTION_NAMES)
+
+    _, _, status, data = sections['Main A']['timeline'][0]
+    msg = event_to_message(status, data)
+    assert msg.type == 'note_on'
+    assert msg.note == 36
+    assert msg.velocity == 100
+
+
+def test_event_store_reads_like_tuple_list():
+    """L'EventStore restituisce gli stessi eventi della lista di tuple"""
+    events = [(0, 0, 0x90, bytes((60, 100))), (0, -1, 0xF0, bytes((0x7E, 0x7F, 9, 1))),
+              (480, 9, 0x89, bytes((36, 0))), (960, 2, 0xC2, bytes((5,)))]
+    store = EventStore.from_events(events)
+
+    assert len(store) == 4
+    assert list(store) == events
+    assert store == events
+    assert store[1] == events[1] and store[-1] == events[-1]
+    assert store[1:3] == events[1:3]
+    assert timeline_ticks(store) is store.ticks
+    assert list(timeline_ticks(events)) == [0, 0, 480, 960]
+    assert EventStore.from_events(store) is store
+    assert len(EventStore()) == 0 and list(EventStore()) == []
+
+
+def test_compiled_sections_are_compact_and_smaller():
+    """compile_sections produce EventStore; il report confronta le due forme"""
+    sections, _ = compile_sections(_build_tracks(), SECTION_NAMES)
+    assert all(isinstance(section['timeline'], EventStore) for section in sections.values())
+
+    report = memory_report(sections)
+    assert report['events'] == sum(len(section['timeline']) for section in sections.values())
+    assert set(report['sections']) == set(sections)
+    assert report['compact_bytes'] < report['tuple_bytes']
+    assert report['ratio'] > 1
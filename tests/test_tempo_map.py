@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Test per la mappa tick -> secondi con cambi di tempo e rampe.
+"""
+
+import mido
+import pytest
+
+from style_timeline import compile_sections, mido_track_events
+from tempo_map import TempoMap
+
+
+def test_constant_tempo():
+    tempo_map = TempoMap(480, 120)
+    assert tempo_map.time_at(480) == pytest.approx(0.5)
+    assert tempo_map.tick_at(2.0) == pytest.approx(1920)
+    assert tempo_map.tempo_at(10000) == 120
+
+
+def test_tempo_change_keeps_position():
+    tempo_map = TempoMap(480, 120)
+    tempo_map.set_tempo(960, 60)
+
+    # Prima del cambio nulla si sposta, dopo i beat durano il doppio
+    assert tempo_map.time_at(960) == pytest.approx(1.0)
+    assert tempo_map.time_at(1440) == pytest.approx(2.0)
+    assert tempo_map.tick_at(2.0) == pytest.approx(1440)
+
+    # Un cambio successivo scarta quelli oltre il nuovo tick
+    tempo_map.set_tempo(480, 240)
+    assert tempo_map.time_at(960) == pytest.approx(0.75)
+    assert tempo_map.tempo_at(5000) == 240
+
+
+def test_ramp_matches_numeric_integration():
+    tempo_map = TempoMap(480, 100)
+    tempo_map.set_tempo(480, 200, ramp_ticks=1920)
+
+    assert tempo_map.tempo_at(480 + 960) == pytest.approx(150)
+    expected = 0.6 + sum(60.0 / (480 * (100 + 100 * (x + 0.5) / 1920)) for x in range(1920))
+    assert tempo_map.time_at(480 + 1920) == pytest.approx(expected, rel=1e-6)
+    assert tempo_map.time_at(480 + 1920 + 480) == pytest.approx(expected + 0.3)
+
+    for tick in (100, 700, 1500, 2399, 3000):
+        assert tempo_map.tick_at(tempo_map.time_at(tick)) == pytest.approx(tick)
+
+
+def test_sections_collect_tempo_meta_events():
+    track = mido.MidiTrack([
+        mido.MetaMessage('set_tempo', tempo=500000, time=0),
+        mido.MetaMessage('marker', text='Intro A', time=0),
+        mido.MetaMessage('set_tempo', tempo=1000000, time=0),
+        mido.Message('note_on', channel=0, note=60, velocity=100, time=0),
+        mido.MetaMessage('set_tempo', tempo=750000, time=480),
+        mido.MetaMessage('marker', text='Main A', time=480),
+        mido.Message('note_on', channel=0, note=60, velocity=100, time=480),
+    ])
+    sections, _ = compile_sections([mido_track_events(track)], ['Intro A', 'Main A'])
+
+    assert sections['Intro A']['tempo_changes'] == [(0, 1000000), (480, 750000)]
+    assert sections['Main A']['tempo_changes'] == []
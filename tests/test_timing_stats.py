@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Test per gli istogrammi dei ritardi e i contatori del playback.
+"""
+
+from style_player import StylePlayer
+from timing_stats import LatencyHistogram, TimingStats
+
+from .test_section_switch import _note, _section
+
+
+def test_histogram_small_values_are_exact():
+    histogram = LatencyHistogram()
+    for value in range(1, 11):
+        histogram.record(value)
+    assert histogram.percentile(50) == 5
+    assert histogram.percentile(90) == 9
+    assert histogram.percentile(100) == 10
+    assert histogram.min_us == 1
+    assert histogram.mean() == 5.5
+
+
+def test_histogram_relative_precision_and_limits():
+    histogram = LatencyHistogram()
+    histogram.record(100, count=99)
+    histogram.record(250000)
+    histogram.record(-5)  # in anticipo: conta come puntuale
+    assert len(histogram) == 101
+    assert 100 <= histogram.percentile(50) <= 103
+    assert histogram.percentile(99.9) == 250000
+    assert histogram.get_stats()['max_ms'] == 250.0
+
+    for value in (1000, 12345, 999999, 40000000):
+        assert histogram._highest_value(histogram._index(value)) >= value
+        assert histogram._highest_value(histogram._index(value)) <= value * 1.035
+
+    histogram.record(10 ** 12)
+    assert histogram.max_us == 1 << 26
+    histogram.reset()
+    assert len(histogram) == 0
+    assert histogram.percentile(99) == 0
+
+
+def test_record_send_counts_every_event():
+    stats = TimingStats()
+    stats.record_send(1.0, 1.002, 1.0025, 3)
+    stats.record_send(2.0, 2.0, 2.0, 0)
+    result = stats.get_stats()
+    assert result['events_sent'] == 3
+    assert result['lateness']['count'] == 3
+    assert 1.9 <= result['lateness']['p50_ms'] <= 2.1
+    assert 0.4 <= result['send_time']['max_ms'] <= 0.6
+
+
+def test_player_counts_sent_filtered_and_restarts(rig):
+    player, clock, _ = rig
+    timeline = _note(0, 60, 240) + _note(480, 64, 240) + _note(0, 36, 240, channel=9)
+    timeline.append((0, 9, 0x89, bytes((40, 0))))  # note off senza note on
+    player.sections = {'Main A': _section(timeline, 1920)}
+    player.variant_cache.set_sections(player.sections)
+
+    player.current_section = 'Main A'
+    player.set_block_melodic_notes(True)
+    clock.call_later(3.9, lambda: setattr(player, 'playing', False))  # quasi 2 giri da 2 s
+    player.playing = True
+    player._playback_loop('Main A', True)
+
+    stats = player.get_timing_stats()
+    # Drums inviati (note on + note off) in entrambi i giri; filtrate le 4 note
+    # melodiche del primo giro e le 2 del secondo fino all'ultimo burst inviato
+    assert stats['events_sent'] == 4
+    assert stats['events_filtered'] == 4 + 2
+    assert stats['events_dropped'] == 2
+    assert stats['loop_restarts'] == 1
+    assert stats['send_errors'] == 0
+    assert stats['lateness']['count'] == 4
+
+    player.reset_timing_stats()
+    stats = player.get_timing_stats()
+    assert stats['events_sent'] == stats['events_dropped'] == stats['loop_restarts'] == 0
+
+
+def test_failed_panic_on_stop_is_reported(capsys):
+    class BrokenPort:
+        def send_bytes(self, data):
+            raise OSError("porta chiusa")
+
+        def send_panic(self, messages):
+            raise OSError("porta chiusa")
+
+    player = StylePlayer()
+    player.set_midi_output(BrokenPort())
+    player.active_notes.note_on(0, 60, 60)
+    player.stop()
+
+    assert player.get_timing_stats()['send_errors'] == 1
+    assert "porta chiusa" in capsys.readouterr().out
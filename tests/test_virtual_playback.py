@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Test del playback in tempo virtuale: VirtualClock e RecordingPort al posto
+di orologio reale e porta MIDI.
+"""
+
+import os
+import time
+
+import mido
+import pytest
+
+from clocks import VirtualClock
+from midi_output import RecordingPort
+from style_player import StylePlayer
+
+STYLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'sty', 'stili_miei')
+
+
+def _notes(pitch, count, step, length, channel=0):
+    events = []
+    for i in range(count):
+        events.append((i * step, channel, 0x90 | channel, bytes((pitch, 100))))
+        events.append((i * step + length, channel, 0x80 | channel, bytes((pitch, 0))))
+    return events
+
+
+def _section(events, bars):
+    return {'timeline': sorted(events, key=lambda event: event[0]), 'length_ticks': bars * 1920,
+            'start_time': 0, 'tempo_changes': []}
+
+
+def rig_style(player):
+    """Style sintetico installato dal fixture rig in conftest: ogni sezione ha la sua nota"""
+    player.sections = {
+        'Intro A': _section(_notes(48, 4, 480, 240), 1),
+        'Main A': _section(_notes(60, 8, 480, 240) + _notes(36, 2, 1920, 240, channel=9), 2),
+        'Main B': _section(_notes(64, 8, 480, 240), 2),
+        'Fill In AA': _section(_notes(72, 8, 240, 120), 1),
+        'Ending A': _section(_notes(55, 1, 0, 1800), 1),
+    }
+    player.variant_cache.set_sections(player.sections)
+    player.set_setup_events([mido.Message('program_change', channel=0, program=5)])
+
+
+def _note_ons(port, start=100.0):
+    return [(round(when, 6), msg.channel, msg.note) for when, msg in port.messages(since=start)
+            if msg.type == 'note_on' and msg.velocity > 0]
+
+
+def _hanging(port):
+    sounding = set()
+    for _, msg in port.messages():
+        if msg.type == 'note_on' and msg.velocity > 0:
+            sounding.add((msg.channel, msg.note))
+        elif msg.type in ('note_on', 'note_off'):
+            sounding.discard((msg.channel, msg.note))
+    return sounding
+
+
+def test_intro_then_main_on_exact_times(rig):
+    player, clock, port = rig
+    clock.call_at(103.0, player.stop)
+    assert player.play_section('Intro A')
+
+    assert port.messages()[0][1].type == 'program_change'
+    assert _note_ons(port) == [
+        (0.0, 0, 48), (0.5, 0, 48), (1.0, 0, 48), (1.5, 0, 48),
+        (2.0, 0, 60), (2.0, 9, 36), (2.5, 0, 60),
+    ]
+    assert player.current_section == 'Main A'
+    assert not player.is_playing()
+    assert _hanging(port) == set()
+
+
+def test_fill_then_main_switch_at_bar_boundaries(rig):
+    player, clock, port = rig
+    clock.call_at(101.3, lambda: player.change_section('Fill In AA'))
+    clock.call_at(102.7, lambda: player.change_section('Main B'))
+    clock.call_at(104.6, player.stop)
+    player.play_section('Main A')
+
+    ons = _note_ons(port)
+    assert [when for when, _, note in ons if note == 60] == [0.0, 0.5, 1.0, 1.5]
+    assert [when for when, _, note in ons if note == 72] == [2.0 + i * 0.25 for i in range(8)]
+    assert [when for when, _, note in ons if note == 64][:2] == [4.0, 4.5]
+    assert _hanging(port) == set()
+
+
+def test_ending_stops_and_selects_intro(rig):
+    player, clock, port = rig
+    clock.call_at(100.7, lambda: player.change_section('Ending A'))
+    player.play_section('Main A')
+
+    # Il playback termina da solo alla fine dell'Ending (battuta 2-3)
+    assert clock.now == pytest.approx(104.0)
+    assert _note_ons(port)[-1] == (2.0, 0, 55)
+    assert player.next_section_after_stop == 'Intro A'
+    assert _hanging(port) == set()
+
+
+def test_chord_change_transposes_from_next_event(rig):
+    player, clock, port = rig
+    clock.call_at(100.75, lambda: player.set_chord(2, 'Maj'))
+    clock.call_at(102.0 - 1e-3, player.stop)
+    player.play_section('Main A')
+
+    assert [(when, note) for when, channel, note in _note_ons(port) if channel == 0] == [
+        (0.0, 60), (0.5, 60), (1.0, 62), (1.5, 62)]
+    # La nota accesa prima del cambio si spegne sul pitch con cui è partita
+    offs = [(round(when - 100.0, 6), msg.note) for when, msg in port.messages()
+            if msg.type in ('note_off', 'note_on') and msg.velocity == 0 and msg.channel == 0]
+    assert offs[:3] == [(0.25, 60), (0.75, 60), (1.25, 62)]
+    assert _hanging(port) == set()
+
+
+def test_virtual_time_is_much_faster_than_real_time(rig):
+    player, clock, port = rig
+    clock.call_at(100.0 + 600.0, player.stop)  # 10 minuti di Main A
+
+    start = time.perf_counter()
+    player.play_section('Main A')
+    elapsed = time.perf_counter() - start
+
+    assert clock.now == pytest.approx(700.0)
+    assert len(_note_ons(port)) == 300 * 5
+    assert elapsed < 600.0 / 1000
+
+
+def test_set_clock_refused_while_playing(rig):
+    player, clock, _ = rig
+    results = []
+    clock.call_at(100.5, lambda: results.append(player.set_clock(VirtualClock())))
+    clock.call_at(101.0, player.stop)
+    player.play_section('Main A')
+    assert results == [False]
+    assert player.set_clock(VirtualClock())
+
+
+def _setup_sent(port, start):
+    return [(msg.type, msg.channel) for _, msg in port.messages(since=start)
+            if msg.type == 'program_change']
+
+
+def test_restart_sends_only_setup_the_synth_lacks(rig):
+    player, clock, port = rig
+    clock.call_at(101.0, player.stop)
+    player.play_section('Main A')
+    assert _setup_sent(port, 100.0) == [('program_change', 0)]
+
+    # Il synth ha già il program: il secondo avvio non lo reinvia
+    restart = clock.now
+    clock.call_at(restart + 1.0, player.stop)
+    player.play_section('Main A')
+    assert _setup_sent(port, restart) == []
+
+    # Program cambiato da fuori sul canale 1: torna quello dello style
+    player.forget_channel_state(0)
+    restart = clock.now
+    clock.call_at(restart + 1.0, player.stop)
+    player.play_section('Main A')
+    assert _setup_sent(port, restart) == [('program_change', 0)]
+    assert player.synth_state.summary() == {0: {'program': 5}}
+
+    # Porta nuova: stato ignoto, il setup riparte per intero
+    other = RecordingPort(clock)
+    player.set_midi_output(other)
+    clock.call_at(clock.now + 1.0, player.stop)
+    player.play_section('Main A')
+    assert _setup_sent(other, 0.0) == [('program_change', 0)]
+
+
+def test_loading_styles_replaces_setup_instead_of_accumulating():
+    player = StylePlayer()
+    assert player.load_style(os.path.join(STYLE_DIR, 'Swing1.S733.sty'))
+    assert player.load_style(os.path.join(STYLE_DIR, 'Swing2.S249.sty'))
+
+    fresh = StylePlayer()
+    assert fresh.load_style(os.path.join(STYLE_DIR, 'Swing2.S249.sty'))
+    assert [msg.bytes() for msg in player.initial_setup_events] == \
+        [msg.bytes() for msg in fresh.initial_setup_events]
+    assert player.setup_state.values == fresh.setup_state.values
+    summary = player.setup_state.summary()
+    assert all('program' in values for values in summary.values() if 'bank_msb' in values)
+
+
+def _pitch_bend_range(channel, semitones):
+    return [mido.Message('control_change', channel=channel, control=101, value=0),
+            mido.Message('control_change', channel=channel, control=100, value=0),
+            mido.Message('control_change', channel=channel, control=6, value=semitones),
+            mido.Message('control_change', channel=channel, control=38, value=0)]
+
+
+def _controls_sent(port, start):
+    return [(msg.channel, msg.control, msg.value) for _, msg in port.messages(since=start)
+            if msg.type == 'control_change']
+
+
+def test_setup_rpn_runs_are_sent_whole_and_in_order(rig):
+    player, clock, port = rig
+    player.set_setup_events(_pitch_bend_range(0, 12) + [
+        mido.Message('control_change', channel=1, control=99, value=1),
+        mido.Message('control_change', channel=1, control=98, value=8),
+        mido.Message('control_change', channel=1, control=6, value=70),
+        mido.Message('control_change', channel=1, control=7, value=100),
+        mido.Message('program_change', channel=0, program=5)])
+    assert player.setup_state.summary() == {
+        0: {'rpn0.0': 12, 'program': 5}, 1: {'nrpn1.8': 70, 'volume': 100}}
+
+    clock.call_at(101.0, player.stop)
+    player.play_section('Main A')
+    assert _controls_sent(port, 100.0) == [
+        (0, 101, 0), (0, 100, 0), (0, 6, 12), (0, 38, 0),
+        (1, 99, 1), (1, 98, 8), (1, 6, 70), (1, 7, 100)]
+
+    # Già impostati sul synth: il riavvio non li reinvia
+    restart = clock.now
+    clock.call_at(restart + 1.0, player.stop)
+    player.play_section('Main A')
+    assert _controls_sent(port, restart) == []
+
+    # Style con un altro pitch bend range: riparte l'intera sequenza
+    player.set_setup_events(_pitch_bend_range(0, 2))
+    restart = clock.now
+    clock.call_at(restart + 1.0, player.stop)
+    player.play_section('Main A')
+    assert _controls_sent(port, restart) == [(0, 101, 0), (0, 100, 0), (0, 6, 2), (0, 38, 0)]